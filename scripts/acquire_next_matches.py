@@ -13,6 +13,19 @@ Parameters:
     The directory containing the processed data files, used to extract unique team names.
 --next_matches_output_file : str
     The output JSON file to save the updated next matches.
+--max_workers : int
+    Number of competitions fetched concurrently (default: all of them).
+--requests_per_minute : int
+    Maximum number of API requests per minute (default: 10, the free plan quota).
+--window_days : int
+    Number of days after today whose matches are requested (default: 10). The window is doubled, up to 40 days,
+    while it holds no upcoming match, e.g. during an international break.
+--cache_dir : str
+    Directory of the TTL cache of the API responses (default: no cache).
+--cache_ttl : int
+    Validity of the cached API responses, in seconds (default: 3600).
+--unmapped_teams_output_file : str
+    Optional JSON file where the API team names missing from the mapping are saved.
 
 This script will fetch the next matches data from the football-data.org API, read the unique team names from the processed data files,
 update the team names in the next matches data using the mapping file, and save the updated next matches to a JSON file.
@@ -21,10 +34,16 @@ update the team names in the next matches data using the mapping file, and save
 from dotenv import load_dotenv
 import requests
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
 import json
+import time
+import random
+import threading
 import argparse
+from storage import get_extension, read_table
+from team_registry import TEAMS_NAMES_MAPPING, load_team_registry
 
 # Load environment variables from a .env file located in the home directory
 load_dotenv(dotenv_path=os.path.expanduser("~/.env"))
@@ -34,6 +53,13 @@ API_KEY = os.getenv("API_FOOTBALL_DATA")
 BASE_URL = 'https://api.football-data.org/v4'
 HEADERS = { 'X-Auth-Token': API_KEY }
 COLUMN_NAME = "HomeTeam"  # The column name in the CSV files containing team names
+REQUESTS_PER_MINUTE = 10  # Request quota of the football-data.org free plan
+MAX_RETRIES = 4  # Retries of a throttled (429) or failed (5xx) request
+BACKOFF_BASE_SECONDS = 2  # Base delay of the exponential backoff between retries
+REQUEST_TIMEOUT_SECONDS = 30
+MATCH_WINDOW_DAYS = 10  # Days after today requested to the API, enough to cover the next matchday
+MAX_MATCH_WINDOW_DAYS = 40  # Widest window requested when there is no match in the first one (international or winter break)
+CACHE_TTL_SECONDS = 3600  # Validity of the cached API responses
 
 #define a list to store the env variables
 env_vars_name = [
@@ -74,216 +100,328 @@ COMPETITIONS = {
     }
 }
 
+class TokenBucket:
+    """
+    Thread-safe token bucket used to respect the per-minute request quota of the API.
 
+    The bucket holds up to `capacity` tokens and is refilled at `rate_per_minute` tokens per minute,
+    each request consumes a token and waits for the next refill when the bucket is empty.
+    """
 
-TEAMS_NAMES_MAPPING = {
-    'Arsenal FC': 'Arsenal',
-    'Brighton & Hove Albion FC': 'Brighton',
-    'Brentford FC': 'Brentford',
-    'Southampton FC': 'Southampton',
-    'Everton FC': 'Everton',
-    'AFC Bournemouth': 'Bournemouth',
-    'Ipswich Town FC': 'Ipswich',
-    'Fulham FC': 'Fulham',
-    'Leicester City FC': 'Leicester',
-    'Aston Villa FC': 'Aston Villa',
-    'Nottingham Forest FC': "Nott'm Forest",
-    'Wolverhampton Wanderers FC': 'Wolves',
-    'West Ham United FC': 'West Ham',
-    'Manchester City FC': 'Man City',
-    'Chelsea FC': 'Chelsea',
-    'Crystal Palace FC': 'Crystal Palace',
-    'Newcastle United FC': 'Newcastle',
-    'Tottenham Hotspur FC': 'Tottenham',
-    'Manchester United FC': 'Man United',
-    'Liverpool FC': 'Liverpool',
-    'Villarreal CF': 'Villarreal',
-    'RC Celta de Vigo': 'Celta',
-    'RCD Mallorca': 'Mallorca',
-    'Sevilla FC': 'Sevilla',
-    'Rayo Vallecano de Madrid': 'Vallecano',
-    'FC Barcelona': 'Barcelona',
-    'Real Betis Balompié': 'Betis',
-    'Getafe CF': 'Getafe',
-    'Athletic Club': 'Ath Bilbao',
-    'Valencia CF': 'Valencia',
-    'Real Valladolid CF': 'Valladolid',
-    'CD Leganés': 'Leganes',
-    'Real Sociedad de Fútbol': 'Sociedad',
-    'Deportivo Alavés': 'Alaves',
-    'Club Atlético de Madrid': 'Ath Madrid',
-    'RCD Espanyol de Barcelona': 'Espanol',
-    'Girona FC': 'Girona',
-    'CA Osasuna': 'Osasuna',
-    'UD Las Palmas': 'Las Palmas',
-    'Real Madrid CF': 'Real Madrid',
-    'Venezia FC': 'Venezia',
-    'Torino FC': 'Torino',
-    'FC Internazionale Milano': 'Inter',
-    'Atalanta BC': 'Atalanta',
-    'Bologna FC 1909': 'Bologna',
-    'Empoli FC': 'Empoli',
-    'US Lecce': 'Lecce',
-    'Cagliari Calcio': 'Cagliari',
-    'SS Lazio': 'Lazio',
-    'AC Milan': 'Milan',
-    'SSC Napoli': 'Napoli',
-    'Parma Calcio 1913': 'Parma',
-    'ACF Fiorentina': 'Fiorentina',
-    'AC Monza': 'Monza',
-    'Genoa CFC': 'Genoa',
-    'Hellas Verona FC': 'Verona',
-    'Juventus FC': 'Juventus',
-    'AS Roma': 'Roma',
-    'Udinese Calcio': 'Udinese',
-    'Como 1907': 'Como', 
-    '1. FC Union Berlin': 'Union Berlin',
-    'FC St. Pauli 1910': 'St Pauli',
-    'VfB Stuttgart': 'Stuttgart',
-    '1. FSV Mainz 05': 'Mainz',
-    'Eintracht Frankfurt': 'Ein Frankfurt',
-    'TSG 1899 Hoffenheim': 'Hoffenheim',
-    'SV Werder Bremen': 'Werder Bremen',
-    'Borussia Dortmund': 'Dortmund',
-    'VfL Bochum 1848': 'Bochum',
-    'Borussia Mönchengladbach': "M'gladbach",
-    'Holstein Kiel': 'Holstein Kiel',
-    'VfL Wolfsburg': 'Wolfsburg',
-    'Bayer 04 Leverkusen': 'Leverkusen',
-    'RB Leipzig': 'RB Leipzig',
-    '1. FC Heidenheim 1846': 'Heidenheim',
-    'FC Augsburg': 'Augsburg',
-    'FC Bayern München': 'Bayern Munich',
-    'SC Freiburg': 'Freiburg',
-    'Olympique Lyonnais': 'Lyon',
-    'RC Strasbourg Alsace': 'Strasbourg',
-    'Stade Brestois 29': 'Brest',
-    'AS Saint-Étienne': 'St Etienne',
-    'Montpellier HSC': 'Montpellier',
-    'FC Nantes': 'Nantes',
-    'Toulouse FC': 'Toulouse',
-    'Olympique de Marseille': 'Marseille',
-    'AS Monaco FC': 'Monaco',
-    'Angers SCO': 'Angers',
-    'OGC Nice': 'Nice',
-    'Le Havre AC': 'Le Havre',
-    'AJ Auxerre': 'Auxerre',
-    'Stade de Reims': 'Reims',
-    'Stade Rennais FC 1901': 'Rennes',
-    'Lille OSC': 'Lille',
-    'Paris Saint-Germain FC': 'Paris SG',
-    'Racing Club de Lens': 'Lens',
-    'AC Ajaccio': 'Ajaccio',
-    'FC Metz': 'Metz',
-}
+    def __init__(self, rate_per_minute: int, capacity: int = None):
+        self.rate_per_second = rate_per_minute / 60
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a token is available, then consume it.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate_per_second)
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate_per_second
+            time.sleep(wait)
+
+def create_session(headers: dict, pool_size: int) -> requests.Session:
+    """
+    Create an HTTP session with a connection pool shared by the concurrent requests.
+
+    Parameters:
+    headers (dict): Headers to include in every request, including the API key.
+    pool_size (int): Maximum number of pooled connections.
 
-def get_next_matches(headers: dict, base_url: str) -> dict:
+    Returns:
+    requests.Session: The configured session.
+    """
+    session = requests.Session()
+    session.headers.update(headers)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def get_retry_delay(response: requests.Response, attempt: int) -> float:
+    """
+    Compute how long to wait before retrying a throttled or failed request.
+
+    The delay advertised by the server (Retry-After or X-RequestCounter-Reset headers) is used when present,
+    otherwise an exponential backoff. A random jitter is added so that the concurrent workers do not retry in lockstep.
+
+    Parameters:
+    response (requests.Response): The response of the failed request.
+    attempt (int): The number of the failed attempt, starting from 0.
+
+    Returns:
+    float: The delay in seconds.
+    """
+    advertised_delay = response.headers.get('Retry-After') or response.headers.get('X-RequestCounter-Reset')
+    try:
+        delay = float(advertised_delay)
+    except (TypeError, ValueError):
+        delay = BACKOFF_BASE_SECONDS * 2 ** attempt
+    return delay + random.uniform(0, BACKOFF_BASE_SECONDS)
+
+def fetch_json(session: requests.Session, url: str, bucket: TokenBucket, max_retries: int = MAX_RETRIES, params: dict = None) -> dict:
+    """
+    Fetch a JSON document from the API, respecting the rate limit and retrying throttled (429) and server (5xx) errors.
+
+    Parameters:
+    session (requests.Session): The pooled HTTP session.
+    url (str): The URL to fetch.
+    bucket (TokenBucket): The token bucket shared by all the requests.
+    max_retries (int): Maximum number of retries of a throttled or failed request.
+    params (dict): Query string parameters of the request.
+
+    Returns:
+    dict: The decoded JSON response.
+    """
+    for attempt in range(max_retries + 1):
+        bucket.acquire()
+        response = session.get(url, params=params, timeout=REQUEST_TIMEOUT_SECONDS)
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code != 429 and response.status_code < 500:
+            break
+        if attempt < max_retries:
+            delay = get_retry_delay(response, attempt)
+            print(f"Request to {url} returned status code {response.status_code}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+    raise Exception(f"Request failed with status code {response.status_code}: {response.text}")
+
+def fetch_competition_matches(session: requests.Session, base_url: str, competition_id: int, date_from: str, date_to: str,
+                              bucket: TokenBucket, cache_dir: str = None, cache_ttl: int = CACHE_TTL_SECONDS) -> dict:
+    """
+    Fetch the matches of a competition played between two dates, going through the TTL cache if enabled.
+
+    Only the matches of the requested window are asked to the API (dateFrom/dateTo filters), instead of
+    the whole season. The responses are cached as {cache_dir}/{competition_id}_{date_from}_{date_to}.json
+    and reused for `cache_ttl` seconds.
+
+    Parameters:
+    session (requests.Session): The pooled HTTP session.
+    base_url (str): Base URL of the football-data.org API.
+    competition_id (int): The football-data.org id of the competition.
+    date_from (str): First day of the window, in the format YYYY-MM-DD.
+    date_to (str): Last day of the window, in the format YYYY-MM-DD.
+    bucket (TokenBucket): The token bucket shared by all the requests.
+    cache_dir (str): Directory of the cache, None disables the cache.
+    cache_ttl (int): Validity of the cached responses, in seconds.
+
+    Returns:
+    dict: The response of the /competitions/{id}/matches endpoint.
+    """
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, f"{competition_id}_{date_from}_{date_to}.json")
+        if os.path.exists(cache_path):
+            with open(cache_path, 'r', encoding='utf-8') as cache_file:
+                cached = json.load(cache_file)
+            if time.time() - cached['fetched_at'] < cache_ttl:
+                print(f"Using cached matches for competition {competition_id} ({cache_path})")
+                return cached['data']
+
+    url = f'{base_url}/competitions/{competition_id}/matches'
+    data = fetch_json(session, url, bucket, params={'dateFrom': date_from, 'dateTo': date_to})
+
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_path + '.tmp', 'w', encoding='utf-8') as cache_file:
+            json.dump({'fetched_at': time.time(), 'data': data}, cache_file)
+        os.replace(cache_path + '.tmp', cache_path)
+    return data
+
+def parse_next_matches(competition: str, data: dict, current_date: datetime) -> list:
+    """
+    Extract the upcoming matches of the next matchday from the matches of a competition.
+
+    The next matchday is the current one if some of its matches are still to be played,
+    otherwise the first matchday with upcoming matches.
+
+    Parameters:
+    competition (str): The league acronym, used for logging.
+    data (dict): The response of the /competitions/{id}/matches endpoint.
+    current_date (datetime): Matches played before this date are skipped.
+
+    Returns:
+    list: The upcoming matches, with date, teams and crests.
+    """
+    # Keep only the matches still to be played
+    upcoming_matches = []
+    for match in data['matches']:
+        match_date = datetime.strptime(match['utcDate'], '%Y-%m-%dT%H:%M:%SZ')
+        if match_date >= current_date:
+            upcoming_matches.append((match_date, match))
+
+    if not upcoming_matches:
+        print(f'{competition}: No upcoming matches, Total Matches {len(data["matches"])}')
+        return []
+
+    current_matchday = upcoming_matches[0][1]['season']['currentMatchday']  # int
+    upcoming_matchdays = {match['matchday'] for _, match in upcoming_matches}
+    next_matchday = current_matchday if current_matchday in upcoming_matchdays else min(upcoming_matchdays)
+
+    print(f'{competition}: Current Matchday {current_matchday}, Next Matchday {next_matchday}, Total Matches {len(data["matches"])}')
+
+    next_matches = []
+    for match_date, match in upcoming_matches:
+        if match['matchday'] != next_matchday:
+            continue
+
+        # Get the match date, home team, and away team
+        formatted_date = match_date.strftime('%Y-%m-%d %H:%M:%S')
+
+        home_team = match['homeTeam']['name']
+        away_team = match['awayTeam']['name']
+
+        print(f'{formatted_date} - {home_team} vs. {away_team}')
+
+        next_matches.append({
+            'date': formatted_date,
+            'home_team': home_team,
+            'away_team': away_team,
+            # Get the crest for the home team and away team
+            'home_team_crest': match['homeTeam']['crest'],
+            'away_team_crest': match['awayTeam']['crest']
+        })
+    return next_matches
+
+def fetch_next_matches(session: requests.Session, base_url: str, competition: str, competition_id: int, current_date: datetime,
+                       window_days: int, bucket: TokenBucket, cache_dir: str = None, cache_ttl: int = CACHE_TTL_SECONDS) -> list:
+    """
+    Fetch the upcoming matches of the next matchday of a competition.
+
+    The matches of the next `window_days` days are requested first. When none is left to be played,
+    e.g. during an international break, the window is doubled until MAX_MATCH_WINDOW_DAYS.
+
+    Parameters:
+    session (requests.Session): The pooled HTTP session.
+    base_url (str): Base URL of the football-data.org API.
+    competition (str): The league acronym, used for logging.
+    competition_id (int): The football-data.org id of the competition.
+    current_date (datetime): First day of the window, the matches played before are skipped.
+    window_days (int): Number of days of the first window.
+    bucket (TokenBucket): The token bucket shared by all the requests.
+    cache_dir (str): Directory of the TTL cache of the API responses, None disables the cache.
+    cache_ttl (int): Validity of the cached responses, in seconds.
+
+    Returns:
+    list: The upcoming matches of the next matchday, empty if there is none in the widest window.
+    """
+    date_from = current_date.strftime('%Y-%m-%d')
+    while True:
+        date_to = (current_date + timedelta(days=window_days)).strftime('%Y-%m-%d')
+        data = fetch_competition_matches(session, base_url, competition_id, date_from, date_to, bucket, cache_dir, cache_ttl)
+        print(f"Matches received for {competition} until {date_to}")
+        next_matches = parse_next_matches(competition, data, current_date)
+        if next_matches or window_days >= MAX_MATCH_WINDOW_DAYS:
+            return next_matches
+        window_days = min(2 * window_days, MAX_MATCH_WINDOW_DAYS)
+        print(f"{competition}: No upcoming matches, widening the window to {window_days} days")
+
+def get_next_matches(headers: dict, base_url: str, max_workers: int = None, requests_per_minute: int = REQUESTS_PER_MINUTE,
+                     window_days: int = MATCH_WINDOW_DAYS, cache_dir: str = None, cache_ttl: int = CACHE_TTL_SECONDS) -> dict:
     """
     Get the next matches for each major league.
 
+    The competitions are fetched concurrently on a pooled session, within the per-minute quota of the API.
+    Only the matches of the next `window_days` days are requested, the window being widened when it holds no
+    upcoming match (see fetch_next_matches), and the responses can be cached on disk.
+    A competition that cannot be fetched does not stop the others: its error is returned and its
+    next matches are left empty.
+
     Parameters:
     headers (dict): Headers to include in the API request, including the API key.
     base_url (str): Base URL of the football-data.org API.
+    max_workers (int): Number of concurrent requests, one per competition if None.
+    requests_per_minute (int): Maximum number of requests per minute allowed by the API plan.
+    window_days (int): Number of days after today whose matches are requested.
+    cache_dir (str): Directory of the TTL cache of the API responses, None disables the cache.
+    cache_ttl (int): Validity of the cached responses, in seconds.
 
     Returns:
-    dict: Dictionary containing the next matches for each competition.
+    dict: Errors of the competitions that could not be fetched, keyed by competition. The next matches
+          of the other competitions are stored in COMPETITIONS.
     """
     # get the current date, it will be useful to filter the matches
     # acquiring only the next true marches without incorrect data
-    current_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    current_date = datetime.now().replace(microsecond=0)
 
     # Check if the API key is provided
     for var in env_vars_name:
         if os.getenv(var) is None:
             raise ValueError(f"Environment variable {var} is not set. Please see the README for more information.")
-    
-    try:
-        for competition, competition_info in COMPETITIONS.items():
-
-            url = f'{base_url}/competitions/{competition_info["id"]}/matches'
-            response = requests.get(url, headers=headers)
-            
-            # check if the request was successful
-            if response.status_code != 200:
-                raise Exception(f"Request failed with status code {response.status_code}: {response.text}")
-            # else if the request was successful
-            else:
-                print(f"Request successful for {competition} with status code {response.status_code}")
-                data = response.json()
-
-                current_matchday = data['matches'][0]['season']['currentMatchday']  # int
-                total_number_of_matches = len(data['matches'])  # int
-                # Get the last match day to avoid out of range error
-                last_match_day = data['matches'][-1]['matchday']
-
-                # TODO A better management of the matchday is needed
-                next_matchday = current_matchday if current_matchday < last_match_day else last_match_day
-
-                print(f'{competition}: Current Matchday {current_matchday}, Total Matches {total_number_of_matches}')  
-
-                for match in data['matches']:
-                    if match['matchday'] != next_matchday:
-                        continue
-
-                    # Get the match date, home team, and away team
-                    match_date = datetime.strptime(match['utcDate'], '%Y-%m-%dT%H:%M:%SZ')
-                    formatted_date = match_date.strftime('%Y-%m-%d %H:%M:%S')
-
-                    if match_date < datetime.strptime(current_date, '%Y-%m-%d %H:%M:%S'):
-                        continue
-
-                    home_team = match['homeTeam']['name']
-                    away_team = match['awayTeam']['name']
-
-                    print(f'{formatted_date} - {home_team} vs. {away_team}')
-
-                    # Get the crest for the home team and away team
-                    home_team_crest_url = match['homeTeam']['crest']
-                    away_team_crest_url = match['awayTeam']['crest']
-
-                    COMPETITIONS[competition]["next_matches"].append({
-                        'date': formatted_date,
-                        'home_team': home_team,
-                        'away_team': away_team,
-                        'home_team_crest': home_team_crest_url,
-                        'away_team_crest': away_team_crest_url
-                    }) 
-    except Exception as e:
-        raise Exception(f"An error occurred: {e}")
-
-def read_unique_team_names(directory_path: str, column_name: str) -> list:
+
+    max_workers = max_workers or len(COMPETITIONS)
+    bucket = TokenBucket(requests_per_minute)
+    failures = {}
+
+    with create_session(headers, max_workers) as session, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(fetch_next_matches, session, base_url, competition, competition_info["id"], current_date,
+                            window_days, bucket, cache_dir, cache_ttl): competition
+            for competition, competition_info in COMPETITIONS.items()
+        }
+        for future in as_completed(futures):
+            competition = futures[future]
+            try:
+                COMPETITIONS[competition]["next_matches"].extend(future.result())
+            except Exception as e:
+                print(f"Failed to get the next matches for {competition}: {e}")
+                failures[competition] = str(e)
+
+    return failures
+
+def read_unique_team_names(directory_path: str, column_name: str, storage_format: str = "csv") -> list:
     """
-    Read all CSV files from the specified directory and extract unique team names.
+    Extract the unique team names of the processed data.
+
+    The names are read from the team registry written by the preprocessing when available,
+    otherwise from the data files of the specified directory, reading only the team names column.
 
     Parameters:
     directory_path (str): Path to the directory containing the processed data files.
-    column_name (str): The column name in the CSV files that contains the team names.
+    column_name (str): The column name in the data files that contains the team names.
+    storage_format (str): Format of the data files: csv, parquet or feather.
 
     Returns:
-    list: List of unique team names extracted from the CSV files.
+    list: List of unique team names extracted from the data files.
     """
+    team_registry = load_team_registry(directory_path)
+    if team_registry is not None:
+        return list(team_registry["teams"])
+
     full_teams_names = []
 
     for root, dirs, files in os.walk(directory_path):
         for file in files:
-            if file.endswith('.csv'):
+            if file.endswith(get_extension(storage_format)):
                 file_path = os.path.join(root, file)
-                df = pd.read_csv(file_path)
+                df = read_table(file_path, columns=[column_name])
                 teams_name = df[column_name].unique().tolist()
                 full_teams_names.extend(teams_name)
 
     return full_teams_names
 
-def replace_team_names(matches_dict: dict, name_mapping: dict) -> dict:
+def replace_team_names(matches_dict: dict, name_mapping: dict, known_teams=()) -> tuple:
     """
     Replace team names in the next_matches dictionary using the provided name mapping.
 
     Parameters:
     matches_dict (dict): Dictionary containing the next matches for each competition.
     name_mapping (dict): Dictionary mapping the official team names to their equivalents in full_teams_names.
+    known_teams (collection): Team names of the processed data, the names already in this naming are not reported as unmapped.
 
     Returns:
-    dict: Updated matches_dict with team names replaced according to name_mapping.
+    tuple: Updated matches_dict with team names replaced according to name_mapping, and the list of the
+           unmapped names, each one as {"league": ..., "side": "home_team" or "away_team", "team": ...}.
 
     Expected schema of matches_dict:
     {
@@ -294,13 +432,41 @@ def replace_team_names(matches_dict: dict, name_mapping: dict) -> dict:
 
            ...
     """
+    unmapped_teams = []
     for league, leagues_info in matches_dict.items():
         for match in leagues_info["next_matches"]:
-            if match['home_team'] in name_mapping:
-                match['home_team'] = name_mapping[match['home_team']]
-            if match['away_team'] in name_mapping:
-                match['away_team'] = name_mapping[match['away_team']]
-    return matches_dict
+            for side in ('home_team', 'away_team'):
+                if match[side] in name_mapping:
+                    match[side] = name_mapping[match[side]]
+                elif match[side] not in known_teams:
+                    unmapped_teams.append({"league": league, "side": side, "team": match[side]})
+    return matches_dict, unmapped_teams
+
+def update_team_names(matches_dict: dict, teams_names_dir: str) -> tuple:
+    """
+    Replace the API team names of the next matches with the football-data.co.uk ones.
+
+    The team registry written by the preprocessing is used when available, otherwise the static
+    mapping and the team names of the processed data files.
+
+    Parameters:
+    matches_dict (dict): Dictionary containing the next matches for each competition.
+    teams_names_dir (str): The directory containing the processed data files and the team registry.
+
+    Returns:
+    tuple: The updated matches_dict and the list of the unmapped names (see replace_team_names).
+    """
+    team_registry = load_team_registry(teams_names_dir)
+    if team_registry is not None:
+        name_mapping, known_teams = team_registry["api_names"], team_registry["teams"]
+    else:
+        name_mapping = TEAMS_NAMES_MAPPING
+        known_teams = set(read_unique_team_names(teams_names_dir, COLUMN_NAME))
+    matches_dict, unmapped_teams = replace_team_names(matches_dict, name_mapping, known_teams)
+
+    if unmapped_teams:
+        print(f"Unmapped team names, please add them to TEAMS_NAMES_MAPPING:\n{json.dumps(unmapped_teams, indent=4, ensure_ascii=False)}")
+    return matches_dict, unmapped_teams
 
 def save_to_json(data: dict, filename: str):
     """
@@ -340,6 +506,49 @@ def parse_arguments():
         required=True, 
         help="The output JSON file to save the updated next matches."
     )
+
+    parser.add_argument(
+        "--max_workers", 
+        type=int,
+        default=None, 
+        help="Number of competitions fetched concurrently (default: all of them)."
+    )
+
+    parser.add_argument(
+        "--requests_per_minute", 
+        type=int,
+        default=REQUESTS_PER_MINUTE, 
+        help=f"Maximum number of API requests per minute (default: {REQUESTS_PER_MINUTE}, the free plan quota)."
+    )
+
+    parser.add_argument(
+        "--window_days", 
+        type=int,
+        default=MATCH_WINDOW_DAYS, 
+        help=f"Number of days after today whose matches are requested, widened up to {MAX_MATCH_WINDOW_DAYS} days while "
+             f"it holds no upcoming match (default: {MATCH_WINDOW_DAYS})."
+    )
+
+    parser.add_argument(
+        "--cache_dir", 
+        type=str,
+        default=None, 
+        help="Directory of the TTL cache of the API responses (default: no cache)."
+    )
+
+    parser.add_argument(
+        "--cache_ttl", 
+        type=int,
+        default=CACHE_TTL_SECONDS, 
+        help=f"Validity of the cached API responses, in seconds (default: {CACHE_TTL_SECONDS})."
+    )
+
+    parser.add_argument(
+        "--unmapped_teams_output_file", 
+        type=str,
+        default=None, 
+        help="Optional JSON file where the API team names missing from the mapping are saved."
+    )
     
     return parser.parse_args()
 
@@ -348,10 +557,16 @@ if __name__ == "__main__":
     args = parse_arguments()
 
     # Step 1: Fetch the next matches data
-    get_next_matches(HEADERS, BASE_URL)
-
-    # Step 2: Replace team names in the next matches using the mapping
-    next_matches_fd_couk_format = replace_team_names(COMPETITIONS, TEAMS_NAMES_MAPPING)
+    failures = get_next_matches(HEADERS, BASE_URL, args.max_workers, args.requests_per_minute,
+                                args.window_days, args.cache_dir, args.cache_ttl)
+    if failures:
+        print(f"Next matches not available for: {', '.join(failures)}")
+
+    # Step 2: Replace team names in the next matches using the team registry written by the preprocessing,
+    # falling back to the static mapping and to the team names of the processed data
+    next_matches_fd_couk_format, unmapped_teams = update_team_names(COMPETITIONS, args.get_teams_names_dir)
+    if args.unmapped_teams_output_file:
+        save_to_json(unmapped_teams, args.unmapped_teams_output_file)
 
     # Step 3: Save the updated next_matches dictionary to a JSON file
     save_to_json(next_matches_fd_couk_format, args.next_matches_output_file)
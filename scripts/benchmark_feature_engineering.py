@@ -0,0 +1,254 @@
+"""
+Benchmark of the vectorized feature engineering of data_preprocessing.py against the reference implementation,
+which computes the last-5 features with a Python lambda per group and per column.
+
+Usage:
+------
+Run this script from the terminal in the root folder as follows:
+
+    python scripts/benchmark_feature_engineering.py --raw_data_dir data/raw --synthetic_seasons 50 --synthetic_leagues 8 --windows 3 5 10 --repeat 3
+
+Parameters:
+-----------
+--raw_data_dir : str
+    Directory containing the raw merged CSV files of the leagues.
+--synthetic_seasons : int
+    Number of seasons of the synthetic league (20 teams, 380 matches per season), 0 to skip it.
+--synthetic_leagues : int
+    Number of synthetic lower divisions (3 seasons each) added to the bundled leagues for the combined
+    feature engineering benchmark, 0 to use the bundled leagues only.
+--windows : int
+    Space-separated numbers of matches of the rolling features of the multi-window benchmark.
+--repeat : int
+    Number of times each implementation is run, the best time is reported.
+
+For each dataset the script checks that both implementations return exactly the same DataFrame,
+then reports their best times and the speedup. It then checks that engineering all the leagues in a
+single pass (feature_engineering_leagues) returns the same DataFrames as one call per league, and
+reports both times. Finally, it checks the rolling features of several windows against the reference
+lambdas and compares the time of the multi-window pass with the default single window.
+"""
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from benchmark_storage import best_time
+from data_preprocessing import add_match_columns, determine_season, feature_engineering, feature_engineering_leagues
+
+
+def feature_engineering_reference(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reference implementation of data_preprocessing.feature_engineering, with the rolling features
+    computed by groupby(...).transform(lambda ...).
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame to process.
+
+    Returns:
+    pd.DataFrame: The DataFrame with new features added.
+    """
+    df['Date'] = pd.to_datetime(df['Date'], format='%d/%m/%Y')
+    df['Season'] = df['Date'].apply(determine_season)
+
+    df["Over2.5"] = np.where(df["FTHG"] + df["FTAG"] > 2, 1, 0)
+    df['AvgHomeGoalsScored'] = df.groupby(['Season', 'HomeTeam'])['FTHG'].transform('mean').round(2)
+    df['AvgAwayGoalsScored'] = df.groupby(['Season', 'AwayTeam'])['FTAG'].transform('mean').round(2)
+    df['AvgHomeGoalsConceded'] = df.groupby(['Season', 'HomeTeam'])['FTAG'].transform('mean').round(2)
+    df['AvgAwayGoalsConceded'] = df.groupby(['Season', 'AwayTeam'])['FTHG'].transform('mean').round(2)
+    df['HomeOver2.5Perc'] = (df.groupby(['Season', 'HomeTeam'])['Over2.5'].transform('mean') * 100).round(2)
+    df['AwayOver2.5Perc'] = (df.groupby(['Season', 'AwayTeam'])['Over2.5'].transform('mean') * 100).round(2)
+
+    df = df.sort_values(by=['HomeTeam', 'Date'])
+    df['AvgLast5HomeGoalsScored'] = df.groupby(['Season', 'HomeTeam'])['FTHG'].transform(
+        lambda x: x.rolling(5, min_periods=1).mean()).round(2)
+    df['AvgLast5HomeGoalsConceded'] = df.groupby(['Season', 'HomeTeam'])['FTAG'].transform(
+        lambda x: x.rolling(5, min_periods=1).mean()).round(2)
+    df['Last5HomeOver2.5Count'] = df.groupby(['Season', 'HomeTeam'])['Over2.5'].transform(
+        lambda x: x.rolling(5, min_periods=1).sum()).round(2)
+    df['Last5HomeOver2.5Perc'] = df.groupby(['Season', 'HomeTeam'])['Over2.5'].transform(
+        lambda x: x.rolling(5, min_periods=1).mean() * 100).round(2)
+
+    df = df.sort_values(by=['AwayTeam', 'Date'])
+    df['AvgLast5AwayGoalsScored'] = df.groupby(['Season', 'AwayTeam'])['FTAG'].transform(
+        lambda x: x.rolling(5, min_periods=1).mean()).round(2)
+    df['AvgLast5AwayGoalsConceded'] = df.groupby(['Season', 'AwayTeam'])['FTHG'].transform(
+        lambda x: x.rolling(5, min_periods=1).mean()).round(2)
+    df['Last5AwayOver2.5Count'] = df.groupby(['Season', 'AwayTeam'])['Over2.5'].transform(
+        lambda x: x.rolling(5, min_periods=1).sum()).round(2)
+    df['Last5AwayOver2.5Perc'] = df.groupby(['Season', 'AwayTeam'])['Over2.5'].transform(
+        lambda x: x.rolling(5, min_periods=1).mean() * 100).round(2)
+    return df
+
+
+def make_synthetic_league(num_seasons: int, num_teams: int = 20, seed: int = 42, division: str = "SYN") -> pd.DataFrame:
+    """
+    Generate a synthetic league in the raw format: a double round robin per season, one matchday per week,
+    with Poisson distributed goals.
+
+    Parameters:
+    num_seasons (int): Number of seasons.
+    num_teams (int): Number of teams.
+    seed (int): Seed of the random generator.
+    division (str): Value of the Div column.
+
+    Returns:
+    pd.DataFrame: The matches, with the Div, Date, HomeTeam, AwayTeam, FTHG and FTAG columns.
+    """
+    rng = np.random.default_rng(seed)
+    teams = [f"Team{i:02d}" for i in range(num_teams)]
+    rows = []
+    for season in range(num_seasons):
+        season_start = pd.Timestamp(year=1970 + season, month=8, day=15)
+        fixtures = [(home, away) for home in teams for away in teams if home != away]
+        rng.shuffle(fixtures)
+        matches_per_week = num_teams // 2
+        for i, (home, away) in enumerate(fixtures):
+            date = season_start + pd.Timedelta(weeks=i // matches_per_week)
+            rows.append((division, date.strftime('%d/%m/%Y'), home, away))
+    df = pd.DataFrame(rows, columns=['Div', 'Date', 'HomeTeam', 'AwayTeam'])
+    df['FTHG'] = rng.poisson(1.5, len(df))
+    df['FTAG'] = rng.poisson(1.2, len(df))
+    return df
+
+
+def benchmark_dataset(name: str, df: pd.DataFrame, repeat: int) -> dict:
+    """
+    Check that both implementations return the same DataFrame and time them.
+
+    Parameters:
+    name (str): Name of the dataset.
+    df (pd.DataFrame): The raw matches.
+    repeat (int): Number of runs of each implementation.
+
+    Returns:
+    dict: The best times in milliseconds and the speedup.
+    """
+    pd.testing.assert_frame_equal(feature_engineering(df.copy()), feature_engineering_reference(df.copy()), check_exact=True)
+    reference_seconds = best_time(lambda: feature_engineering_reference(df.copy()), repeat)
+    vectorized_seconds = best_time(lambda: feature_engineering(df.copy()), repeat)
+    return {
+        'dataset': name,
+        'rows': len(df),
+        'reference_ms': round(reference_seconds * 1000, 1),
+        'vectorized_ms': round(vectorized_seconds * 1000, 1),
+        'speedup': round(reference_seconds / vectorized_seconds, 1),
+    }
+
+
+def rolling_features_reference(df: pd.DataFrame, window: int) -> pd.DataFrame:
+    """
+    Reference rolling features of a window, computed by groupby(...).transform(lambda ...).
+
+    Parameters:
+    df (pd.DataFrame): The raw matches.
+    window (int): Number of matches of the rolling window.
+
+    Returns:
+    pd.DataFrame: The rolling features of the window, with the index of df.
+    """
+    df = add_match_columns(df.copy())
+    reference = pd.DataFrame(index=df.index)
+    # The matches of a team on the same day keep the order of the successive sorts of feature_engineering
+    for side, team_column, scored, conceded in (('Home', 'HomeTeam', 'FTHG', 'FTAG'), ('Away', 'AwayTeam', 'FTAG', 'FTHG')):
+        df = df.sort_values(by=[team_column, 'Date'])
+        groups = df.groupby(['Season', team_column])
+        reference[f'AvgLast{window}{side}GoalsScored'] = groups[scored].transform(lambda x: x.rolling(window, min_periods=1).mean()).round(2)
+        reference[f'AvgLast{window}{side}GoalsConceded'] = groups[conceded].transform(lambda x: x.rolling(window, min_periods=1).mean()).round(2)
+        reference[f'Last{window}{side}Over2.5Count'] = groups['Over2.5'].transform(lambda x: x.rolling(window, min_periods=1).sum()).round(2)
+        reference[f'Last{window}{side}Over2.5Perc'] = groups['Over2.5'].transform(lambda x: x.rolling(window, min_periods=1).mean() * 100).round(2)
+    return reference
+
+
+def benchmark_windows(name: str, df: pd.DataFrame, windows: list, repeat: int) -> dict:
+    """
+    Check the rolling features of several windows against the reference and time the multi-window pass
+    against the default single window.
+
+    Parameters:
+    name (str): Name of the dataset.
+    df (pd.DataFrame): The raw matches.
+    windows (list of int): Numbers of matches of the rolling windows.
+    repeat (int): Number of runs of each configuration.
+
+    Returns:
+    dict: The best times in milliseconds and the overhead of the extra windows.
+    """
+    engineered = feature_engineering(df.copy(), windows=windows)
+    for window in windows:
+        reference = rolling_features_reference(df, window).loc[engineered.index]
+        pd.testing.assert_frame_equal(engineered[reference.columns], reference, check_exact=True)
+    single_seconds = best_time(lambda: feature_engineering(df.copy()), repeat)
+    multi_seconds = best_time(lambda: feature_engineering(df.copy(), windows=windows), repeat)
+    return {
+        'dataset': name,
+        'windows': ' '.join(str(window) for window in windows),
+        'single_window_ms': round(single_seconds * 1000, 1),
+        'multi_window_ms': round(multi_seconds * 1000, 1),
+        'overhead_perc': round((multi_seconds / single_seconds - 1) * 100, 1),
+    }
+
+
+def benchmark_leagues(leagues: dict, repeat: int) -> dict:
+    """
+    Check that the single-pass feature engineering of several leagues returns the same DataFrames as one call
+    per league and time both.
+
+    Parameters:
+    leagues (dict): The raw matches of each league.
+    repeat (int): Number of runs of each implementation.
+
+    Returns:
+    dict: The best times in milliseconds and the speedup.
+    """
+    combined = feature_engineering_leagues(leagues)
+    for league, df in leagues.items():
+        pd.testing.assert_frame_equal(combined[league], feature_engineering(df.copy()), check_exact=True)
+    per_league_seconds = best_time(lambda: [feature_engineering(df.copy()) for df in leagues.values()], repeat)
+    combined_seconds = best_time(lambda: feature_engineering_leagues(leagues), repeat)
+    return {
+        'leagues': len(leagues),
+        'rows': sum(len(df) for df in leagues.values()),
+        'per_league_ms': round(per_league_seconds * 1000, 1),
+        'combined_ms': round(combined_seconds * 1000, 1),
+        'speedup': round(per_league_seconds / combined_seconds, 1),
+    }
+
+
+def parse_arguments():
+    """
+    Parse command-line arguments.
+
+    Returns:
+    argparse.Namespace: Parsed command-line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized feature engineering against the reference implementation.")
+    parser.add_argument("--raw_data_dir", type=str, default="data/raw", help="Directory containing the raw merged CSV files.")
+    parser.add_argument("--synthetic_seasons", type=int, default=50, help="Number of seasons of the synthetic league, 0 to skip it.")
+    parser.add_argument("--synthetic_leagues", type=int, default=8, help="Number of synthetic lower divisions of the combined benchmark.")
+    parser.add_argument("--windows", nargs="+", type=int, default=[3, 5, 10], help="Numbers of matches of the multi-window benchmark.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs of each implementation.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    datasets = []
+    for filename in sorted(os.listdir(args.raw_data_dir)):
+        if filename.endswith(".csv"):
+            datasets.append((filename, pd.read_csv(os.path.join(args.raw_data_dir, filename))))
+    if args.synthetic_seasons > 0:
+        datasets.append((f"synthetic_{args.synthetic_seasons}_seasons", make_synthetic_league(args.synthetic_seasons)))
+
+    results_df = pd.DataFrame([benchmark_dataset(name, df, args.repeat) for name, df in datasets])
+    print(results_df.to_string(index=False))
+
+    # Bundled leagues plus the synthetic lower divisions, engineered one by one and in a single pass
+    leagues = {name.split('_')[0]: df for name, df in datasets if not name.startswith("synthetic")}
+    for i in range(args.synthetic_leagues):
+        leagues[f"SYN{i}"] = make_synthetic_league(3, seed=i, division=f"SYN{i}")
+    print(pd.DataFrame([benchmark_leagues(leagues, args.repeat)]).to_string(index=False))
+
+    # Several rolling windows in a single pass against the default window
+    print(pd.DataFrame([benchmark_windows(name, df, args.windows, args.repeat) for name, df in datasets]).to_string(index=False))
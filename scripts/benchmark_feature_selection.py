@@ -0,0 +1,145 @@
+"""
+Benchmark of the native feature selection engine (mrmr_native.py) against the mrmr-selection package,
+on the bundled leagues and on synthetic datasets with several hundred features.
+
+Usage:
+------
+Run this script from the terminal in the root folder as follows:
+
+    python scripts/benchmark_feature_selection.py --raw_data_dir data/raw --synthetic_features 300 600 --repeat 1
+
+Parameters:
+-----------
+--raw_data_dir : str
+    Directory containing the raw merged CSV files of the leagues.
+--synthetic_features : int
+    A space-separated list of numbers of candidate features of the synthetic datasets, none to skip them.
+--synthetic_rows : int
+    Number of rows of the synthetic datasets.
+--num_features : int
+    Number of features selected by mRMR.
+--clustering_threshold : float
+    The threshold for hierarchical clustering to form flat clusters.
+--repeat : int
+    Number of times each engine is run, the best time is reported.
+
+For each dataset the script reports the best times of both engines and the speedup. The parity of the
+engines (same mRMR ranking, same features after clustering) is checked by tests/test_mrmr_native.py.
+"""
+
+import os
+import io
+import argparse
+import warnings
+import numpy as np
+import pandas as pd
+from contextlib import redirect_stderr, redirect_stdout
+from benchmark_storage import best_time
+from data_preprocessing import drop_useless_columns, feature_engineering, feature_selection, handle_missing_values
+
+
+def prepare_league(file_path: str) -> pd.DataFrame:
+    """
+    Prepare the data of a league as the preprocessing does before the feature selection.
+
+    Parameters:
+    file_path (str): Path to the raw CSV file of the league.
+
+    Returns:
+    pd.DataFrame: The data passed to feature_selection.
+    """
+    with redirect_stdout(io.StringIO()):
+        df = feature_engineering(pd.read_csv(file_path))
+        df = drop_useless_columns(df, ['FTHG', 'FTAG', 'HTHG', 'HTAG'])
+        return handle_missing_values(df)
+
+
+def make_synthetic_dataset(num_rows: int, num_features: int, seed: int = 42) -> pd.DataFrame:
+    """
+    Generate a dataset with groups of correlated features and a binary target depending on some of them.
+
+    Parameters:
+    num_rows (int): Number of rows.
+    num_features (int): Number of candidate features.
+    seed (int): Seed of the random generator.
+
+    Returns:
+    pd.DataFrame: The dataset, with the Date and Over2.5 columns expected by feature_selection.
+    """
+    rng = np.random.default_rng(seed)
+    # Each feature is a noisy copy of one of the latent factors, a third of which drive the target
+    num_factors = max(num_features // 10, 2)
+    factors = rng.normal(size=(num_rows, num_factors))
+    loadings = rng.integers(0, num_factors, num_features)
+    noise_levels = rng.uniform(0.1, 2.0, num_features)
+    values = factors[:, loadings] + rng.normal(size=(num_rows, num_features)) * noise_levels
+    logits = factors[:, : num_factors // 3 + 1].sum(axis=1)
+    df = pd.DataFrame(np.round(values, 2), columns=[f"feature_{i:03d}" for i in range(num_features)])
+    df.insert(0, 'Date', pd.date_range('2000-08-01', periods=num_rows, freq='D'))
+    df['Over2.5'] = (logits + rng.normal(size=num_rows) > 0).astype(int)
+    return df
+
+
+def benchmark_dataset(name: str, df: pd.DataFrame, num_features: int, clustering_threshold: float, repeat: int) -> dict:
+    """
+    Time the feature selection of both engines.
+
+    Parameters:
+    name (str): Name of the dataset.
+    df (pd.DataFrame): The data passed to feature_selection.
+    num_features (int): Number of features selected by mRMR.
+    clustering_threshold (float): The threshold for hierarchical clustering.
+    repeat (int): Number of runs of each engine.
+
+    Returns:
+    dict: The best times in milliseconds and the speedup.
+    """
+    X = df.drop(["Date"], axis=1).select_dtypes(include='number').drop(['Over2.5'], axis=1)
+
+    def select(engine):
+        # The mrmr-selection package prints a progress bar
+        with redirect_stderr(io.StringIO()):
+            return feature_selection(df, num_features=num_features, clustering_threshold=clustering_threshold, engine=engine)
+
+    mrmr_seconds = best_time(lambda: select("mrmr"), repeat)
+    native_seconds = best_time(lambda: select("native"), repeat)
+    return {
+        'dataset': name,
+        'rows': len(df),
+        'candidates': X.shape[1],
+        'mrmr_ms': round(mrmr_seconds * 1000, 1),
+        'native_ms': round(native_seconds * 1000, 1),
+        'speedup': round(mrmr_seconds / native_seconds, 1),
+    }
+
+
+def parse_arguments():
+    """
+    Parse command-line arguments.
+
+    Returns:
+    argparse.Namespace: Parsed command-line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the native feature selection engine against mrmr-selection.")
+    parser.add_argument("--raw_data_dir", type=str, default="data/raw", help="Directory containing the raw merged CSV files.")
+    parser.add_argument("--synthetic_features", nargs="*", type=int, default=[300, 600], help="Numbers of candidate features of the synthetic datasets.")
+    parser.add_argument("--synthetic_rows", type=int, default=2000, help="Number of rows of the synthetic datasets.")
+    parser.add_argument("--num_features", type=int, default=20, help="Number of features selected by mRMR.")
+    parser.add_argument("--clustering_threshold", type=float, default=0.5, help="The threshold for hierarchical clustering to form flat clusters.")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of runs of each engine.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    warnings.filterwarnings("ignore")
+
+    datasets = []
+    for filename in sorted(os.listdir(args.raw_data_dir)):
+        if filename.endswith(".csv"):
+            datasets.append((filename, prepare_league(os.path.join(args.raw_data_dir, filename))))
+    for num_features in args.synthetic_features:
+        datasets.append((f"synthetic_{num_features}_features", make_synthetic_dataset(args.synthetic_rows, num_features)))
+
+    results_df = pd.DataFrame([benchmark_dataset(name, df, args.num_features, args.clustering_threshold, args.repeat) for name, df in datasets])
+    print(results_df.to_string(index=False))
@@ -0,0 +1,104 @@
+"""
+Benchmark of the storage formats supported by storage.py on the raw and processed datasets.
+
+Usage:
+------
+Run this script from the terminal in the root folder as follows:
+
+    python scripts/benchmark_storage.py --data_dirs data/raw data/processed --repeat 5
+
+Parameters:
+-----------
+--data_dirs : str
+    A space-separated list of directories containing the CSV files to benchmark.
+--repeat : int
+    Number of times each read and write is repeated, the best time is reported.
+
+For each CSV file and each storage format, the script writes the file to a temporary directory,
+reads it back and reports the best write time, the best read time and the file size.
+"""
+
+import os
+import time
+import argparse
+import tempfile
+import pandas as pd
+from storage import STORAGE_FORMATS, read_table, write_table
+
+
+def best_time(function, repeat: int) -> float:
+    """
+    Return the best wall-clock time of a function over several runs.
+
+    Parameters:
+    function (callable): The function to time, called without arguments.
+    repeat (int): Number of runs.
+
+    Returns:
+    float: The best time in seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmark_file(file_path: str, output_dir: str, repeat: int) -> list:
+    """
+    Benchmark every storage format on a single CSV file.
+
+    Parameters:
+    file_path (str): Path to the CSV file.
+    output_dir (str): Directory where the converted files are written.
+    repeat (int): Number of runs of each read and write.
+
+    Returns:
+    list of dict: One result per storage format.
+    """
+    df = pd.read_csv(file_path)
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    results = []
+    for storage_format in STORAGE_FORMATS:
+        path_without_extension = os.path.join(output_dir, f"{name}_{storage_format}")
+        write_seconds = best_time(lambda: write_table(df, path_without_extension, storage_format), repeat)
+        path = write_table(df, path_without_extension, storage_format)
+        read_seconds = best_time(lambda: read_table(path), repeat)
+        results.append({
+            'file': os.path.basename(file_path),
+            'format': storage_format,
+            'write_ms': round(write_seconds * 1000, 2),
+            'read_ms': round(read_seconds * 1000, 2),
+            'size_kb': round(os.path.getsize(path) / 1024, 1),
+        })
+    return results
+
+
+def parse_arguments():
+    """
+    Parse command-line arguments.
+
+    Returns:
+    argparse.Namespace: Parsed command-line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the storage formats on the raw and processed datasets.")
+    parser.add_argument("--data_dirs", nargs="+", default=["data/raw", "data/processed"], help="Directories containing the CSV files to benchmark.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs of each read and write.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    results = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for data_dir in args.data_dirs:
+            for filename in sorted(os.listdir(data_dir)):
+                if filename.endswith(".csv"):
+                    results.extend(benchmark_file(os.path.join(data_dir, filename), output_dir, args.repeat))
+
+    results_df = pd.DataFrame(results)
+    print(results_df.to_string(index=False))
+    print("\nTotals per format:")
+    print(results_df.groupby('format')[['write_ms', 'read_ms', 'size_kb']].sum().round(1).to_string())
@@ -15,14 +15,31 @@ Parameters:
     A space-separated list of season codes (e.g., 2324 2223).
 --raw_data_output_dir : str
     Directory where the merged CSV files will be saved.
+--storage_format : str
+    Format of the merged files: csv (default), parquet or feather.
+--max_workers : int
+    Number of league/season files downloaded concurrently (default: 1).
+--cache_dir : str
+    Directory of the on-disk HTTP cache of the season files (default: no cache).
+    Closed seasons are read from the cache, the open one is revalidated with a conditional GET.
+--incremental : flag
+    Only download the open seasons and upsert their matches, keyed on (Div, Date, HomeTeam, AwayTeam),
+    into the existing merged files. Leagues without a merged file are merged from scratch.
 
 This script will download the corresponding CSV files from football-data.co.uk,
 merge them by league, and save the resulting files in the specified output directory.
 """
 
 import os
+import io
+import json
 import argparse
 import pandas as pd
+from collections import Counter
+from storage import STORAGE_FORMATS, CATEGORICAL_COLUMNS, apply_schema, get_extension, read_table, write_table
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Valid league acronyms
 VALID_LEAGUES = ["E0", "E1", "E2", "E3", "EC", "I1", "I2", "D1", "D2", "SP1", "SP2", "F1", "F2"]
@@ -30,6 +47,15 @@ VALID_LEAGUES = ["E0", "E1", "E2", "E3", "EC", "I1", "I2", "D1", "D2", "SP1", "S
 # Valid season codes (limiting to recent years only)
 VALID_SEASONS = ["2425","2324", "2223", "2122", "2021"]
 
+# Seasons whose files are not updated anymore, once cached they are never requested again
+CLOSED_SEASONS = ["2324", "2223", "2122", "2021"]
+
+# Columns identifying a match, used to upsert rows in incremental mode
+MATCH_KEY_COLUMNS = ["Div", "Date", "HomeTeam", "AwayTeam"]
+
+# Base URL of the season files on football-data.co.uk
+BASE_URL = "https://www.football-data.co.uk/mmz4281"
+
 def validate_leagues(leagues):
     """
     Validates the list of league acronyms.
@@ -66,11 +92,377 @@ def validate_seasons(seasons):
         if season not in VALID_SEASONS:
             raise ValueError(f"Invalid season code: {season}. Allowed values are {', '.join(VALID_SEASONS)}")
 
-def download_and_merge_data(leagues, seasons, raw_data_output_dir):
+def fetch_season_file(league, season, base_url=BASE_URL, cache_dir=None):
+    """
+    Downloads the raw CSV file of a single league and season, going through the on-disk cache if enabled.
+
+    Cached files are stored as {cache_dir}/{season}/{league}.csv, together with the ETag and
+    Last-Modified headers of the response in {cache_dir}/{season}/{league}.meta.json.
+    Closed seasons are served from the cache without any request, the other seasons are
+    revalidated with a conditional GET.
+
+    Parameters
+    ----------
+    league : str
+        League acronym (e.g., "E0").
+    season : str
+        Season code (e.g., "2324").
+    base_url : str
+        Base URL of the season files, the file is expected at {base_url}/{season}/{league}.csv.
+    cache_dir : str or None
+        Directory of the cache, None disables the cache.
+
+    Returns
+    -------
+    content : bytes
+        The content of the CSV file.
+    cache_status : str
+        "hit" if served from the cache without any request, "not_modified" if revalidated
+        by the server, "miss" if downloaded.
+    """
+    url = f"{base_url}/{season}/{league}.csv"
+    if cache_dir is None:
+        with urlopen(url) as response:
+            return response.read(), "miss"
+
+    csv_path = os.path.join(cache_dir, season, f"{league}.csv")
+    meta_path = os.path.join(cache_dir, season, f"{league}.meta.json")
+    cached = os.path.exists(csv_path) and os.path.exists(meta_path)
+
+    if cached and season in CLOSED_SEASONS:
+        with open(csv_path, 'rb') as f:
+            return f.read(), "hit"
+
+    request = Request(url)
+    if cached:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        if meta.get("etag"):
+            request.add_header("If-None-Match", meta["etag"])
+        if meta.get("last_modified"):
+            request.add_header("If-Modified-Since", meta["last_modified"])
+
+    try:
+        with urlopen(request) as response:
+            content = response.read()
+            meta = {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+    except HTTPError as e:
+        if e.code == 304 and cached:
+            with open(csv_path, 'rb') as f:
+                return f.read(), "not_modified"
+        raise
+
+    # Write to temporary files first, so that an interrupted run never leaves a partial entry
+    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    with open(csv_path + ".tmp", 'wb') as f:
+        f.write(content)
+    with open(meta_path + ".tmp", 'w') as f:
+        json.dump(meta, f)
+    os.replace(csv_path + ".tmp", csv_path)
+    os.replace(meta_path + ".tmp", meta_path)
+
+    return content, "miss"
+
+def fetch_season_data(league, season, base_url=BASE_URL, cache_dir=None):
+    """
+    Downloads the CSV file of a single league and season.
+
+    The content is returned unparsed, so that the header can be inspected before
+    reading only the needed columns (see merge_league_data).
+
+    Parameters
+    ----------
+    league : str
+        League acronym (e.g., "E0").
+    season : str
+        Season code (e.g., "2324").
+    base_url : str
+        Base URL of the season files, the file is expected at {base_url}/{season}/{league}.csv.
+    cache_dir : str or None
+        Directory of the on-disk cache, None disables the cache.
+
+    Returns
+    -------
+    content : bytes or None
+        The content of the CSV file, or None if the download failed.
+    cache_status : str
+        "hit", "not_modified" or "miss" (see fetch_season_file), "failed" if the download failed.
+    """
+    url = f"{base_url}/{season}/{league}.csv"
+    try:
+        content, cache_status = fetch_season_file(league, season, base_url, cache_dir)
+        read_season_header(content)  # Fail early on files that cannot be parsed
+        print(f"Downloaded data from {url} (cache: {cache_status})")
+        return content, cache_status
+    except Exception as e:
+        print(f"Failed to download data from {url}: {e}")
+        return None, "failed"
+
+def read_season_header(content):
+    """
+    Reads only the header of a season file.
+
+    Parameters
+    ----------
+    content : bytes
+        The content of the CSV file.
+
+    Returns
+    -------
+    columns : list of str
+        The column names, in file order.
+    """
+    return pd.read_csv(io.BytesIO(content), nrows=0).columns.tolist()
+
+def read_season_data(content, columns=None):
+    """
+    Parses a season file, reading only the requested columns.
+
+    Parameters
+    ----------
+    content : bytes
+        The content of the CSV file.
+    columns : list of str or None
+        The columns to read, in the requested order. All the columns if None.
+
+    Returns
+    -------
+    df : pd.DataFrame
+        The season data.
+    """
+    df = pd.read_csv(io.BytesIO(content), usecols=columns)
+    return df if columns is None else df[columns]
+
+def get_common_columns(column_lists):
+    """
+    Returns the columns shared by all the column lists, in the order of the first one.
+
+    Parameters
+    ----------
+    column_lists : list of list of str
+        The columns to intersect (e.g., the headers of the season files).
+
+    Returns
+    -------
+    common_columns : list of str
+        The common columns, preserving the column order of the first list.
+    """
+    column_order = list(column_lists[0])  # Preserve initial column order
+    common_columns = set(column_order)
+    for columns in column_lists[1:]:
+        common_columns.intersection_update(columns)
+    return [col for col in column_order if col in common_columns]
+
+def merge_league_data(league, season_contents, raw_data_output_dir, storage_format="csv"):
+    """
+    Merges the seasons of a league, keeping only the common columns and preserving
+    the column order of the first season, and saves the result.
+
+    The merge runs in two phases: the headers of the season files are read first to resolve
+    the common columns, then each season is parsed with only those columns and appended to
+    the output file, so that at most one season is held in memory. The columnar formats cannot
+    be appended to, so their pruned seasons are concatenated before being written.
+
+    Parameters
+    ----------
+    league : str
+        League acronym (e.g., "E0").
+    season_contents : list of bytes
+        The downloaded season files, in the order they have been requested.
+    raw_data_output_dir : str
+        Directory where the merged file will be saved.
+    storage_format : str
+        Format of the merged file: csv, parquet or feather.
+
+    Returns
+    -------
+    None
+    """
+    if not season_contents:
+        return
+
+    # Phase 1: determine the common columns across all the season headers
+    common_columns = get_common_columns([read_season_header(content) for content in season_contents])
+    if not common_columns:
+        return
+
+    # Phase 2: read each season with only the common columns and stream it to the output file
+    output_path_without_extension = os.path.join(raw_data_output_dir, f"{league}_merged")
+    if storage_format == "csv":
+        output_path = output_path_without_extension + get_extension(storage_format)
+        # Write to a temporary file first, so that an interrupted run never leaves a partial merge
+        for i, content in enumerate(season_contents):
+            season_df = read_season_data(content, common_columns)
+            season_df.to_csv(output_path + ".tmp", mode='w' if i == 0 else 'a', header=i == 0, index=False)
+            del season_df
+        os.replace(output_path + ".tmp", output_path)
+    else:
+        merged_df = pd.concat([read_season_data(content, common_columns) for content in season_contents], ignore_index=True)
+        output_path = write_table(merged_df, output_path_without_extension, storage_format)
+    print(f"Saved merged data to {output_path}")
+
+def same_values(left, right):
+    """
+    Checks whether two frames hold the same values, whatever the dtypes of their columns
+    (e.g., a column of integers read back as floats because of a missing value).
+
+    Parameters
+    ----------
+    left, right : pd.DataFrame
+        The frames to compare, with the same index and columns.
+
+    Returns
+    -------
+    bool
+        True if the values are equal, missing values included.
+    """
+    try:
+        pd.testing.assert_frame_equal(left, right, check_dtype=False, check_index_type=False)
+    except AssertionError:
+        return False
+    return True
+
+
+def season_of(dates):
+    """
+    Returns the first year of the season of each match date (seasons start in July).
+
+    Parameters
+    ----------
+    dates : pd.Series
+        Match dates, as dd/mm/yy(yy) strings or datetimes.
+
+    Returns
+    -------
+    pd.Series
+        The season of each date, NaN for the unparsable ones.
+    """
+    dates = pd.to_datetime(dates, dayfirst=True, format="mixed", errors="coerce")
+    return dates.dt.year - (dates.dt.month < 7)
+
+
+def is_newest_season_first(df):
+    """
+    Tells whether the seasons of a merged file are stored from the newest to the oldest,
+    as the seasons are merged in the order given on the command line.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The merged data, with the Date column or index level.
+
+    Returns
+    -------
+    bool
+        True if the first match belongs to a later season than the last one.
+    """
+    dates = df.reset_index()["Date"]
+    seasons = season_of(dates.iloc[[0, -1]]) if len(dates) else []
+    return len(seasons) == 2 and seasons.iloc[0] > seasons.iloc[1]
+
+
+def sort_by_season_and_date(df, newest_season_first=True):
+    """
+    Sorts the matches of a merged file by season, in the given season order, then by date
+    within each season, as they are laid out by a full download. The sort is stable, so the
+    matches of the same day keep their order.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The merged data.
+    newest_season_first : bool
+        Whether the seasons are stored from the newest to the oldest.
+
+    Returns
+    -------
+    pd.DataFrame
+        The sorted data, with a new index.
+    """
+    dates = pd.to_datetime(df["Date"], dayfirst=True, format="mixed", errors="coerce")
+    seasons = season_of(dates)
+    order = pd.DataFrame({"season": -seasons if newest_season_first else seasons, "date": dates})
+    order = order.sort_values(["season", "date"], kind="mergesort", na_position="last").index
+    return df.loc[order].reset_index(drop=True)
+
+
+def upsert_league_data(league, season_contents, raw_data_output_dir, storage_format="csv"):
+    """
+    Upserts the rows of the downloaded seasons into the existing merged file of a league.
+
+    Rows are matched on MATCH_KEY_COLUMNS: matches already in the merged file are replaced
+    by their downloaded version and new matches are added, then the matches are sorted back by
+    season and date. Only the columns shared by the merged file and the downloaded seasons are
+    kept, in the order of the merged file. The file is rewritten only if something changed,
+    whatever the dtypes the values were read with.
+
+    Parameters
+    ----------
+    league : str
+        League acronym (e.g., "E0").
+    season_contents : list of bytes
+        The downloaded season files, usually the open ones only.
+    raw_data_output_dir : str
+        Directory containing the merged file of the league.
+    storage_format : str
+        Format of the merged file: csv, parquet or feather.
+
+    Returns
+    -------
+    None
+    """
+    if not season_contents:
+        return
+
+    output_path = os.path.join(raw_data_output_dir, f"{league}_merged{get_extension(storage_format)}")
+    existing_df = read_table(output_path)
+    season_dfs = [read_season_data(content) for content in season_contents]
+    if storage_format != "csv":
+        # Compare the downloaded rows with the stored ones under the same schema, categories aside
+        season_dfs = [apply_schema(df) for df in season_dfs]
+        season_dfs = [df.astype({col: object for col in CATEGORICAL_COLUMNS if col in df.columns}) for df in season_dfs]
+        existing_df = existing_df.astype({col: object for col in CATEGORICAL_COLUMNS if col in existing_df.columns})
+
+    common_columns = get_common_columns([existing_df.columns] + [df.columns for df in season_dfs])
+    missing_keys = [col for col in MATCH_KEY_COLUMNS if col not in common_columns]
+    if missing_keys:
+        print(f"Cannot upsert data into {output_path}, missing key columns: {missing_keys}")
+        return
+
+    dropped_columns = len(common_columns) < len(existing_df.columns)
+    existing_df = existing_df[common_columns].set_index(MATCH_KEY_COLUMNS)
+    new_df = pd.concat([df[common_columns] for df in season_dfs], ignore_index=True).set_index(MATCH_KEY_COLUMNS)
+    new_df = new_df[~new_df.index.duplicated(keep='last')]
+
+    updated_keys = new_df.index.intersection(existing_df.index)
+    added_keys = new_df.index.difference(existing_df.index)
+    updated = not same_values(existing_df.loc[updated_keys], new_df.loc[updated_keys])
+
+    if not (len(added_keys) or updated or dropped_columns):
+        print(f"No changes for {league}, {output_path} left untouched")
+        return
+
+    # Drop the outdated version of the updated matches, add the downloaded rows, then restore the match order
+    merged_df = pd.concat([existing_df[~existing_df.index.isin(updated_keys)], new_df]).reset_index()
+    merged_df = sort_by_season_and_date(merged_df[common_columns], newest_season_first=is_newest_season_first(existing_df))
+    write_table(merged_df, os.path.splitext(output_path)[0], storage_format)
+    print(f"Upserted {len(added_keys)} new and {len(updated_keys)} existing matches into {output_path}")
+
+def download_and_merge_data(leagues, seasons, raw_data_output_dir, max_workers=1, base_url=BASE_URL, cache_dir=None, incremental=False, storage_format="csv"):
     """
     Downloads and merges football match data from the specified leagues and seasons,
     keeping only the common columns and preserving their order.
 
+    The league/season files are downloaded concurrently by a pool of `max_workers` threads,
+    and each league is merged as soon as all of its seasons have been downloaded.
+
+    In incremental mode, the leagues that already have a merged file only download the open
+    seasons (the ones not in CLOSED_SEASONS) and upsert them into the existing file.
+
     Parameters
     ----------
     leagues : list of str
@@ -78,50 +470,65 @@ def download_and_merge_data(leagues, seasons, raw_data_output_dir):
     seasons : list of str
         List of season codes (e.g., ["2324", "2223"]).
     raw_data_output_dir : str
-        Directory where the merged CSV files will be saved.
+        Directory where the merged files will be saved.
+    max_workers : int
+        Number of concurrent downloads, 1 downloads the files one after another.
+    base_url : str
+        Base URL of the season files (e.g., a local server serving fixture CSVs).
+    cache_dir : str or None
+        Directory of the on-disk HTTP cache, None disables the cache.
+    incremental : bool
+        If True, upsert the open seasons into the existing merged files instead of rebuilding them.
+    storage_format : str
+        Format of the merged files: csv, parquet or feather.
     
     Returns
     -------
     None
     """
     os.makedirs(raw_data_output_dir, exist_ok=True)
-    
+    seasons = list(dict.fromkeys(seasons))  # Drop duplicated seasons, keeping their order
+
+    # Seasons to download for each league, and whether they are upserted or merged from scratch
+    league_seasons = {}
+    upsert_leagues = set()
     for league in leagues:
-        league_dfs = []
-        common_columns = None
-        column_order = []
-
-        for season in seasons:
-            url = f"https://www.football-data.co.uk/mmz4281/{season}/{league}.csv"
-            try:
-                df = pd.read_csv(url)
-                print(f"Downloaded data from {url}")
-                
-                # Determine the common columns across all DataFrames
-                if common_columns is None:
-                    common_columns = set(df.columns)
-                    column_order = df.columns.tolist()  # Preserve initial column order
+        merged_path = os.path.join(raw_data_output_dir, f"{league}_merged{get_extension(storage_format)}")
+        if incremental and os.path.exists(merged_path):
+            league_seasons[league] = [season for season in seasons if season not in CLOSED_SEASONS]
+            upsert_leagues.add(league)
+        else:
+            league_seasons[league] = seasons
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(fetch_season_data, league, season, base_url, cache_dir): (league, season)
+            for league in leagues
+            for season in league_seasons[league]
+        }
+
+        # Downloaded season files of each league, keyed by season code
+        league_contents = {league: {} for league in leagues}
+        cache_stats = Counter()
+
+        for future in as_completed(futures):
+            league, season = futures[future]
+            league_contents[league][season], cache_status = future.result()
+            cache_stats[cache_status] += 1
+
+            if len(league_contents[league]) == len(league_seasons[league]):
+                # All the seasons are in, merge them in the requested order
+                season_contents = [league_contents[league][s] for s in league_seasons[league] if league_contents[league][s] is not None]
+                if league in upsert_leagues:
+                    upsert_league_data(league, season_contents, raw_data_output_dir, storage_format)
                 else:
-                    common_columns.intersection_update(df.columns)
-                
-                league_dfs.append(df)
-                
-            except Exception as e:
-                print(f"Failed to download data from {url}: {e}")
-                continue
-        
-        if league_dfs and common_columns:
-            # Keep only the common columns, preserving the order from the first DataFrame
-            common_columns = [col for col in column_order if col in common_columns]
-            league_dfs = [df[common_columns] for df in league_dfs]
-            
-            # Concatenate the DataFrames
-            merged_df = pd.concat(league_dfs, ignore_index=True)
-            
-            # Save to CSV
-            output_path = os.path.join(raw_data_output_dir, f"{league}_merged.csv")
-            merged_df.to_csv(output_path, index=False)
-            print(f"Saved merged data to {output_path}")
+                    merge_league_data(league, season_contents, raw_data_output_dir, storage_format)
+                del league_contents[league]
+
+    if cache_dir is not None:
+        print(f"Cache hits: {cache_stats['hit'] + cache_stats['not_modified']} "
+              f"({cache_stats['hit']} not requested, {cache_stats['not_modified']} not modified), "
+              f"misses: {cache_stats['miss']}, failures: {cache_stats['failed']}")
 
 
 
@@ -156,6 +563,34 @@ def parse_arguments():
         required=True, 
         help="Directory where the merged CSV files will be saved."
     )
+
+    parser.add_argument(
+        "--storage_format", 
+        type=str, 
+        choices=list(STORAGE_FORMATS), 
+        default="csv", 
+        help="Format of the merged files: csv (default), parquet or feather."
+    )
+
+    parser.add_argument(
+        "--max_workers", 
+        type=int, 
+        default=1, 
+        help="Number of league/season files downloaded concurrently (default: 1, sequential)."
+    )
+
+    parser.add_argument(
+        "--cache_dir", 
+        type=str, 
+        default=None, 
+        help="Directory of the on-disk HTTP cache of the season files (default: no cache)."
+    )
+
+    parser.add_argument(
+        "--incremental", 
+        action="store_true", 
+        help="Upsert the open seasons into the existing merged files instead of rebuilding them."
+    )
     
     return parser.parse_args()
 
@@ -170,5 +605,9 @@ if __name__ == "__main__":
     download_and_merge_data(
         leagues=args.leagues, 
         seasons=args.seasons,
-        raw_data_output_dir=args.raw_data_output_dir
+        raw_data_output_dir=args.raw_data_output_dir,
+        max_workers=args.max_workers,
+        cache_dir=args.cache_dir,
+        incremental=args.incremental,
+        storage_format=args.storage_format
     )
@@ -17,6 +17,51 @@ num_features : int
     Number of top features to select using the mRMR feature selection method.
 clustering_threshold : float
     The threshold for hierarchical clustering to form flat clusters.
+storage_format : str
+    Format of the raw and processed files: csv (default), parquet or feather.
+team_state_dir : str
+    Optional directory of the team state store (see team_state.py). When given, only the matches that are new
+    since the last run update the features, the previous ones are read back from the store.
+rebuild_team_state : flag
+    Rebuild the team state store from all the matches.
+verify_team_state : flag
+    Check the incremental features against a full recompute of the feature engineering.
+jobs : int
+    Number of leagues preprocessed in parallel, one process per league (default 1). The logs of each league
+    are collected and printed together, and a failing league is reported without losing the others.
+compact : flag
+    Use the compact memory layout (categorical text columns, float32 odds, downcast counts) through to the
+    processed output. The layout is kept on disk by the parquet and feather storage formats.
+memory_report_file : str
+    Optional CSV file where the memory usage (raw, compact and processed bytes) of each league is saved.
+selection_cache_dir : str
+    Optional directory of the feature selection cache (e.g. data/cache/feature_selection, used by the invoke
+    pipeline), disabled by default. The mRMR ranking and the clustered features are reused when the data and the parameters did not change.
+reuse_selected_features : flag
+    Apply the last feature selection stored for each league to the new data, without selecting again,
+    so that the feature sets of the models stay stable between runs.
+selection_engine : str
+    Feature selection engine: mrmr (default, mrmr-selection package) or native (built-in vectorized engine,
+    see mrmr_native.py), which selects the same features.
+feature_store_dir : str
+    Optional directory of the feature store (e.g. data/feature_store, used by the invoke pipeline), disabled by
+    default, where the full engineered feature table of each league is saved for the point-in-time lookups of
+    the training and the predictions (see feature_store.py).
+combined_features : flag
+    Engineer the features of all the leagues in a single vectorized pass over their concatenation, grouping by
+    Div, Season and team, instead of once per league. The results are the same. Not available with --jobs above 1
+    or with --team_state_dir.
+profile_report_file : str
+    Optional JSON or CSV file where the wall-clock time, CPU time, peak resident memory and the rows and columns
+    in and out of each stage (loading, feature engineering, dropped columns, missing values, feature selection,
+    saving) are saved. The measures are also printed at the end of the run.
+windows : int
+    Space-separated numbers of matches of the rolling form features (default 5), e.g. --windows 3 5 10 adds the
+    AvgLast3..., AvgLast5... and AvgLast10... features. All the windows share the same sorted pass and cumulative
+    sums per side, and the new columns go through the feature selection as the others.
+profile : str
+    Dump the cProfile statistics of the hottest stage to the given file (default preprocessing_profile.prof).
+    Not available with --jobs above 1.
 
 This script will read each CSV file in the input folder, perform feature engineering,
 select relevant features while addressing feature correlation, handle missing values,
@@ -24,12 +69,23 @@ and save the processed data to the specified output directory.
 """
 
 import os
+import io
 import argparse
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 import scipy.cluster.hierarchy as sch
 from mrmr import mrmr_classif
 from sklearn.preprocessing import StandardScaler
+from storage import STORAGE_FORMATS, compact_dtypes, list_tables, memory_usage, read_table, write_table
+from team_registry import build_team_registry, load_team_registry, registry_league_teams, save_team_registry
+from team_state import WINDOW, update_league_features
+from mrmr_native import highest_variance_per_cluster, spearman_correlation, mrmr_classif as native_mrmr_classif
+from selection_cache import selection_fingerprint, load_cached_selection, save_cached_selection, load_selected_features, save_selected_features
+from feature_store import save_feature_table
+from stage_profiler import StageProfiler, invalid_report_file_message
 
 def parse_arguments():
     """
@@ -43,25 +99,46 @@ def parse_arguments():
     parser.add_argument("--processed_data_output_dir", required=True, type=str, help="Directory where the processed CSV files will be saved.")
     parser.add_argument("--num_features", type=int, default=20, help="Number of top features to select using mRMR.")
     parser.add_argument("--clustering_threshold", type=float, default=0.5, help="The threshold for hierarchical clustering to form flat clusters.")
-
-    return parser.parse_args()
-
-def load_csv_files(input_folder: str) -> list:
+    parser.add_argument("--storage_format", type=str, choices=list(STORAGE_FORMATS), default="csv", help="Format of the raw and processed files.")
+    parser.add_argument("--team_state_dir", type=str, default=None, help="Directory of the team state store, to update the features incrementally.")
+    parser.add_argument("--rebuild_team_state", action="store_true", help="Rebuild the team state store from all the matches.")
+    parser.add_argument("--verify_team_state", action="store_true", help="Check the incremental features against a full recompute.")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of leagues preprocessed in parallel processes.")
+    parser.add_argument("--compact", action="store_true", help="Use the compact memory layout: categorical text columns, float32 odds, downcast counts.")
+    parser.add_argument("--memory_report_file", type=str, default=None, help="Optional CSV file where the memory usage of each league is saved.")
+    parser.add_argument("--selection_cache_dir", type=str, default=None, help="Optional directory of the feature selection cache (default: disabled).")
+    parser.add_argument("--reuse_selected_features", action="store_true", help="Apply the stored feature selection of each league instead of selecting the features again.")
+    parser.add_argument("--selection_engine", type=str, choices=["mrmr", "native"], default="mrmr", help="Feature selection engine: the mrmr-selection package or the built-in vectorized one.")
+    parser.add_argument("--feature_store_dir", type=str, default=None, help="Optional directory of the feature store (default: disabled).")
+    parser.add_argument("--combined_features", action="store_true", help="Engineer the features of all the leagues in a single pass.")
+    parser.add_argument("--windows", nargs="+", type=int, default=ROLLING_WINDOWS, help="Numbers of matches of the rolling form features (e.g., 3 5 10).")
+    parser.add_argument("--profile_report_file", type=str, default=None, help="Optional JSON or CSV file where the measures of the stages are saved.")
+    parser.add_argument("--profile", nargs="?", const="preprocessing_profile.prof", default=None,
+                        help="Dump the cProfile statistics of the hottest stage (default file: preprocessing_profile.prof).")
+
+    args = parser.parse_args()
+    if args.reuse_selected_features and not args.selection_cache_dir:
+        parser.error("--reuse_selected_features reads the stored selections from --selection_cache_dir, which must be given")
+    if args.profile_report_file and invalid_report_file_message(args.profile_report_file):
+        parser.error(invalid_report_file_message(args.profile_report_file))
+    return args
+
+def load_csv_files(input_folder: str, storage_format: str = "csv") -> list:
     """
-    Load all CSV files from the specified input folder.
+    Load all the data files of the given storage format from the specified input folder.
 
     Parameters:
-    input_folder (str): Path to the folder containing the CSV files.
+    input_folder (str): Path to the folder containing the data files.
+    storage_format (str): Format of the files to load: csv, parquet or feather.
 
     Returns:
     list of tuples: A list where each tuple contains the filename and the corresponding DataFrame.
     """
     data_files = []
-    for filename in os.listdir(input_folder):
-        if filename.endswith(".csv"):
-            file_path = os.path.join(input_folder, filename)
-            data = pd.read_csv(file_path)
-            data_files.append((filename, data))
+    for filename in list_tables(input_folder, storage_format):
+        file_path = os.path.join(input_folder, filename)
+        data = read_table(file_path)
+        data_files.append((filename, data))
     return data_files
 
 def determine_season(date: pd.Timestamp) -> str:
@@ -81,65 +158,202 @@ def determine_season(date: pd.Timestamp) -> str:
     else:
         return f"{year - 1}/{year}"
 
-def feature_engineering(df: pd.DataFrame) -> pd.DataFrame:
+# Default numbers of matches of the rolling form features
+ROLLING_WINDOWS = [5]
+
+def grouped_rolling_sums(df: pd.DataFrame, group_columns: list, value_columns: list, windows: list) -> dict:
     """
-    Perform feature engineering on the DataFrame.
+    Compute the rolling sums and averages over the last rows of each group, for several columns and several
+    window sizes at once.
+
+    The rows of each group must be contiguous and in chronological order (e.g., sorted by team and date).
+    The sums are the differences of the cumulative sums at the current row and `window` rows before, bounded
+    by the first row of the group. This is equivalent to groupby(...).transform(lambda x: x.rolling(window,
+    min_periods=1)...) without calling Python once per group, and exact for integer-valued columns (goals, flags).
+    The group boundaries and the cumulative sums are computed once and shared by all the windows.
+    Missing values are skipped, as done by pandas.
 
     Parameters:
-    df (pd.DataFrame): The DataFrame to process.
+    df (pd.DataFrame): The sorted DataFrame.
+    group_columns (list): Columns identifying the groups (e.g., ['Season', 'HomeTeam']).
+    value_columns (list): Columns to aggregate.
+    windows (list of int): Numbers of rows of the rolling windows.
 
     Returns:
-    pd.DataFrame: The DataFrame with new features added.
+    dict: For each window, a tuple of np.ndarray with the rolling sums and averages, with one column per value
+          column, NaN when the window has no values.
+    """
+    values = df[value_columns].to_numpy(dtype=float)
+    observed = ~np.isnan(values)
+    group_codes = df.groupby(group_columns, sort=False, observed=True).ngroup().to_numpy()
+
+    # Index of the first row of the group of each row
+    positions = np.arange(len(df))
+    is_group_start = np.ones(len(df), dtype=bool)
+    is_group_start[1:] = group_codes[1:] != group_codes[:-1]
+    group_starts = np.maximum.accumulate(np.where(is_group_start, positions, 0))
+
+    # Cumulative sums with a leading row of zeros, so that the sum of rows [a, b] is cumsum[b + 1] - cumsum[a]
+    cumulative_sums = np.zeros((len(df) + 1, len(value_columns)))
+    cumulative_sums[1:] = np.cumsum(np.where(observed, values, 0), axis=0)
+    cumulative_counts = np.zeros((len(df) + 1, len(value_columns)))
+    cumulative_counts[1:] = np.cumsum(observed, axis=0)
+
+    rolling = {}
+    for window in windows:
+        window_starts = np.maximum(positions - window + 1, group_starts)
+        sums = cumulative_sums[positions + 1] - cumulative_sums[window_starts]
+        counts = cumulative_counts[positions + 1] - cumulative_counts[window_starts]
+        # Rows without a group (missing keys) and windows without values are left empty
+        empty = (counts == 0) | (group_codes == -1)[:, None]
+        sums = np.where(empty, np.nan, sums)
+        means = sums / np.where(empty, 1, counts)
+        rolling[window] = (sums, means)
+    return rolling
+
+def add_match_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Parse the Date and add the Season and the target variable Over2.5 to the raw matches.
+
+    Parameters:
+    df (pd.DataFrame): The raw matches.
+
+    Returns:
+    pd.DataFrame: The DataFrame with the Date converted and the new columns added.
     """
     # Convert Date column to datetime format
     df['Date'] = pd.to_datetime(df['Date'], format='%d/%m/%Y')
-    # Create a new column Season based on the Date
-    df['Season'] = df['Date'].apply(determine_season)
+    # Create a new column Season based on the Date, the season starts in August (see determine_season)
+    start_year = df['Date'].dt.year - (df['Date'].dt.month < 8)
+    df['Season'] = start_year.astype(str) + '/' + (start_year + 1).astype(str)
 
     # create the target variable Over2.5 
     df["Over2.5"] = np.where(df["FTHG"] + df["FTAG"] > 2, 1, 0)
+    return df
+
+def feature_engineering(df: pd.DataFrame, league_column: str = None, windows: list = ROLLING_WINDOWS) -> pd.DataFrame:
+    """
+    Perform feature engineering on the DataFrame.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame to process.
+    league_column (str): Optional column identifying the league of each match (e.g., 'Div'), when the DataFrame
+                         contains several leagues. The features are then computed per league, season and team.
+    windows (list of int): Numbers of matches of the rolling form features (e.g., [3, 5, 10] for the
+                           AvgLast3..., AvgLast5... and AvgLast10... features), all computed in one pass per side.
+
+    Returns:
+    pd.DataFrame: The DataFrame with new features added.
+    """
+    league_keys = [] if league_column is None else [league_column]
+    home_keys = league_keys + ['Season', 'HomeTeam']
+    away_keys = league_keys + ['Season', 'AwayTeam']
+
+    df = add_match_columns(df)
     # Group by HomeTeam and calculate the average Full Time Home Goals
-    df['AvgHomeGoalsScored'] = df.groupby(['Season', 'HomeTeam'])['FTHG'].transform('mean').round(2)
+    df['AvgHomeGoalsScored'] = df.groupby(home_keys, observed=True)['FTHG'].transform('mean').round(2)
     # Group by AwayTeam and calculate the average Full Time Away Goals
-    df['AvgAwayGoalsScored'] = df.groupby(['Season', 'AwayTeam'])['FTAG'].transform('mean').round(2)
+    df['AvgAwayGoalsScored'] = df.groupby(away_keys, observed=True)['FTAG'].transform('mean').round(2)
     # Group by HomeTeam and calculate the average Full Time Away Goals (which are the goals conceded by HomeTeam)
-    df['AvgHomeGoalsConceded'] = df.groupby(['Season', 'HomeTeam'])['FTAG'].transform('mean').round(2)
+    df['AvgHomeGoalsConceded'] = df.groupby(home_keys, observed=True)['FTAG'].transform('mean').round(2)
     # Group by AwayTeam and calculate the average Full Time Home Goals (which are the goals conceded by AwayTeam)
-    df['AvgAwayGoalsConceded'] = df.groupby(['Season', 'AwayTeam'])['FTHG'].transform('mean').round(2)
+    df['AvgAwayGoalsConceded'] = df.groupby(away_keys, observed=True)['FTHG'].transform('mean').round(2)
     # Group by HomeTeam and calculate the percentage of games with Over 2.5 goals
-    df['HomeOver2.5Perc'] = (df.groupby(['Season', 'HomeTeam'])['Over2.5'].transform('mean') * 100).round(2)
+    df['HomeOver2.5Perc'] = (df.groupby(home_keys, observed=True)['Over2.5'].transform('mean') * 100).round(2)
     # Group by HomeTeam and calculate the percentage of games with Over 2.5 goals
-    df['AwayOver2.5Perc'] = (df.groupby(['Season', 'AwayTeam'])['Over2.5'].transform('mean') * 100).round(2)
+    df['AwayOver2.5Perc'] = (df.groupby(away_keys, observed=True)['Over2.5'].transform('mean') * 100).round(2)
 
     # Sort the dataframe by HomeTeam and Date
-    df = df.sort_values(by=['HomeTeam', 'Date'])
-    # Create a rolling average of the last 5 games for the Full Time Home Goals
-    df['AvgLast5HomeGoalsScored'] = df.groupby(['Season', 'HomeTeam'])['FTHG'].transform(
-        lambda x: x.rolling(5, min_periods=1).mean()).round(2)
-    df['AvgLast5HomeGoalsConceded'] = df.groupby(['Season', 'HomeTeam'])['FTAG'].transform(
-        lambda x: x.rolling(5, min_periods=1).mean()).round(2)
-    # Create a rolling sum of the last 5 games for Over 2.5 goals for home matches
-    df['Last5HomeOver2.5Count'] = df.groupby(['Season', 'HomeTeam'])['Over2.5'].transform(
-        lambda x: x.rolling(5, min_periods=1).sum()).round(2)
-    # Calculate the percentage of Over 2.5 goals in the last 5 home matches
-    df['Last5HomeOver2.5Perc'] = df.groupby(['Season', 'HomeTeam'])['Over2.5'].transform(
-        lambda x: x.rolling(5, min_periods=1).mean() * 100).round(2)
-
-    # Sort the dataframe by HomeTeam and Date
-    df = df.sort_values(by=['AwayTeam', 'Date'])
-    # Create a rolling average of the last 5 games for the Full Time Away Goals
-    df['AvgLast5AwayGoalsScored'] = df.groupby(['Season', 'AwayTeam'])['FTAG'].transform(
-        lambda x: x.rolling(5, min_periods=1).mean()).round(2)
-    df['AvgLast5AwayGoalsConceded'] = df.groupby(['Season', 'AwayTeam'])['FTHG'].transform(
-        lambda x: x.rolling(5, min_periods=1).mean()).round(2)
-    # Create a rolling sum of the last 5 games for Over 2.5 goals for away matches
-    df['Last5AwayOver2.5Count'] = df.groupby(['Season', 'AwayTeam'])['Over2.5'].transform(
-        lambda x: x.rolling(5, min_periods=1).sum()).round(2)
-    # Create a rolling sum of the last 5 games for Over 2.5 goals for away matches
-    df['Last5AwayOver2.5Perc'] = df.groupby(['Season', 'AwayTeam'])['Over2.5'].transform(
-        lambda x: x.rolling(5, min_periods=1).mean() * 100).round(2)    
+    df = df.sort_values(by=league_keys + ['HomeTeam', 'Date'])
+    # Rolling sums and averages of the last home games of each team, computed for all the columns and windows at once
+    home_rolling = grouped_rolling_sums(df, home_keys, ['FTHG', 'FTAG', 'Over2.5'], windows)
+    for window, (last_sums, last_means) in home_rolling.items():
+        # Create a rolling average of the last games for the Full Time Home Goals
+        df[f'AvgLast{window}HomeGoalsScored'] = np.round(last_means[:, 0], 2)
+        df[f'AvgLast{window}HomeGoalsConceded'] = np.round(last_means[:, 1], 2)
+        # Create a rolling sum of the last games for Over 2.5 goals for home matches
+        df[f'Last{window}HomeOver2.5Count'] = np.round(last_sums[:, 2], 2)
+        # Calculate the percentage of Over 2.5 goals in the last home matches
+        df[f'Last{window}HomeOver2.5Perc'] = np.round(last_means[:, 2] * 100, 2)
+
+    # Sort the dataframe by AwayTeam and Date
+    df = df.sort_values(by=league_keys + ['AwayTeam', 'Date'])
+    # Rolling sums and averages of the last away games of each team
+    away_rolling = grouped_rolling_sums(df, away_keys, ['FTAG', 'FTHG', 'Over2.5'], windows)
+    for window, (last_sums, last_means) in away_rolling.items():
+        # Create a rolling average of the last games for the Full Time Away Goals
+        df[f'AvgLast{window}AwayGoalsScored'] = np.round(last_means[:, 0], 2)
+        df[f'AvgLast{window}AwayGoalsConceded'] = np.round(last_means[:, 1], 2)
+        # Create a rolling sum of the last games for Over 2.5 goals for away matches
+        df[f'Last{window}AwayOver2.5Count'] = np.round(last_sums[:, 2], 2)
+        # Calculate the percentage of Over 2.5 goals in the last away matches
+        df[f'Last{window}AwayOver2.5Perc'] = np.round(last_means[:, 2] * 100, 2)
     return df
 
+# Columns of the raw matches used by the feature engineering
+MATCH_COLUMNS = ['Div', 'Date', 'HomeTeam', 'AwayTeam', 'FTHG', 'FTAG']
+
+def feature_engineering_leagues(leagues: dict, windows: list = ROLLING_WINDOWS) -> dict:
+    """
+    Perform the feature engineering of several leagues in a single pass.
+
+    The matches of the leagues (the columns used by the feature engineering) are concatenated into one DataFrame
+    and every feature is computed once for all of them, grouping by Div, Season and team, so that the sorts, the
+    groupbys and the pandas overhead are paid once instead of once per league. The features are then split back
+    and added to the data of each league: the result is the same as the output of feature_engineering on each
+    league alone.
+
+    Parameters:
+    leagues (dict): The raw matches of each league, keyed by league (e.g., "E0" or its file name). The input DataFrames are not modified.
+    windows (list of int): Numbers of matches of the rolling form features (see feature_engineering).
+
+    Returns:
+    dict: The DataFrame with new features added of each league.
+    """
+    # The Div column identifies the league of each match, so a division must belong to a single league
+    league_divisions = {}
+    for league, df in leagues.items():
+        if df['Div'].isna().any():
+            raise ValueError(f"Matches without Div in {league}, the leagues cannot be engineered together")
+        for division in df['Div'].astype(str).unique():
+            if league_divisions.setdefault(division, league) != league:
+                raise ValueError(f"Division {division} found in {league_divisions[division]} and {league}, the leagues cannot be engineered together")
+
+    # Only the columns used by the feature engineering are concatenated, each league keeping its row positions
+    combined = pd.concat([df[MATCH_COLUMNS].reset_index(drop=True) for df in leagues.values()], keys=list(leagues), names=['League', 'Position'])
+    combined['Div'] = combined['Div'].astype(str)
+    combined = feature_engineering(combined, league_column='Div', windows=windows)
+
+    engineered_columns = [column for column in combined.columns if column not in MATCH_COLUMNS]
+    engineered = {}
+    for league, league_features in combined.groupby(level='League', sort=False):
+        # Rows of the league in the order of feature_engineering (by AwayTeam and Date), with the parsed Date and the new columns
+        df = leagues[league].iloc[league_features.index.get_level_values('Position')].copy()
+        df['Date'] = league_features['Date'].to_numpy()
+        for column in engineered_columns:
+            df[column] = league_features[column].to_numpy()
+        engineered[league] = df
+    return engineered
+
+
+def verify_team_state_features(df_incremental: pd.DataFrame, df_full: pd.DataFrame) -> bool:
+    """
+    Check the features maintained by the team state store against a full recompute.
+
+    Parameters:
+    df_incremental (pd.DataFrame): The features updated incrementally.
+    df_full (pd.DataFrame): The features recomputed by feature_engineering over the whole history.
+
+    Returns:
+    bool: True if both contain the same matches with the same features.
+    """
+    df_full = df_full.dropna(subset=['FTHG', 'FTAG'])
+    try:
+        pd.testing.assert_frame_equal(df_incremental.reset_index(drop=True), df_full.reset_index(drop=True), check_dtype=False, check_categorical=False)
+        return True
+    except AssertionError as e:
+        print(f"Team state features differ from the full recompute: {e}")
+        return False
 
 def drop_useless_columns(df: pd.DataFrame, columns_to_drop: list) -> pd.DataFrame:
     """
@@ -160,7 +374,7 @@ def drop_useless_columns(df: pd.DataFrame, columns_to_drop: list) -> pd.DataFram
 
     return df
 
-def feature_selection(df, target_column="Over2.5", num_features=20, clustering_threshold=0.5):
+def feature_selection(df, target_column="Over2.5", num_features=20, clustering_threshold=0.5, cache_dir=None, engine="mrmr"):
     """
     Perform feature selection using mRMR and hierarchical clustering.
 
@@ -169,17 +383,35 @@ def feature_selection(df, target_column="Over2.5", num_features=20, clustering_t
     target_column (str): The target variable column name.
     num_features (int): The number of features to select using mRMR.
     clustering_threshold (float): The threshold for hierarchical clustering to form flat clusters.
+    cache_dir (str): Optional directory of the selection cache (see selection_cache.py). The mRMR ranking and
+                     the clustered features are reused when the data and the parameters did not change.
+    engine (str): "mrmr" to use the mrmr-selection package, "native" to use the built-in vectorized engine
+                  (see mrmr_native.py), which returns the same features.
 
     Returns:
     list: A list of selected feature names after clustering.
     """
     try:
-        numerical_columns = df.drop(["Date"], axis=1).select_dtypes(exclude='object').columns.tolist()
+        numerical_columns = df.drop(["Date"], axis=1).select_dtypes(include='number').columns.tolist()
         X = df[numerical_columns].drop([target_column], axis=1)
         y = df[target_column]
-        
+
+        cached_selection = None
+        if cache_dir is not None:
+            fingerprint = selection_fingerprint(X, y, num_features, engine)
+            cached_selection = load_cached_selection(cache_dir, fingerprint)
+            if cached_selection is not None and str(clustering_threshold) in cached_selection['clustered_features']:
+                print("Selected features loaded from the selection cache.")
+                return cached_selection['clustered_features'][str(clustering_threshold)]
+
         # 1.0- Select the top features using mRMR
-        selected_features = mrmr_classif(X=X, y=y, K=num_features)
+        if cached_selection is not None:
+            print("mRMR ranking loaded from the selection cache.")
+            selected_features = cached_selection['mrmr_ranking']
+        elif engine == "native":
+            selected_features = native_mrmr_classif(X=X, y=y, K=num_features)
+        else:
+            selected_features = mrmr_classif(X=X, y=y, K=num_features)
 
         """
         DRASTIC DECREASE IN PERFORMANCE WHEN STANDARDIZING THE FEATURES
@@ -196,7 +428,10 @@ def feature_selection(df, target_column="Over2.5", num_features=20, clustering_t
         # 3.0- Perform hierarchical clustering to group correlated features
 
             # 3.1- Calculate the Spearman correlation matrix
-        corr_matrix = df[selected_features].corr(method='spearman')
+        if engine == "native":
+            corr_matrix = spearman_correlation(df[selected_features])
+        else:
+            corr_matrix = df[selected_features].corr(method='spearman')
         
             # 3.2- Perform hierarchical clustering d = 1 - r
         dist = sch.distance.pdist(corr_matrix, metric='euclidean')
@@ -204,12 +439,18 @@ def feature_selection(df, target_column="Over2.5", num_features=20, clustering_t
         cluster_ids = sch.fcluster(linkage, clustering_threshold, criterion='distance')
         
         # 4.0- Select the feature with the highest variance within each cluster
-        selected_features_clustered = []
-        for cluster_id in pd.Series(cluster_ids).unique():
-            cluster_features = corr_matrix.columns[pd.Series(cluster_ids) == cluster_id]
-            # Select the feature with the highest variance
-            highest_variance_feature = cluster_features[np.argmax(df[cluster_features].var())]
-            selected_features_clustered.append(highest_variance_feature)
+        if engine == "native":
+            selected_features_clustered = highest_variance_per_cluster(selected_features, cluster_ids, df[selected_features].var().to_numpy())
+        else:
+            selected_features_clustered = []
+            for cluster_id in pd.Series(cluster_ids).unique():
+                cluster_features = corr_matrix.columns[pd.Series(cluster_ids) == cluster_id]
+                # Select the feature with the highest variance
+                highest_variance_feature = cluster_features[np.argmax(df[cluster_features].var())]
+                selected_features_clustered.append(highest_variance_feature)
+
+        if cache_dir is not None:
+            save_cached_selection(cache_dir, fingerprint, num_features, selected_features, clustering_threshold, selected_features_clustered)
 
         return selected_features_clustered
     
@@ -240,23 +481,153 @@ def handle_missing_values(df, missing_threshold=10):
     
     return df
 
-def save_preprocessed_data(df, output_folder, filename):
+def save_preprocessed_data(df, output_folder, filename, storage_format="csv"):
     """
     Save the preprocessed DataFrame to the specified output folder with a modified filename.
 
     Parameters:
     df (pd.DataFrame): The DataFrame to save.
-    output_folder (str): Path to the folder where the processed CSV file will be saved.
-    filename (str): The original filename of the CSV file.
+    output_folder (str): Path to the folder where the processed file will be saved.
+    filename (str): The original filename of the raw file.
+    storage_format (str): Format of the processed file: csv, parquet or feather.
 
     Returns:
     None
     """
-    output_file_path = os.path.join(output_folder, f"{os.path.splitext(filename)[0]}_preprocessed.csv")
-    df.to_csv(output_file_path, index=False)
+    output_file_path = write_table(df, os.path.join(output_folder, f"{os.path.splitext(filename)[0]}_preprocessed"), storage_format)
     print(f"Preprocessed file saved as {output_file_path}\n")
 
-def preprocess_and_save_csv(input_folder, output_folder, num_features, missing_threshold=10, clustering_threshold = 0.5):
+def preprocess_league(filename, df, output_folder, num_features, missing_threshold=10, clustering_threshold=0.5, storage_format="csv",
+                      team_state_dir=None, rebuild_team_state=False, verify_team_state=False, compact=False,
+                      selection_cache_dir=None, reuse_selected_features=False, selection_engine="mrmr", feature_store_dir=None, windows=ROLLING_WINDOWS, engineered_df=None, profiler=None):
+    """
+    Preprocess the raw data of a single league and save the processed file to the output folder.
+
+    Parameters:
+    filename (str): The name of the raw file (e.g., "E0_merged.csv").
+    df (pd.DataFrame): The raw data of the league.
+    output_folder (str): Path to the folder where the processed file will be saved.
+    engineered_df (pd.DataFrame): Optional features of the league already engineered together with the other
+                                  leagues (see feature_engineering_leagues), used instead of engineering df.
+    profiler (StageProfiler): Optional profiler recording the measures of the stages (see stage_profiler.py).
+    See preprocess_and_save_csv for the other parameters.
+
+    Returns:
+    tuple: The preprocessed DataFrame and its memory usage report (see memory_usage_report).
+    """
+    print(f"Processing {filename}...")
+    league = filename.split('_')[0]
+    profiler = profiler or StageProfiler()
+    raw_bytes = memory_usage(df)
+    if compact:
+        df = compact_dtypes(df)
+    compact_bytes = memory_usage(df)
+
+    # Feature Engineering
+    if engineered_df is not None:
+        df = engineered_df
+    elif team_state_dir is not None:
+        df_raw = df.copy() if verify_team_state else None
+        df = profiler.run(league, "feature_engineering", update_league_features, league, add_match_columns(df), team_state_dir, storage_format,
+                          rebuild=rebuild_team_state)
+        if verify_team_state and not verify_team_state_features(df, feature_engineering(df_raw)):
+            raise ValueError(f"The team state of {league} is not consistent with the matches, rebuild it")
+    else:
+        df = profiler.run(league, "feature_engineering", feature_engineering, df, windows=windows)
+    if compact:
+        # Keep the compact layout for the columns added by the feature engineering (Season, Over2.5)
+        df = compact_dtypes(df)
+    print("Feature engineering completed.")
+
+    # Drop useless columns
+    # All the features related to the goals scored in a match, are higly biasing for the model, so we can drop them
+    df = profiler.run(league, "drop_useless_columns", drop_useless_columns, df, ['FTHG', 'FTAG', 'HTHG', 'HTAG'])
+    print("Useless columns dropped.")
+
+    # Handle missing values
+    df = profiler.run(league, "handle_missing_values", handle_missing_values, df, missing_threshold=missing_threshold)
+    print("Missing values handled.")
+
+    # Save the full engineered feature table, read by the training and the predictions
+    if feature_store_dir is not None:
+        feature_table_path = save_feature_table(df, feature_store_dir, league, storage_format)
+        print(f"Feature table saved as {feature_table_path}")
+
+    # Feature Selection
+    if reuse_selected_features:
+        # Apply the stored selection, so that the feature set of the league does not change between runs
+        selected_features = load_selected_features(selection_cache_dir, league)
+        missing_features = [feature for feature in selected_features if feature not in df.columns]
+        if missing_features:
+            raise ValueError(f"Stored selected features missing from the {league} data: {missing_features}, select the features again")
+        print("Stored selected features reused.")
+    else:
+        selected_features = profiler.run(league, "feature_selection", feature_selection, df, num_features=num_features,
+                                         clustering_threshold=clustering_threshold, cache_dir=selection_cache_dir, engine=selection_engine)
+        if selection_cache_dir is not None and selected_features:
+            save_selected_features(selection_cache_dir, league, selected_features)
+    print(f"Number of selected features: {len(selected_features)}")
+    print("Selected features after clustering:", selected_features)
+    
+    # Create final dataframe with selected features
+    categorical_columns = df.select_dtypes(include=['object', 'category']).columns.tolist()
+    df_selected = df[["Date"] + categorical_columns + selected_features + ['Over2.5']]
+
+    # Save the preprocessed dataframe
+    profiler.run(league, "save_preprocessed_data", save_preprocessed_data, df_selected, output_folder, filename, storage_format)
+    return df_selected, memory_usage_report(league, raw_bytes, compact_bytes, memory_usage(df_selected))
+
+def memory_usage_report(league, raw_bytes, compact_bytes, processed_bytes):
+    """
+    Build the memory usage report of a league.
+
+    Parameters:
+    league (str): The league code.
+    raw_bytes (int): Memory used by the raw data, as loaded.
+    compact_bytes (int): Memory used by the raw data after the compact layout (same as raw_bytes if not applied).
+    processed_bytes (int): Memory used by the preprocessed data.
+
+    Returns:
+    dict: The report, with the memory usages in bytes and the saving of the compact layout in percent.
+    """
+    return {
+        'league': league,
+        'raw_bytes': raw_bytes,
+        'compact_bytes': compact_bytes,
+        'saving_perc': round((1 - compact_bytes / raw_bytes) * 100, 1) if raw_bytes else 0.0,
+        'processed_bytes': processed_bytes,
+    }
+
+def preprocess_league_job(input_folder, filename, *league_args):
+    """
+    Load and preprocess a single league in a worker process, capturing its logs so that
+    the logs of the leagues processed in parallel do not interleave.
+
+    Parameters:
+    input_folder (str): Path to the folder containing the raw files.
+    filename (str): The name of the raw file of the league.
+    league_args: The other arguments of preprocess_league.
+
+    Returns:
+    tuple: The filename, the result of preprocess_league (None on failure), the captured logs, the error traceback
+           (None on success) and the stage measures (see stage_profiler.py).
+    """
+    log = io.StringIO()
+    profiler = StageProfiler()
+    with redirect_stdout(log), redirect_stderr(log):
+        try:
+            df = profiler.run(filename.split('_')[0], "load_csv_files", read_table, os.path.join(input_folder, filename))
+            result = preprocess_league(filename, df, *league_args, profiler=profiler)
+            error = None
+        except Exception:
+            result, error = None, traceback.format_exc()
+    return filename, result, log.getvalue(), error, profiler.records
+
+def preprocess_and_save_csv(input_folder, output_folder, num_features, missing_threshold=10, clustering_threshold = 0.5, storage_format="csv",
+                            team_state_dir=None, rebuild_team_state=False, verify_team_state=False, jobs=1, compact=False,
+                            memory_report_file=None, selection_cache_dir=None, reuse_selected_features=False, selection_engine="mrmr",
+                            feature_store_dir=None, combined_features=False, profile_report_file=None, profile_output=None,
+                            windows=ROLLING_WINDOWS):
     """
     Preprocess CSV files in the specified input folder and save the processed files to the output folder.
 
@@ -266,39 +637,126 @@ def preprocess_and_save_csv(input_folder, output_folder, num_features, missing_t
     num_features (int): The number of top features to select using mRMR.
     missing_threshold (int): The maximum allowed count of missing values per column before dropping the column.
     clustering_threshold (float): The threshold for hierarchical clustering to form flat clusters.
+    storage_format (str): Format of the raw and processed files: csv, parquet or feather.
+    team_state_dir (str): If given, the features are updated incrementally with the team state store saved in this
+                          directory (see team_state.py), instead of being recomputed over the whole history.
+    rebuild_team_state (bool): Rebuild the team state store from all the matches.
+    verify_team_state (bool): Check the incremental features against a full recompute, raising an error if they differ.
+    jobs (int): Number of leagues preprocessed in parallel, each one in its own process. With more than one job,
+                the logs of each league are printed together once it is done, and a failing league (or crashed worker)
+                does not stop the others: the failures are raised at the end, after saving the other leagues. The team
+                registry keeps the teams of the failed leagues from the previous run.
+    compact (bool): Use the compact memory layout (see storage.compact_dtypes) from the raw data to the processed
+                    output. The layout is kept on disk by the Parquet and Feather formats.
+    memory_report_file (str): Optional CSV file where the memory usage report of each league is saved.
+    selection_cache_dir (str): Optional directory of the feature selection cache (see selection_cache.py).
+    reuse_selected_features (bool): Apply the last selection stored in selection_cache_dir for each league
+                                    instead of selecting the features again.
+    selection_engine (str): Feature selection engine: "mrmr" (mrmr-selection package) or "native" (mrmr_native.py).
+    feature_store_dir (str): Optional directory of the feature store, where the full engineered feature table of
+                             each league is saved (see feature_store.py).
+    combined_features (bool): Engineer the features of all the leagues in a single pass (see feature_engineering_leagues).
+                              Not available with more than one job or with the team state store.
+    profile_report_file (str): Optional JSON or CSV file where the measures of the stages are saved (wall-clock time,
+                               CPU time, peak resident memory, rows and columns in and out, see stage_profiler.py).
+    profile_output (str): Optional file where the cProfile statistics of the hottest stage are dumped. Every stage is
+                          then run under cProfile, which slows it down. Not available with more than one job.
+    windows (list of int): Numbers of matches of the rolling form features (e.g., [3, 5, 10]), computed in a single
+                           pass per side and passed to the feature selection with the other features. Only the default
+                           window of 5 matches is available with the team state store.
 
     Returns:
-    None
+    dict: The preprocessed DataFrames, keyed by league (e.g., "E0"), so that they can be passed
+          in memory to the next stages.
     """
-    data_files = load_csv_files(input_folder)
-
-    for filename, df in data_files:
-        print(f"Processing {filename}...")
-        
-        # Feature Engineering
-        df = feature_engineering(df)
-        print("Feature engineering completed.")
-
-        # Drop useless columns
-        # All the features related to the goals scored in a match, are higly biasing for the model, so we can drop them
-        df = drop_useless_columns(df, ['FTHG', 'FTAG', 'HTHG', 'HTAG'] )
-        print("Useless columns dropped.")
-
-        # Handle missing values
-        df = handle_missing_values(df, missing_threshold=missing_threshold)
-        print("Missing values handled.")
-
-        # Feature Selection
-        selected_features = feature_selection(df, num_features=num_features, clustering_threshold=clustering_threshold)
-        print(f"Number of selected features: {len(selected_features)}")
-        print("Selected features after clustering:", selected_features)
-        
-        # Create final dataframe with selected features
-        categorical_columns = df.select_dtypes(include='object').columns.tolist()
-        df_selected = df[["Date"] + categorical_columns + selected_features + ['Over2.5']]
-
-        # Save the preprocessed dataframe
-        save_preprocessed_data(df_selected, output_folder, filename)
+    windows = sorted(set(windows))
+    if not windows or windows[0] < 1:
+        raise ValueError(f"Invalid rolling windows: {windows}. The windows must be positive numbers of matches")
+    if team_state_dir is not None and windows != [WINDOW]:
+        raise ValueError(f"The team state store only maintains the rolling features of the last {WINDOW} matches, run without it to use other windows")
+    if reuse_selected_features and selection_cache_dir is None:
+        raise ValueError("The selected features can only be reused from a selection cache directory")
+    if combined_features and (jobs > 1 or team_state_dir is not None):
+        raise ValueError("The combined feature engineering is not available with more than one job or with the team state store")
+    if profile_output and jobs > 1:
+        raise ValueError("The stages can only be profiled with cProfile with a single job")
+    if profile_report_file and invalid_report_file_message(profile_report_file):
+        # Checked before processing the leagues, the report is only saved at the end
+        raise ValueError(invalid_report_file_message(profile_report_file))
+    profiler = StageProfiler(profile=bool(profile_output))
+
+    # The validated options are passed to the preprocessing of each league
+    feature_store_dir = feature_store_dir or None  # An empty directory disables the feature store
+    league_args = (output_folder, num_features, missing_threshold, clustering_threshold, storage_format,
+                   team_state_dir, rebuild_team_state, verify_team_state, compact, selection_cache_dir, reuse_selected_features,
+                   selection_engine, feature_store_dir, windows)
+    processed_data = {}
+    memory_reports = []
+    failures = []
+
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(preprocess_league_job, input_folder, filename, *league_args): filename
+                       for filename in list_tables(input_folder, storage_format)}
+            # The leagues are reported in file order, each with its own logs
+            for future, filename in futures.items():
+                try:
+                    filename, result, log, error, stage_records = future.result()
+                except Exception:
+                    # The worker died (e.g., killed by the OS), its logs are lost
+                    result, log, error, stage_records = None, "", traceback.format_exc(), []
+                print(f"========== {filename} ==========\n{log}")
+                profiler.records.extend(stage_records)
+                if error is not None:
+                    print(f"Preprocessing of {filename} failed:\n{error}")
+                    failures.append(filename)
+                    continue
+                processed_data[filename.split('_')[0]], memory_report = result
+                memory_reports.append(memory_report)
+    else:
+        league_files = profiler.run("all", "load_csv_files", load_csv_files, input_folder, storage_format)
+        engineered = {}
+        if combined_features and league_files:
+            # The compact layout is applied to copies, the raw data is still measured and compacted by preprocess_league
+            engineered = profiler.run("all", "feature_engineering", feature_engineering_leagues,
+                                      {filename: compact_dtypes(df.copy()) if compact else df for filename, df in league_files}, windows)
+            print(f"Features engineered for {len(engineered)} leagues in a single pass.")
+        for filename, df in league_files:
+            result = preprocess_league(filename, df, *league_args, engineered_df=engineered.get(filename), profiler=profiler)
+            processed_data[filename.split('_')[0]], memory_report = result
+            memory_reports.append(memory_report)
+
+    # Report the memory usage of each league
+    memory_reports_df = pd.DataFrame(memory_reports)
+    print(f"Memory usage per league (bytes):\n{memory_reports_df.to_string(index=False)}")
+    if memory_report_file:
+        memory_reports_df.to_csv(memory_report_file, index=False)
+        print(f"Memory usage report saved as {memory_report_file}")
+
+    # Report the measures of the stages
+    print(f"Stage measures:\n{profiler.report().to_string(index=False)}")
+    if profile_report_file:
+        print(f"Stage measures saved as {profiler.save_report(profile_report_file)}")
+    if profile_output:
+        print(f"Profile of the hottest stage ({profiler.dump_hottest_profile(profile_output)}) saved as {profile_output}")
+
+    # Save the team registry, used by the later stages to resolve the team names. The teams of the failed leagues
+    # are kept from the previous registry, as their previous processed files are still there
+    league_teams = {league: set(df['HomeTeam']) | set(df['AwayTeam']) for league, df in processed_data.items()}
+    previous_registry = load_team_registry(output_folder) if failures else None
+    if previous_registry is not None:
+        previous_teams = registry_league_teams(previous_registry)
+        for filename in failures:
+            league = filename.split('_')[0]
+            if league in previous_teams:
+                league_teams[league] = previous_teams[league]
+    registry_path = save_team_registry(build_team_registry(league_teams), output_folder)
+    print(f"Team registry saved as {registry_path}")
+
+    if failures:
+        raise RuntimeError(f"Preprocessing failed for: {', '.join(failures)}")
+
+    return processed_data
 
 if __name__ == "__main__":
     """
@@ -323,4 +781,11 @@ if __name__ == "__main__":
     if not os.path.exists(args.processed_data_output_dir):
         os.makedirs(args.processed_data_output_dir)
 
-    preprocess_and_save_csv(args.raw_data_input_dir, args.processed_data_output_dir, args.num_features, args.clustering_threshold)
+    preprocess_and_save_csv(args.raw_data_input_dir, args.processed_data_output_dir, args.num_features,
+                            clustering_threshold=args.clustering_threshold, storage_format=args.storage_format,
+                            team_state_dir=args.team_state_dir, rebuild_team_state=args.rebuild_team_state,
+                            verify_team_state=args.verify_team_state, jobs=args.jobs, compact=args.compact,
+                            memory_report_file=args.memory_report_file, selection_cache_dir=args.selection_cache_dir or None,
+                            reuse_selected_features=args.reuse_selected_features, selection_engine=args.selection_engine,
+                            feature_store_dir=args.feature_store_dir or None, combined_features=args.combined_features,
+                            profile_report_file=args.profile_report_file, profile_output=args.profile, windows=args.windows)
@@ -0,0 +1,212 @@
+"""
+Engineered feature store, shared by the training and the prediction stages.
+
+The preprocessing writes the full engineered feature table of each league (all the columns left after the
+missing values handling, not only the selected features) to {store_dir}/{league}_feature_table{ext}, e.g.
+data/feature_store/E0_feature_table.csv. FeatureStore indexes it by team, side and date, and answers
+point-in-time lookups: the features of a team as of a date are those of its last match on that side
+(home or away) played up to that date.
+
+A fixture (home team, away team, date) gets the home team features (see feature_side) from the last
+home match of the home team, the away team features from the last away match of the away team, and the
+other features (match odds, ...) as the average of both. This is how train_models.prepare_data builds the
+training rows, each match being looked up as of its own date, and how make_predictions builds the rows of
+the upcoming matches, so that both stages read the same features with an indexed read.
+
+Example usage:
+--------------
+    store = load_feature_store("data/feature_store", "E0")
+    X = store.fixture_features(fixtures, feature_columns)
+
+where fixtures contains the HomeTeam, AwayTeam and Date (datetime) columns.
+"""
+
+import os
+import re
+import numpy as np
+import pandas as pd
+from storage import get_extension, read_table, write_table
+
+# Define the features for home team, away team, and general match information
+HOME_TEAM_FEATURES = [
+    'HomeTeam', 'FTHG', 'HG', 'HTHG', 'HS', 'HST', 'HHW', 'HC', 'HF', 'HFKC', 'HO', 'HY', 'HR', 'HBP',
+    'B365H', 'BFH', 'BSH', 'BWH', 'GBH', 'IWH', 'LBH', 'PSH', 'SOH', 'SBH', 'SJH', 'SYH', 'VCH', 'WHH',
+    'BbMxH', 'BbAvH', 'MaxH', 'AvgH', 'BFEH', 'BbMxAHH', 'BbAvAHH', 'GBAHH', 'LBAHH', 'B365AHH', 'PAHH',
+    'MaxAHH', 'AvgAHH', 'BbAHh', 'AHh', 'GBAH', 'LBAH', 'B365AH', 'AvgHomeGoalsScored', 'AvgHomeGoalsConceded',
+    'HomeOver2.5Perc', 'AvgLast5HomeGoalsScored', 'AvgLast5HomeGoalsConceded', 'Last5HomeOver2.5Count', 'Last5HomeOver2.5Perc'
+]
+
+AWAY_TEAM_FEATURES = [
+    'AwayTeam', 'FTAG', 'AG', 'HTAG', 'AS', 'AST', 'AHW', 'AC', 'AF', 'AFKC', 'AO', 'AY', 'AR', 'ABP',
+    'B365A', 'BFA', 'BSA', 'BWA', 'GBA', 'IWA', 'LBA', 'PSA', 'SOA', 'SBA', 'SJA', 'SYA', 'VCA', 'WHA',
+    'BbMxA', 'BbAvA', 'MaxA', 'AvgA', 'BFEA', 'BbMxAHA', 'BbAvAHA', 'GBAHA', 'LBAHA', 'B365AHA', 'PAHA',
+    'MaxAHA', 'AvgAHA', 'AvgAwayGoalsScored', 'AvgAwayGoalsConceded', 'AwayOver2.5Perc', 'AvgLast5AwayGoalsScored',
+    'AvgLast5AwayGoalsConceded', 'Last5AwayOver2.5Count', 'Last5AwayOver2.5Perc'
+]
+
+# Rolling form features of any window (e.g., AvgLast3HomeGoalsScored, Last10AwayOver2.5Perc), see data_preprocessing.feature_engineering
+ROLLING_FEATURE_PATTERN = re.compile(r"^(?:Avg)?Last\d+(Home|Away)")
+
+# Team column of each side
+SIDES = {'home': 'HomeTeam', 'away': 'AwayTeam'}
+
+
+def feature_side(column: str) -> str:
+    """
+    Return the team side of a feature.
+
+    Parameters:
+    column (str): The feature.
+
+    Returns:
+    str: 'home' for the home team features, 'away' for the away team features, None for the general match features.
+    """
+    rolling_match = ROLLING_FEATURE_PATTERN.match(column)
+    if column in HOME_TEAM_FEATURES or (rolling_match and rolling_match.group(1) == 'Home'):
+        return 'home'
+    if column in AWAY_TEAM_FEATURES or (rolling_match and rolling_match.group(1) == 'Away'):
+        return 'away'
+    return None
+
+
+def feature_table_path(store_dir: str, league: str, storage_format: str = "csv") -> str:
+    """
+    Return the path of the feature table of a league.
+
+    Parameters:
+    store_dir (str): The feature store directory.
+    league (str): The league code (e.g., "E0").
+    storage_format (str): Format of the feature table: csv, parquet or feather.
+
+    Returns:
+    str: The path of the feature table.
+    """
+    return os.path.join(store_dir, f"{league}_feature_table{get_extension(storage_format)}")
+
+
+def save_feature_table(df: pd.DataFrame, store_dir: str, league: str, storage_format: str = "csv") -> str:
+    """
+    Save the engineered feature table of a league, sorted by date.
+
+    Parameters:
+    df (pd.DataFrame): The engineered features, with the Date, HomeTeam and AwayTeam columns.
+    store_dir (str): The feature store directory.
+    league (str): The league code (e.g., "E0").
+    storage_format (str): Format of the feature table: csv, parquet or feather.
+
+    Returns:
+    str: The path of the saved file.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    table = df.sort_values(by='Date', kind='mergesort')
+    return write_table(table, os.path.splitext(feature_table_path(store_dir, league, storage_format))[0], storage_format)
+
+
+class FeatureStore:
+    """
+    Engineered feature table of a league, indexed by team, side and date for point-in-time lookups.
+    """
+
+    def __init__(self, table: pd.DataFrame):
+        table = table.copy()
+        table['Date'] = pd.to_datetime(table['Date'])
+        self.table = table.sort_values(by='Date', kind='mergesort').reset_index(drop=True)
+        self.dates = self.table['Date'].to_numpy(dtype='datetime64[ns]')
+        # Positions of the matches of each team and side, in date order
+        self.index = {}
+        for side, team_column in SIDES.items():
+            for team, positions in self.table.groupby(self.table[team_column].astype(str), sort=False).indices.items():
+                self.index[(team, side)] = positions
+
+    def has_team(self, team: str, side: str) -> bool:
+        """Check whether a team has matches on a side ('home' or 'away')."""
+        return (team, side) in self.index
+
+    def positions_as_of(self, teams, dates, side: str) -> np.ndarray:
+        """
+        Find the last match of each team on a side played up to each date.
+
+        Parameters:
+        teams (array-like of str): The teams.
+        dates (array-like of datetime): The dates of the lookups.
+        side (str): 'home' or 'away'.
+
+        Returns:
+        np.ndarray: The position of the match in the table for each lookup, -1 if the team has no match up to the date.
+        """
+        teams = pd.Series(np.asarray(teams, dtype=str))
+        dates = np.asarray(pd.to_datetime(dates), dtype='datetime64[ns]')
+        positions = np.full(len(teams), -1)
+        for team, rows in teams.groupby(teams, sort=False).indices.items():
+            team_positions = self.index.get((team, side))
+            if team_positions is None:
+                continue
+            counts = np.searchsorted(self.dates[team_positions], dates[rows], side='right')
+            found = counts > 0
+            positions[rows[found]] = team_positions[counts[found] - 1]
+        return positions
+
+    def as_of(self, team: str, date, side: str) -> pd.Series:
+        """
+        Return the features of a team as of a date: those of its last match on the side played up to the date.
+
+        Parameters:
+        team (str): The team name.
+        date (datetime): The date of the lookup.
+        side (str): 'home' or 'away'.
+
+        Returns:
+        pd.Series: The row of the match, or None if the team has no match up to the date.
+        """
+        position = self.positions_as_of([team], [date], side)[0]
+        return None if position < 0 else self.table.iloc[position]
+
+    def fixture_features(self, fixtures: pd.DataFrame, feature_columns: list) -> pd.DataFrame:
+        """
+        Build the features of fixtures from the point-in-time features of their teams.
+
+        Parameters:
+        fixtures (pd.DataFrame): The fixtures, with the HomeTeam, AwayTeam and Date columns.
+        feature_columns (list of str): The features to build.
+
+        Returns:
+        pd.DataFrame: The features of each fixture, with the index of fixtures. The features of the fixtures
+                      whose home or away team has no match up to the date are missing (NaN).
+        """
+        home_positions = self.positions_as_of(fixtures['HomeTeam'], fixtures['Date'], 'home')
+        away_positions = self.positions_as_of(fixtures['AwayTeam'], fixtures['Date'], 'away')
+        found = (home_positions >= 0) & (away_positions >= 0)
+
+        features = pd.DataFrame(np.nan, index=fixtures.index, columns=list(feature_columns))
+        home_rows = self.table.iloc[home_positions[found]]
+        away_rows = self.table.iloc[away_positions[found]]
+        for column in feature_columns:
+            home_values = home_rows[column].to_numpy()
+            away_values = away_rows[column].to_numpy()
+            side = feature_side(column)
+            if side == 'home':
+                features.loc[found, column] = home_values
+            elif side == 'away':
+                features.loc[found, column] = away_values
+            # If the column is not in the home or away team features, we take the average of both teams
+            else:
+                features.loc[found, column] = (home_values + away_values) / 2
+        return features
+
+
+def load_feature_store(store_dir: str, league: str, storage_format: str = "csv") -> FeatureStore:
+    """
+    Load the feature store of a league.
+
+    Parameters:
+    store_dir (str): The feature store directory.
+    league (str): The league code (e.g., "E0").
+    storage_format (str): Format of the feature table: csv, parquet or feather.
+
+    Returns:
+    FeatureStore: The feature store, or None if the league has no feature table.
+    """
+    path = feature_table_path(store_dir, league, storage_format)
+    if not os.path.exists(path):
+        return None
+    return FeatureStore(read_table(path))
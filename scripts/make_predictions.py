@@ -12,6 +12,10 @@ Example usage, it is suggested to run the script in the root directory:
 
     python scripts/make_predictions.py --input_leagues_models_dir models --input_data_predict_dir data/processed --final_predictions_out_file data/final_predictions.txt --next_matches data/next_matches.json
 
+With --feature_store_dir, the features of each match are read from the feature store written by the preprocessing
+(see feature_store.py), as of the match date. Without it, or for the leagues without a feature table, the processed
+rows of both teams are averaged.
+
 Required Libraries:
 - pandas
 - numpy
@@ -28,26 +32,14 @@ import pickle
 import numpy as np
 from datetime import datetime
 import argparse
+from storage import STORAGE_FORMATS, get_extension, read_table
+from team_registry import load_team_registry
+from feature_store import feature_side, load_feature_store
 
 # Define global constants
 VALID_LEAGUES = ["E0", "I1", "D1", "SP1", "F1"]
 
-# Define the features for home team, away team, and general match information
-HOME_TEAM_FEATURES = [
-    'HomeTeam', 'FTHG', 'HG', 'HTHG', 'HS', 'HST', 'HHW', 'HC', 'HF', 'HFKC', 'HO', 'HY', 'HR', 'HBP',
-    'B365H', 'BFH', 'BSH', 'BWH', 'GBH', 'IWH', 'LBH', 'PSH', 'SOH', 'SBH', 'SJH', 'SYH', 'VCH', 'WHH',
-    'BbMxH', 'BbAvH', 'MaxH', 'AvgH', 'BFEH', 'BbMxAHH', 'BbAvAHH', 'GBAHH', 'LBAHH', 'B365AHH', 'PAHH',
-    'MaxAHH', 'AvgAHH', 'BbAHh', 'AHh', 'GBAH', 'LBAH', 'B365AH', 'AvgHomeGoalsScored', 'AvgHomeGoalsConceded',
-    'HomeOver2.5Perc', 'AvgLast5HomeGoalsScored', 'AvgLast5HomeGoalsConceded', 'Last5HomeOver2.5Count', 'Last5HomeOver2.5Perc'
-]
-
-AWAY_TEAM_FEATURES = [
-    'AwayTeam', 'FTAG', 'AG', 'HTAG', 'AS', 'AST', 'AHW', 'AC', 'AF', 'AFKC', 'AO', 'AY', 'AR', 'ABP',
-    'B365A', 'BFA', 'BSA', 'BWA', 'GBA', 'IWA', 'LBA', 'PSA', 'SOA', 'SBA', 'SJA', 'SYA', 'VCA', 'WHA',
-    'BbMxA', 'BbAvA', 'MaxA', 'AvgA', 'BFEA', 'BbMxAHA', 'BbAvAHA', 'GBAHA', 'LBAHA', 'B365AHA', 'PAHA',
-    'MaxAHA', 'AvgAHA', 'AvgAwayGoalsScored', 'AvgAwayGoalsConceded', 'AwayOver2.5Perc', 'AvgLast5AwayGoalsScored',
-    'AvgLast5AwayGoalsConceded', 'Last5AwayOver2.5Count', 'Last5AwayOver2.5Perc'
-]
+# The features for home team and away team are defined in feature_store.py
 
 """
 The general features are common to both home and away teams and contain match information that is not specific to either team.
@@ -79,10 +71,10 @@ def load_model(filepath: str):
 
 
 def load_league_data(filepath: str) -> pd.DataFrame:
-    """Loads the league data from a CSV file using pandas.
+    """Loads the league data from a CSV, Parquet or Feather file using pandas.
     
     Args:
-        filepath (str): Path to the CSV file containing league data.
+        filepath (str): Path to the file containing league data.
     
     Returns:
         pd.DataFrame: The loaded league data as a DataFrame.
@@ -92,8 +84,8 @@ def load_league_data(filepath: str) -> pd.DataFrame:
         raise FileNotFoundError(f"File not found: {filepath}")
     else:
         print(f"Loading data from {filepath}...")
-    # Load the data from the CSV file
-        return pd.read_csv(filepath)
+    # Load the data, the format is inferred from the file extension
+        return read_table(filepath)
 
 
 def prepare_row_to_predict(home_team_df: pd.DataFrame, away_team_df: pd.DataFrame, numeric_columns: list) -> pd.DataFrame:
@@ -114,9 +106,9 @@ def prepare_row_to_predict(home_team_df: pd.DataFrame, away_team_df: pd.DataFram
     away_team_final_df = away_team_df.head(5)[numeric_columns]
 
     for column in row_to_predict.columns:
-        if column in HOME_TEAM_FEATURES:
+        if feature_side(column) == 'home':
             row_to_predict.loc[len(row_to_predict)-1, column] = home_team_final_df[column].mean()
-        elif column in AWAY_TEAM_FEATURES:
+        elif feature_side(column) == 'away':
             row_to_predict.loc[len(row_to_predict)-1, column] = away_team_final_df[column].mean()
         # If the column is not in the home or away team features, we take the average of both teams
         else:
@@ -125,7 +117,8 @@ def prepare_row_to_predict(home_team_df: pd.DataFrame, away_team_df: pd.DataFram
     return row_to_predict
 
 
-def make_predictions(league: str, league_model, league_data: pd.DataFrame, competitions: dict) -> str:
+def make_predictions(league: str, league_model, league_data: pd.DataFrame, competitions: dict, team_registry: dict = None,
+                     feature_store=None) -> str:
     """Makes predictions for a specific league and formats them into a Telegram message.
     
     Args:
@@ -133,6 +126,10 @@ def make_predictions(league: str, league_model, league_data: pd.DataFrame, compe
         league_model: The machine learning model for the league.
         league_data (pd.DataFrame): DataFrame containing the league data.
         competitions (dict): Dictionary containing competition details and upcoming matches.
+        team_registry (dict): The team registry written by the preprocessing, used to check the teams
+            of the league with dictionary lookups. If None, the teams are searched in league_data.
+        feature_store (FeatureStore): The feature store of the league. If given, the features of each match are
+            those of its teams as of the match date, otherwise they are averaged from the rows of league_data.
     
     Returns:
         str: A formatted string containing the predictions for the league.
@@ -145,17 +142,34 @@ def make_predictions(league: str, league_model, league_data: pd.DataFrame, compe
                 home_team = match['home_team']
                 away_team = match['away_team']
 
-                if home_team not in league_data['HomeTeam'].values or away_team not in league_data['AwayTeam'].values:
+                if team_registry is not None:
+                    teams = team_registry['teams']
+                    if league not in teams.get(home_team, {}).get('leagues', []) or league not in teams.get(away_team, {}).get('leagues', []):
+                        print(f"Skipping {home_team} vs {away_team}: team not found in the {league} data.")
+                        continue
+                elif home_team not in league_data['HomeTeam'].values or away_team not in league_data['AwayTeam'].values:
+                    print(f"Skipping {home_team} vs {away_team}: team not found in the {league} data.")
                     continue
 
-                home_team_df = league_data[league_data['HomeTeam'] == home_team]
-                away_team_df = league_data[league_data['AwayTeam'] == away_team]
-
                 numeric_columns = league_data.select_dtypes(include=['number']).columns
                 if 'Over2.5' in numeric_columns:
                     numeric_columns = numeric_columns.drop('Over2.5')
 
-                row_to_predict = prepare_row_to_predict(home_team_df, away_team_df, numeric_columns)
+                if feature_store is not None:
+                    # Point-in-time features of both teams, as of the match date
+                    match_date = pd.to_datetime(match.get('date', datetime.now()))
+                    fixture = pd.DataFrame({'HomeTeam': [home_team], 'AwayTeam': [away_team], 'Date': [match_date]})
+                    row_to_predict = feature_store.fixture_features(fixture, numeric_columns)
+                    if row_to_predict.isna().any(axis=None):
+                        print(f"Skipping {home_team} vs {away_team}: no {league} features for the home or away team.")
+                        continue
+                else:
+                    home_team_df = league_data[league_data['HomeTeam'] == home_team]
+                    away_team_df = league_data[league_data['AwayTeam'] == away_team]
+                    if home_team_df.empty or away_team_df.empty:
+                        print(f"Skipping {home_team} vs {away_team}: no {league} data for the home or away team.")
+                        continue
+                    row_to_predict = prepare_row_to_predict(home_team_df, away_team_df, numeric_columns)
                 X_test = row_to_predict.values
                 prediction = league_model.predict(X_test)
                 predicted_probability = league_model.predict_proba(X_test)[0]
@@ -170,21 +184,36 @@ def make_predictions(league: str, league_model, league_data: pd.DataFrame, compe
     return league_section
 
 
-def main(input_leagues_models_dir: str, input_data_predict_dir: str, final_predictions_out_file: str, next_matches: str):
+def main(input_leagues_models_dir: str, input_data_predict_dir: str, final_predictions_out_file: str, next_matches: str, storage_format: str = "csv",
+         models: dict = None, leagues_data: dict = None, competitions: dict = None, feature_store_dir: str = None):
     """Main function that handles the entire prediction process.
+
+    The models, the league data and the upcoming matches can be passed in memory (e.g., by the in-process
+    pipeline runner), in which case they are not loaded again from disk.
     
     Args:
         input_leagues_models_dir (str): Directory containing the model files.
         input_data_predict_dir (str): Directory containing the processed data files.
         final_predictions_out_file (str): Path where the output Telegram message will be saved.
         next_matches (str): Path to the JSON file with upcoming matches information.
+        storage_format (str): Format of the processed data files: csv, parquet or feather.
+        models (dict): Optional trained models, keyed by league.
+        leagues_data (dict): Optional processed data, keyed by league.
+        competitions (dict): Optional upcoming matches, with the schema of the next_matches JSON file.
+        feature_store_dir (str): Optional directory of the feature store (see feature_store.py).
     """
-    try:
-        print("Loading JSON file with upcoming matches...\n")
-        with open(next_matches, 'r', encoding='utf-16') as json_file:
-            competitions = json.load(json_file)
-    except Exception as e:
-        raise Exception(f"Error loading JSON file: {e}")
+    models = models or {}
+    leagues_data = leagues_data or {}
+
+    if competitions is None:
+        try:
+            print("Loading JSON file with upcoming matches...\n")
+            with open(next_matches, 'r', encoding='utf-16') as json_file:
+                competitions = json.load(json_file)
+        except Exception as e:
+            raise Exception(f"Error loading JSON file: {e}")
+
+    team_registry = load_team_registry(input_data_predict_dir)
 
     predictions_message = f"🎯 **AI Football Predictions: Will There Be Over 2.5 Goals?** 🎯\n\nCheck out the latest predictions for the upcoming football matches! We've analyzed the data and here are our thoughts:\n PREDICTIONS DONE: {datetime.now().strftime('%Y-%m-%d')} \n\n"
 
@@ -192,17 +221,20 @@ def main(input_leagues_models_dir: str, input_data_predict_dir: str, final_predi
         print(f"----------------------------------")
         print(f"\nMaking predictions for {league}...\n")
         model_path = os.path.join(input_leagues_models_dir, f"{league}_voting_classifier.pkl")
-        data_path = os.path.join(input_data_predict_dir, f"{league}_merged_preprocessed.csv")
+        data_path = os.path.join(input_data_predict_dir, f"{league}_merged_preprocessed{get_extension(storage_format)}")
 
-        if not os.path.exists(model_path) or not os.path.exists(data_path):
+        if (league not in models and not os.path.exists(model_path)) or (league not in leagues_data and not os.path.exists(data_path)):
             print(f"Missing data or model for {league}. Skipping...")
             continue
 
-        league_model = load_model(model_path)
-        league_data = load_league_data(data_path)
+        league_model = models[league] if league in models else load_model(model_path)
+        league_data = leagues_data[league] if league in leagues_data else load_league_data(data_path)
+        feature_store = load_feature_store(feature_store_dir, league, storage_format) if feature_store_dir else None
+        if feature_store_dir and feature_store is None:
+            print(f"No feature table for {league} in {feature_store_dir}, averaging the processed data.")
         print(f"Loaded model and data for {league}.")
         print(f"Predicting matches for {league}...")
-        league_section = make_predictions(league, league_model, league_data, competitions)
+        league_section = make_predictions(league, league_model, league_data, competitions, team_registry, feature_store)
         print(f"Predictions made for {league}.")
         predictions_message += league_section + "\n"
 
@@ -217,6 +249,9 @@ if __name__ == "__main__":
     parser.add_argument('--input_data_predict_dir', type=str, required=True, help="Directory containing the processed data files")
     parser.add_argument('--final_predictions_out_file', type=str, required=True, help="File path to save the Telegram message output")
     parser.add_argument('--next_matches', type=str, required=True, help="Path to the JSON file with upcoming matches information")
+    parser.add_argument('--storage_format', type=str, choices=list(STORAGE_FORMATS), default="csv", help="Format of the processed data files")
+    parser.add_argument('--feature_store_dir', type=str, default=None, help="Optional directory of the feature store (default: disabled)")
 
     args = parser.parse_args()
-    main(args.input_leagues_models_dir, args.input_data_predict_dir, args.final_predictions_out_file, args.next_matches)
+    main(args.input_leagues_models_dir, args.input_data_predict_dir, args.final_predictions_out_file, args.next_matches, args.storage_format,
+         feature_store_dir=args.feature_store_dir or None)
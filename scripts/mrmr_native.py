@@ -0,0 +1,205 @@
+"""
+Built-in vectorized engine for the feature selection of the preprocessing: mRMR ranking and
+selection of one feature per cluster of correlated features.
+
+It follows the algorithm of mrmr_classif (mrmr-selection package, F-statistic relevance, Pearson
+correlation redundancy, mean denominator), but computes everything once with NumPy:
+
+- the F-statistics of all the features, from per-class sums over column-major blocks;
+- the Pearson correlation matrix of the candidate features, so that each greedy step only adds
+  the correlations with the last selected feature to the redundancy sums;
+- the Spearman correlation matrix of the selected features, from the column ranks;
+- the highest-variance feature of each cluster, with a single sort.
+
+Example usage:
+--------------
+    selected_features = mrmr_classif(X, y, K=20)
+    corr_matrix = spearman_correlation(df[selected_features])
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata
+
+# Minimum redundancy of a pair of features, as in mrmr-selection
+FLOOR = 0.001
+
+
+def computation_dtype(dtype) -> type:
+    """
+    Return the float type used by scikit-learn's f_classif for a column dtype (see sklearn.utils.as_float_array).
+
+    Parameters:
+    dtype (np.dtype): The column dtype.
+
+    Returns:
+    type: np.float32 or np.float64.
+    """
+    dtype = np.dtype(dtype)
+    if dtype == np.float32 or (dtype.kind in "uib" and dtype.itemsize <= 4):
+        return np.float32
+    return np.float64
+
+
+def f_oneway(blocks: list) -> np.ndarray:
+    """
+    One-way ANOVA F-statistic of several features at once, with the operations of sklearn's f_oneway.
+
+    Parameters:
+    blocks (list of np.ndarray): The samples of each class, of shape (n_samples_of_the_class, n_features).
+
+    Returns:
+    np.ndarray: The F-statistic of each feature.
+    """
+    n_classes = len(blocks)
+    n_samples_per_class = np.array([block.shape[0] for block in blocks])
+    n_samples = np.sum(n_samples_per_class)
+    ss_alldata = sum((block ** 2).sum(axis=0) for block in blocks)
+    sums_args = [block.sum(axis=0) for block in blocks]
+    square_of_sums_alldata = sum(sums_args) ** 2
+    square_of_sums_args = [s ** 2 for s in sums_args]
+    sstot = ss_alldata - square_of_sums_alldata / float(n_samples)
+    ssbn = 0.0
+    for k in range(n_classes):
+        ssbn += square_of_sums_args[k] / n_samples_per_class[k]
+    ssbn -= square_of_sums_alldata / float(n_samples)
+    sswn = sstot - ssbn
+    msb = ssbn / float(n_classes - 1)
+    msw = sswn / float(n_samples - n_classes)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return msb / msw
+
+
+def f_classif(X: pd.DataFrame, y: pd.Series) -> np.ndarray:
+    """
+    F-statistic of each feature with respect to the classes of the target, ignoring the missing values
+    of each feature. Undefined statistics (e.g., constant features) are 0.
+
+    Parameters:
+    X (pd.DataFrame): The feature matrix.
+    y (pd.Series): The target variable.
+
+    Returns:
+    np.ndarray: The F-statistic of each column of X.
+    """
+    y = np.asarray(y)
+    scores = np.zeros(X.shape[1])
+    dtypes = [computation_dtype(dtype) for dtype in X.dtypes]
+    is_float32 = np.array([dtype is np.float32 for dtype in dtypes], dtype=bool)
+    has_missing = X.isna().any().to_numpy()
+
+    # Complete columns, by computation dtype: one block per class, column-major so that each column is summed as a vector
+    for dtype, is_dtype in ((np.float32, is_float32), (np.float64, ~is_float32)):
+        positions = np.flatnonzero(is_dtype & ~has_missing)
+        if len(positions) == 0:
+            continue
+        values = X.iloc[:, positions].to_numpy().astype(dtype)
+        scores[positions] = f_oneway([np.asfortranarray(values[y == k]) for k in np.unique(y)])
+
+    # Columns with missing values, each one on its own observed rows
+    for position in np.flatnonzero(has_missing):
+        column = X.iloc[:, position]
+        observed = column.notna().to_numpy()
+        if observed.any():
+            values = column.to_numpy()[observed].astype(dtypes[position]).reshape(-1, 1)
+            scores[position] = f_oneway([values[y[observed] == k] for k in np.unique(y[observed])])[0]
+
+    return np.nan_to_num(scores, nan=0.0, posinf=np.inf)
+
+
+def correlation_matrix(X: pd.DataFrame) -> np.ndarray:
+    """
+    Pearson correlation matrix of the columns of X. Missing values are excluded pairwise.
+
+    Parameters:
+    X (pd.DataFrame): The feature matrix.
+
+    Returns:
+    np.ndarray: The correlation matrix, NaN for the pairs without variance.
+    """
+    if X.isna().any().any():
+        return X.corr(method='pearson').to_numpy()
+    # One row per feature, so that the means are computed over contiguous values
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.corrcoef(np.ascontiguousarray(X.to_numpy(dtype=float).T))
+
+
+def mrmr_classif(X: pd.DataFrame, y: pd.Series, K: int) -> list:
+    """
+    Select K features with the mRMR algorithm: at each step, the feature maximizing its relevance divided by its
+    mean redundancy (absolute correlation) with the features already selected.
+
+    Parameters:
+    X (pd.DataFrame): The feature matrix.
+    y (pd.Series): The target variable.
+    K (int): Maximum number of features to select.
+
+    Returns:
+    list of str: The selected features, in selection order.
+    """
+    relevance = f_classif(X, y)
+    candidates = np.flatnonzero(relevance > 0)
+    K = min(K, len(candidates))
+    relevance = relevance[candidates]
+
+    correlations = correlation_matrix(X.iloc[:, candidates])
+    redundancies = np.clip(np.abs(np.nan_to_num(correlations, nan=FLOOR)), FLOOR, None)
+
+    # Redundancy of each candidate with the selected features, one column per selected feature
+    selected_redundancies = np.empty((len(candidates), K))
+    available = np.ones(len(candidates), dtype=bool)
+    selected = []
+    for i in range(K):
+        if i == 0:
+            score = relevance.copy()
+        else:
+            denominator = selected_redundancies[:, :i].sum(axis=1) / i
+            denominator[denominator == 1.0] = np.inf
+            score = relevance / denominator
+        score[~available] = -np.inf
+        best = int(np.argmax(score))
+        selected.append(best)
+        available[best] = False
+        selected_redundancies[:, i] = redundancies[:, best]
+
+    return X.columns[candidates[selected]].tolist()
+
+
+def spearman_correlation(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Spearman correlation matrix of the columns of df, the Pearson correlation of their average ranks.
+
+    Parameters:
+    df (pd.DataFrame): The features.
+
+    Returns:
+    pd.DataFrame: The correlation matrix.
+    """
+    if df.isna().any().any():
+        return df.corr(method='spearman')
+    ranks = rankdata(df.to_numpy(dtype=float), method='average', axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlations = np.corrcoef(np.ascontiguousarray(ranks.T))
+    return pd.DataFrame(correlations, index=df.columns, columns=df.columns)
+
+
+def highest_variance_per_cluster(features: list, cluster_ids: np.ndarray, variances: np.ndarray) -> list:
+    """
+    Pick the feature with the highest variance of each cluster, the first one in case of ties.
+
+    Parameters:
+    features (list of str): The features.
+    cluster_ids (np.ndarray): The cluster of each feature.
+    variances (np.ndarray): The variance of each feature.
+
+    Returns:
+    list of str: One feature per cluster, with the clusters in order of first appearance.
+    """
+    _, first_positions, cluster_codes = np.unique(cluster_ids, return_index=True, return_inverse=True)
+    cluster_order = first_positions[cluster_codes]
+    positions = np.arange(len(features))
+    # Sort by cluster (order of first appearance), then by decreasing variance, then by position
+    order = np.lexsort((positions, -np.asarray(variances, dtype=float), cluster_order))
+    is_first = np.ones(len(order), dtype=bool)
+    is_first[1:] = cluster_order[order][1:] != cluster_order[order][:-1]
+    return [features[i] for i in order[is_first]]
@@ -0,0 +1,122 @@
+"""
+Out-of-fold predictions of the tuned models, to evaluate the voting ensemble without refitting it.
+
+The cross-validation of the best estimator of each model fits it once per fold. The predictions and the
+probabilities of each fold estimator on its test fold are kept in a cache:
+
+    {
+        "predictions": np.ndarray of shape (n_samples,),                  # predicted class of each sample
+        "probabilities": np.ndarray of shape (n_samples, n_classes),      # None without predict_proba
+    }
+
+The voting classifier fitted on a training fold is made of the same fold estimators (its members are clones
+of the best estimators, fitted on the same rows), so its predictions on the test fold are the soft or hard
+votes of the cached predictions. ensemble_cv_scores scores these votes fold by fold with the scorer of the
+training, which gives the scores of cross_val_score on the voting classifier without its n_splits x n_models fits.
+
+Example usage:
+--------------
+    folds = list(cv.split(X, y))
+    scores, cache = out_of_fold_predictions(best_estimator, X, y, folds, scorer)
+    ensemble_scores = ensemble_cv_scores({'lr': cache, ...}, y, folds, scorer, voting='soft')
+"""
+
+import numpy as np
+from sklearn.model_selection import cross_validate
+
+
+def out_of_fold_predictions(estimator, X: np.ndarray, y: np.ndarray, folds: list, scorer, n_jobs: int = None) -> tuple:
+    """
+    Cross-validate an estimator and keep the predictions of each fold estimator on its test fold.
+
+    Parameters:
+    -----------
+    estimator : estimator
+        The estimator, cloned and fitted on each training fold.
+    X : np.ndarray
+        The feature matrix.
+    y : np.ndarray
+        The target variable.
+    folds : list of (np.ndarray, np.ndarray)
+        The training and test indices of each fold, covering every sample once as test sample.
+    scorer : callable
+        The scorer of the cross-validation.
+    n_jobs : int, optional
+        Number of cores used to fit the folds.
+
+    Returns:
+    --------
+    cv_score : np.ndarray
+        The score of each fold, as returned by cross_val_score.
+    cache : dict
+        The out-of-fold predictions and probabilities (None if the estimator has no predict_proba).
+    """
+    cv_results = cross_validate(estimator, X, y, cv=folds, scoring=scorer, n_jobs=n_jobs, return_estimator=True)
+
+    predictions = np.empty(len(y), dtype=np.asarray(y).dtype)
+    probabilities = None
+    for fold_estimator, (_, test) in zip(cv_results['estimator'], folds):
+        predictions[test] = fold_estimator.predict(X[test])
+        if hasattr(fold_estimator, 'predict_proba'):
+            fold_probabilities = fold_estimator.predict_proba(X[test])
+            if probabilities is None:
+                probabilities = np.empty((len(y), fold_probabilities.shape[1]))
+            probabilities[test] = fold_probabilities
+    return cv_results['test_score'], {'predictions': predictions, 'probabilities': probabilities}
+
+
+class OutOfFoldEnsemble:
+    """
+    Voting classifier answering from the cached out-of-fold predictions of its members, as the VotingClassifier
+    fitted on the training fold would. The samples to predict are given by their indices instead of their features.
+    """
+
+    _estimator_type = "classifier"
+
+    def __init__(self, caches: dict, classes: np.ndarray, voting: str = 'soft'):
+        self.caches = caches
+        self.classes_ = classes
+        self.voting = voting
+
+    def predict_proba(self, indices: np.ndarray) -> np.ndarray:
+        """Average the probabilities of the members (soft voting)."""
+        return np.average([cache['probabilities'][indices] for cache in self.caches.values()], axis=0)
+
+    def predict(self, indices: np.ndarray) -> np.ndarray:
+        """Predict the class of the samples by soft or hard (majority, lowest class on ties) voting."""
+        if self.voting == 'soft':
+            return self.classes_[np.argmax(self.predict_proba(indices), axis=1)]
+        votes = np.asarray([np.searchsorted(self.classes_, cache['predictions'][indices]) for cache in self.caches.values()]).T
+        return self.classes_[np.apply_along_axis(lambda x: np.argmax(np.bincount(x)), axis=1, arr=votes)]
+
+
+def ensemble_cv_scores(caches: dict, y: np.ndarray, folds: list, scorer, voting: str = 'soft') -> np.ndarray:
+    """
+    Score the voting ensemble of the members on each fold from their out-of-fold predictions.
+
+    Parameters:
+    -----------
+    caches : dict
+        The out-of-fold predictions of each member, computed with the same folds.
+    y : np.ndarray
+        The target variable.
+    folds : list of (np.ndarray, np.ndarray)
+        The training and test indices of each fold.
+    scorer : callable
+        The scorer of the cross-validation.
+    voting : str
+        'soft' or 'hard'.
+
+    Returns:
+    --------
+    cv_scores : np.ndarray
+        The score of each fold. Like cross_val_score, the scores are missing (NaN) when the metric needs
+        probabilities that the ensemble does not provide (hard voting).
+    """
+    needs_probabilities = scorer._response_method != 'predict'
+    if needs_probabilities and (voting == 'hard' or any(cache['probabilities'] is None for cache in caches.values())):
+        print(f"The {voting} voting ensemble has no probabilities to compute {scorer._score_func.__name__}")
+        return np.full(len(folds), np.nan)
+
+    ensemble = OutOfFoldEnsemble(caches, np.unique(y), voting)
+    return np.array([scorer(ensemble, test, y[test]) for _, test in folds])
@@ -0,0 +1,138 @@
+"""
+Cache of the best hyperparameters found by the training, for warm-start retraining.
+
+After a full hyperparameter search, the best parameters of each model of a league are saved with the
+settings of the search and the matches of the training data:
+
+    {cache_dir}/{league}_best_params.json
+    {
+        "league": "E0",
+        "search_settings": {"metric_choice": "accuracy", "n_splits": 10, "param_grids": {...}},
+        "feature_columns": ["B365>2.5", ...],
+        "match_keys": [["2024-08-16", "Man United", "Fulham"], ...],
+        "best_params": {"Logistic Regression": {"C": 0.1, ...}, ...}
+    }
+
+The next training of the league can refit the models with these parameters instead of searching them again,
+as long as the search settings and the features are the same and the training data drifted less than a
+threshold. The drift is the number of matches added or removed since the search divided by the number of
+searched matches. The matches are identified by their date and teams rather than by their features, as the
+season and rolling features of the earlier matches are recomputed when new matches are added. The match keys
+are only updated by a full search, so the drift accumulates over the fast retrainings until a new search is due.
+
+Example usage:
+--------------
+    entry = load_best_params("data/cache/best_params", "E0")
+    reason = fast_retrain_blocker(entry, search_settings, feature_columns, match_keys(df), max_drift=0.05)
+"""
+
+import os
+import json
+import pandas as pd
+from storage import write_json
+
+# Columns identifying a match of the processed data
+MATCH_KEY_COLUMNS = ["Date", "HomeTeam", "AwayTeam"]
+
+
+def match_keys(df: pd.DataFrame) -> list:
+    """
+    Identify the matches of the training data by their date and teams.
+
+    Parameters:
+    df (pd.DataFrame): The processed data, with the Date, HomeTeam and AwayTeam columns.
+
+    Returns:
+    list: The [date, home team, away team] of each match, the date as YYYY-MM-DD.
+    """
+    dates = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d')
+    return [[date, str(home), str(away)] for date, home, away in zip(dates, df['HomeTeam'], df['AwayTeam'])]
+
+
+def data_drift(cached_keys: list, keys: list) -> float:
+    """
+    Compute the share of the cached matches that were added or removed.
+
+    Parameters:
+    cached_keys (list): The match keys of the data of the search.
+    keys (list): The match keys of the current data.
+
+    Returns:
+    float: The number of added and removed matches divided by the number of cached matches.
+    """
+    cached_keys, keys = set(map(tuple, cached_keys)), set(map(tuple, keys))
+    return (len(keys - cached_keys) + len(cached_keys - keys)) / max(len(cached_keys), 1)
+
+
+def fast_retrain_blocker(entry: dict, search_settings: dict, feature_columns: list, keys: list, max_drift: float) -> str:
+    """
+    Check whether the cached parameters of a league can be reused.
+
+    Parameters:
+    entry (dict): The cached entry of the league, None if there is none.
+    search_settings (dict): The settings of the search (metric, number of splits, hyperparameter grids).
+    feature_columns (list of str): The features of the training data.
+    keys (list): The match keys of the training data, None if unknown.
+    max_drift (float): The maximum drift of the data (see data_drift).
+
+    Returns:
+    str: The reason why a full search is needed, None if the cached parameters can be reused.
+    """
+    if entry is None:
+        return "no cached hyperparameters"
+    # Round-trip through JSON, so that tuples and lists of the grids compare equal
+    if entry['search_settings'] != json.loads(json.dumps(search_settings)):
+        return "the search settings changed"
+    if entry['feature_columns'] != list(feature_columns):
+        return "the feature set changed"
+    if keys is None or entry.get('match_keys') is None:
+        return "the matches of the training data are unknown"
+    drift = data_drift(entry['match_keys'], keys)
+    if drift > max_drift:
+        return f"the data drifted by {drift:.1%} (more than {max_drift:.1%})"
+    return None
+
+
+def load_best_params(cache_dir: str, league: str) -> dict:
+    """
+    Load the cached best parameters of a league.
+
+    Parameters:
+    cache_dir (str): The cache directory.
+    league (str): The league code (e.g., "E0").
+
+    Returns:
+    dict: The cached entry, or None if there is none.
+    """
+    path = os.path.join(cache_dir, f"{league}_best_params.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_best_params(cache_dir: str, league: str, search_settings: dict, feature_columns: list, keys: list, best_params: dict) -> str:
+    """
+    Save the best parameters of a league found by a full search, with the matches of its training data.
+
+    Parameters:
+    cache_dir (str): The cache directory.
+    league (str): The league code (e.g., "E0").
+    search_settings (dict): The settings of the search (metric, number of splits, hyperparameter grids).
+    feature_columns (list of str): The features of the training data.
+    keys (list): The match keys of the training data, None if unknown.
+    best_params (dict): The best parameters of each model.
+
+    Returns:
+    str: The path of the saved file.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{league}_best_params.json")
+    write_json({
+        'league': league,
+        'search_settings': search_settings,
+        'feature_columns': list(feature_columns),
+        'match_keys': keys,
+        'best_params': best_params,
+    }, path)
+    return path
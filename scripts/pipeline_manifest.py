@@ -0,0 +1,134 @@
+"""
+Content-hash manifest used by the invoke tasks to skip the pipeline steps whose inputs did not change.
+
+Each step declares its input files, its parameters and its output files. The fingerprint of a step
+is the hash of the content of its inputs and of its parameters: when it matches the fingerprint recorded
+in the manifest after the last successful run, and the outputs are still the ones written by that run,
+the step is up to date and can be skipped (make-style dependency tracking, based on content instead of
+modification times).
+
+Example usage:
+--------------
+    manifest = PipelineManifest(".pipeline_manifest.json")
+    step_fingerprint = fingerprint(["data/processed/E0_merged_preprocessed.csv"], {"n_splits": 10})
+    if not manifest.is_up_to_date("train_models:E0", step_fingerprint, ["models/E0_voting_classifier.pkl"]):
+        ...  # run the step
+        manifest.record("train_models:E0", step_fingerprint, ["models/E0_voting_classifier.pkl"])
+        manifest.save()
+"""
+
+import os
+import json
+import hashlib
+
+# Size of the chunks read when hashing a file
+CHUNK_SIZE = 1 << 20
+
+
+def hash_file(path: str) -> str:
+    """
+    Compute the SHA-256 hash of the content of a file.
+
+    Parameters:
+    path (str): Path to the file.
+
+    Returns:
+    str: The hex digest, or None if the file does not exist.
+    """
+    if not os.path.isfile(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def list_files(directory: str, extension: str = "") -> list:
+    """
+    List the files of a directory (not recursively) with the given extension, sorted by name.
+
+    Parameters:
+    directory (str): The directory to scan.
+    extension (str): The extension of the files to list, all the files if empty.
+
+    Returns:
+    list of str: The paths of the files.
+    """
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, filename) for filename in sorted(os.listdir(directory))
+            if filename.endswith(extension) and os.path.isfile(os.path.join(directory, filename))]
+
+
+def fingerprint(inputs: list, params: dict = None) -> str:
+    """
+    Compute the fingerprint of a step from the content of its input files and its parameters.
+
+    Parameters:
+    inputs (list of str): Paths to the input files, a missing file is hashed as None.
+    params (dict): Parameters of the step, they must be JSON serializable.
+
+    Returns:
+    str: The hex digest of the fingerprint.
+    """
+    content = {
+        'inputs': {path: hash_file(path) for path in sorted(inputs)},
+        'params': params or {},
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class PipelineManifest:
+    """
+    JSON manifest recording, for each step, the fingerprint of its last successful run and the hashes of its outputs.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.steps = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.steps = json.load(f)
+
+    def is_up_to_date(self, step: str, step_fingerprint: str, outputs: list) -> bool:
+        """
+        Check whether a step can be skipped.
+
+        Parameters:
+        step (str): The name of the step.
+        step_fingerprint (str): The current fingerprint of the step.
+        outputs (list of str): Paths to the output files of the step.
+
+        Returns:
+        bool: True if the fingerprint is unchanged and the outputs are the ones written by the last run.
+        """
+        entry = self.steps.get(step)
+        if entry is None or entry['fingerprint'] != step_fingerprint:
+            return False
+        if sorted(entry['outputs']) != sorted(outputs):
+            return False
+        return all(hash_file(path) is not None and hash_file(path) == output_hash
+                   for path, output_hash in entry['outputs'].items())
+
+    def record(self, step: str, step_fingerprint: str, outputs: list):
+        """
+        Record a successful run of a step.
+
+        Parameters:
+        step (str): The name of the step.
+        step_fingerprint (str): The fingerprint of the step computed before running it.
+        outputs (list of str): Paths to the output files written by the step.
+        """
+        self.steps[step] = {
+            'fingerprint': step_fingerprint,
+            'outputs': {path: hash_file(path) for path in outputs},
+        }
+
+    def save(self):
+        """
+        Save the manifest, writing a temporary file first so that an interrupted run never corrupts it.
+        """
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.steps, f, indent=4, sort_keys=True)
+        os.replace(self.path + '.tmp', self.path)
@@ -0,0 +1,217 @@
+"""
+In-process runner of the full predictions pipeline.
+
+The invoke tasks run every stage in its own Python process, so each stage pays the interpreter start-up,
+the imports (pandas, scikit-learn, xgboost...) and re-reads from disk what the previous stage has just written.
+This runner calls the stage functions directly and passes the processed DataFrames, the trained models and
+the next matches in memory. The files are still written at the checkpoints (raw data, processed data and team
+registry, model pickles, next matches JSON, Telegram message), so each stage can be resumed with its script.
+
+Usage:
+------
+Run this script from the terminal in the root folder as follows:
+
+    python scripts/pipeline_runner.py --leagues E0 I1 SP1 F1 D1 --seasons 2425 2324 2223
+
+With --compare, the pipeline is run a second time through the scripts, as the invoke tasks do, and the
+wall-clock time of both paths is reported per stage. Run it with warm download caches (--cache_dir and
+--api_cache_dir), otherwise the first run also pays the downloads.
+
+Parameters:
+-----------
+--leagues, --seasons, --raw_data_dir, --processed_data_dir, --models_dir, --next_matches_file, --output_file :
+    Inputs and checkpoints of the pipeline, see the defaults of the invoke tasks.
+--num_features, --clustering_threshold : Preprocessing parameters.
+--metric_choice, --n_splits, --voting, --n_jobs, --parallel_estimators, --league_jobs, --retrain_mode, --max_drift,
+--params_cache_dir, --results_store_file : Training parameters.
+--max_workers, --cache_dir, --api_cache_dir, --requests_per_minute : Acquisition parameters.
+--storage_format : Format of the raw and processed files: csv, parquet or feather.
+--feature_store_dir : Directory of the feature store shared by the training and the predictions, empty to disable it.
+--compare : Also run the subprocess path and report the wall-clock time saved.
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+from data_acquisition import download_and_merge_data
+from data_preprocessing import preprocess_and_save_csv
+from train_models import train_leagues
+from acquire_next_matches import HEADERS, BASE_URL as API_BASE_URL, COMPETITIONS, REQUESTS_PER_MINUTE, get_next_matches, update_team_names, save_to_json
+from make_predictions import main as make_predictions_main
+from storage import STORAGE_FORMATS
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Pipeline stages, in execution order
+STAGES = ["data_acquisition", "data_preprocessing", "train_models", "acquire_next_matches", "make_predictions"]
+
+
+def run_pipeline(args: argparse.Namespace) -> dict:
+    """
+    Run the pipeline in-process, passing the DataFrames and the models in memory between the stages.
+
+    Parameters:
+    args (argparse.Namespace): Parsed command-line arguments.
+
+    Returns:
+    dict: Wall-clock time in seconds of each stage.
+    """
+    timings = {}
+    feature_store_dir = args.feature_store_dir or None  # An empty directory disables the feature store
+
+    start = time.perf_counter()
+    download_and_merge_data(args.leagues, args.seasons, args.raw_data_dir, args.max_workers,
+                            cache_dir=args.cache_dir, storage_format=args.storage_format)
+    timings["data_acquisition"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    os.makedirs(args.processed_data_dir, exist_ok=True)
+    leagues_data = preprocess_and_save_csv(args.raw_data_dir, args.processed_data_dir, args.num_features,
+                                           clustering_threshold=args.clustering_threshold, storage_format=args.storage_format,
+                                           feature_store_dir=feature_store_dir)
+    timings["data_preprocessing"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    os.makedirs(args.models_dir, exist_ok=True)
+    models = train_leagues(leagues_data, args.models_dir, args.metric_choice, args.voting, args.n_splits, args.storage_format, feature_store_dir,
+                           n_jobs=args.n_jobs, parallel_estimators=args.parallel_estimators, league_jobs=args.league_jobs,
+                           params_cache_dir=args.params_cache_dir, retrain_mode=args.retrain_mode, max_drift=args.max_drift,
+                           results_store_file=args.results_store_file)
+    timings["train_models"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    failures = get_next_matches(HEADERS, API_BASE_URL, requests_per_minute=args.requests_per_minute, cache_dir=args.api_cache_dir)
+    if failures:
+        print(f"Next matches not available for: {', '.join(failures)}")
+    competitions, _ = update_team_names(COMPETITIONS, args.processed_data_dir)
+    save_to_json(competitions, args.next_matches_file)
+    timings["acquire_next_matches"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    make_predictions_main(args.models_dir, args.processed_data_dir, args.output_file, args.next_matches_file, args.storage_format,
+                          models=models, leagues_data=leagues_data, competitions=competitions, feature_store_dir=feature_store_dir)
+    timings["make_predictions"] = time.perf_counter() - start
+
+    return timings
+
+
+def get_stage_commands(args: argparse.Namespace) -> dict:
+    """
+    Build the command lines run by the invoke tasks for each stage.
+
+    Parameters:
+    args (argparse.Namespace): Parsed command-line arguments.
+
+    Returns:
+    dict: The command (list of str) of each stage.
+    """
+    def script(name):
+        return [sys.executable, os.path.join(SCRIPTS_DIR, name)]
+
+    return {
+        "data_acquisition": script("data_acquisition.py") + [
+            "--leagues", *args.leagues, "--seasons", *args.seasons, "--raw_data_output_dir", args.raw_data_dir,
+            "--max_workers", str(args.max_workers), "--cache_dir", args.cache_dir, "--storage_format", args.storage_format],
+        "data_preprocessing": script("data_preprocessing.py") + [
+            "--raw_data_input_dir", args.raw_data_dir, "--processed_data_output_dir", args.processed_data_dir,
+            "--num_features", str(args.num_features), "--clustering_threshold", str(args.clustering_threshold),
+            "--storage_format", args.storage_format, "--feature_store_dir", args.feature_store_dir],
+        "train_models": script("train_models.py") + [
+            "--processed_data_input_dir", args.processed_data_dir, "--trained_models_output_dir", args.models_dir,
+            "--metric_choice", args.metric_choice, "--n_splits", str(args.n_splits), "--voting", args.voting,
+            "--storage_format", args.storage_format, "--feature_store_dir", args.feature_store_dir,
+            *(["--n_jobs", str(args.n_jobs)] if args.n_jobs is not None else []),
+            *(["--parallel_estimators"] if args.parallel_estimators else []), "--league_jobs", str(args.league_jobs),
+            "--retrain_mode", args.retrain_mode, "--max_drift", str(args.max_drift), "--params_cache_dir", args.params_cache_dir,
+            "--results_store_file", args.results_store_file],
+        "acquire_next_matches": script("acquire_next_matches.py") + [
+            "--get_teams_names_dir", args.processed_data_dir, "--next_matches_output_file", args.next_matches_file,
+            "--requests_per_minute", str(args.requests_per_minute), "--cache_dir", args.api_cache_dir],
+        "make_predictions": script("make_predictions.py") + [
+            "--input_leagues_models_dir", args.models_dir, "--input_data_predict_dir", args.processed_data_dir,
+            "--final_predictions_out_file", args.output_file, "--next_matches", args.next_matches_file,
+            "--storage_format", args.storage_format, "--feature_store_dir", args.feature_store_dir],
+    }
+
+
+def run_pipeline_subprocess(args: argparse.Namespace) -> dict:
+    """
+    Run the pipeline through the scripts, one process per stage, as the invoke tasks do.
+
+    Parameters:
+    args (argparse.Namespace): Parsed command-line arguments.
+
+    Returns:
+    dict: Wall-clock time in seconds of each stage.
+    """
+    timings = {}
+    for stage, command in get_stage_commands(args).items():
+        start = time.perf_counter()
+        subprocess.run(command, check=True)
+        timings[stage] = time.perf_counter() - start
+    return timings
+
+
+def print_timings(in_process_timings: dict, subprocess_timings: dict = None):
+    """
+    Print the wall-clock time of each stage and, if available, the time saved against the subprocess path.
+
+    Parameters:
+    in_process_timings (dict): Time in seconds of each stage of the in-process run.
+    subprocess_timings (dict): Time in seconds of each stage of the subprocess run, or None.
+    """
+    print("\nWall-clock time per stage (s):")
+    for stage in STAGES + ["total"]:
+        in_process = sum(in_process_timings.values()) if stage == "total" else in_process_timings[stage]
+        line = f"  {stage:<22}in-process {in_process:9.2f}"
+        if subprocess_timings is not None:
+            sub = sum(subprocess_timings.values()) if stage == "total" else subprocess_timings[stage]
+            line += f"  subprocess {sub:9.2f}  saved {sub - in_process:8.2f}"
+        print(line)
+
+
+def parse_arguments():
+    """
+    Parse command-line arguments.
+
+    Returns:
+    argparse.Namespace: Parsed command-line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Run the full predictions pipeline in a single process.")
+    parser.add_argument("--leagues", nargs="+", default=["E0", "I1", "SP1", "F1", "D1"], help="Leagues to download and predict.")
+    parser.add_argument("--seasons", nargs="+", default=["2425", "2324", "2223"], help="Seasons to download.")
+    parser.add_argument("--raw_data_dir", type=str, default="data/raw", help="Directory of the raw merged files.")
+    parser.add_argument("--processed_data_dir", type=str, default="data/processed", help="Directory of the processed files and of the team registry.")
+    parser.add_argument("--models_dir", type=str, default="models", help="Directory of the trained models.")
+    parser.add_argument("--next_matches_file", type=str, default="data/next_matches.json", help="JSON file of the next matches.")
+    parser.add_argument("--output_file", type=str, default="telegram_post.txt", help="File of the Telegram message.")
+    parser.add_argument("--num_features", type=int, default=20, help="Number of top features to select using mRMR.")
+    parser.add_argument("--clustering_threshold", type=float, default=0.5, help="The threshold for hierarchical clustering to form flat clusters.")
+    parser.add_argument("--metric_choice", type=str, choices=['accuracy', 'precision', 'f1', 'roc_auc'], default='accuracy', help="Metric to optimize during training.")
+    parser.add_argument("--n_splits", type=int, default=10, help="Number of splits for cross-validation.")
+    parser.add_argument("--voting", type=str, choices=['soft', 'hard'], default='soft', help="Voting method for the ensemble model.")
+    parser.add_argument("--n_jobs", type=int, default=None, help="Number of cores used by the hyperparameter searches, -1 for all the cores.")
+    parser.add_argument("--parallel_estimators", action="store_true", help="Run the hyperparameter searches of the estimators at the same time.")
+    parser.add_argument("--league_jobs", type=int, default=1, help="Maximum number of leagues trained at the same time, within the core budget.")
+    parser.add_argument("--retrain_mode", type=str, choices=['full', 'fast'], default='full', help="'fast' reuses the cached hyperparameters when the data barely changed.")
+    parser.add_argument("--max_drift", type=float, default=0.05, help="Maximum share of added or removed matches to reuse the cached hyperparameters.")
+    parser.add_argument("--params_cache_dir", type=str, default="data/cache/best_params", help="Directory of the cached best hyperparameters.")
+    parser.add_argument("--results_store_file", type=str, default="data/cache/search_results.sqlite", help="SQLite file of the scores of the hyperparameter searches.")
+    parser.add_argument("--max_workers", type=int, default=8, help="Number of concurrent downloads.")
+    parser.add_argument("--cache_dir", type=str, default="data/cache/http", help="Cache directory of the season files.")
+    parser.add_argument("--api_cache_dir", type=str, default="data/cache/api", help="Cache directory of the API responses.")
+    parser.add_argument("--requests_per_minute", type=int, default=REQUESTS_PER_MINUTE, help="Maximum number of API requests per minute.")
+    parser.add_argument("--storage_format", type=str, choices=list(STORAGE_FORMATS), default="csv", help="Format of the raw and processed files.")
+    parser.add_argument("--feature_store_dir", type=str, default="data/feature_store", help="Directory of the feature store, empty to disable it.")
+    parser.add_argument("--compare", action="store_true", help="Also run the subprocess path and report the wall-clock time saved.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    in_process_timings = run_pipeline(args)
+    subprocess_timings = run_pipeline_subprocess(args) if args.compare else None
+    print_timings(in_process_timings, subprocess_timings)
@@ -0,0 +1,345 @@
+"""
+Local SQLite store of the hyperparameter search results, to resume an interrupted training and to analyse the
+past searches without running them again.
+
+Every score computed by the searches of train_models.py is written as soon as it is known, one row per league,
+estimator, hyperparameters, fold, split and metric, and every fit of a candidate on the training rows of a fold
+as soon as it is done, failed fits included:
+
+    scores(league, estimator, params, fold, split, metric, score, n_train, n_test, n_resources, fit_seconds, recorded_at)
+    fits(league, estimator, params, train_hash, n_train, fit_seconds, error, recorded_at)
+
+where params is the JSON of all the parameters of the estimator, fold a hash of the training and test rows (the
+halving search scores the candidates on growing subsamples, each one with its own folds), split 'test' for the
+score on the test rows of the fold or 'train' for the score on its training rows, n_resources the number of rows
+of the subsample of the halving iteration (training and test rows of the fold, recorded for the test scores),
+train_hash a hash of the training rows and error the error of a failed fit.
+
+The search runs on a StoredEstimator wrapping the model, with the hyperparameter grid prefixed by "estimator__",
+and scores it with a StoredScorer. The wrapper only fits the model when the fit is not in the store yet, so
+that a restarted search skips the configurations already scored and continues from there with the same results
+(the folds and the subsamples of the search are seeded). A fit that failed raises its stored error again, so
+that the search handles it as in the first run (error score, or an error if all the fits failed).
+
+Usage:
+------
+Run this script from the terminal in the root folder to query the store:
+
+    python scripts/results_store.py --store_file data/cache/search_results.sqlite --league E0 --estimator SVM --top 10
+
+Parameters:
+-----------
+--store_file : str
+    The SQLite file of the store.
+--league : str
+    Optional league (e.g., E0), all the leagues by default.
+--estimator : str
+    Optional estimator (e.g., SVM), all the estimators by default.
+--top : int
+    Number of best hyperparameters reported per league, estimator and metric, on the last halving iteration.
+
+Example usage:
+--------------
+    store = ResultsStore("data/cache/search_results.sqlite")
+    estimator = StoredEstimator(SVC(), league="E0", model_name="SVM", store=store)
+    grid_search = HalvingGridSearchCV(estimator, prefix_param_grid(param_grid), scoring=StoredScorer(scorer), refit=False)
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from sklearn.base import BaseEstimator, clone
+
+# Prefix of the parameters of the wrapped estimator
+PARAM_PREFIX = "estimator__"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    league TEXT NOT NULL,
+    estimator TEXT NOT NULL,
+    params TEXT NOT NULL,
+    fold TEXT NOT NULL,
+    split TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    score REAL,
+    n_train INTEGER,
+    n_test INTEGER,
+    n_resources INTEGER,
+    fit_seconds REAL,
+    recorded_at TEXT,
+    PRIMARY KEY (league, estimator, params, fold, split, metric)
+);
+CREATE TABLE IF NOT EXISTS fits (
+    league TEXT NOT NULL,
+    estimator TEXT NOT NULL,
+    params TEXT NOT NULL,
+    train_hash TEXT NOT NULL,
+    n_train INTEGER,
+    fit_seconds REAL,
+    error TEXT,
+    recorded_at TEXT,
+    PRIMARY KEY (league, estimator, params, train_hash)
+);
+"""
+
+# Connections of the current process, by store file and process
+_connections = {}
+
+
+class ResultsStore:
+    """
+    SQLite file of the search scores. Each process opens its own connection, so that the store can be pickled to
+    the worker processes of the searches and written by several processes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            # Stores written before the halving iteration was recorded
+            if 'n_resources' not in {row[1] for row in connection.execute("PRAGMA table_info(scores)")}:
+                connection.execute("ALTER TABLE scores ADD COLUMN n_resources INTEGER")
+                connection.execute("UPDATE scores SET n_resources = n_train + n_test WHERE split = 'test'")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per process, also reused by the copies of the store made when the estimators are cloned
+        key = (self.path, os.getpid())
+        if key not in _connections:
+            _connections[key] = sqlite3.connect(self.path, timeout=60)
+            # With the write-ahead log, a crash can only lose the last scores, which are computed again
+            _connections[key].execute("PRAGMA synchronous=NORMAL")
+        return _connections[key]
+
+    def get_score(self, league: str, estimator: str, params: str, fold: str, split: str, metric: str) -> float:
+        """
+        Return the stored score of a fold, or None if it was not scored yet.
+        """
+        with self._connect() as connection:
+            row = connection.execute("SELECT score FROM scores WHERE league = ? AND estimator = ? AND params = ? AND fold = ? AND split = ? AND metric = ?",
+                                     (league, estimator, params, fold, split, metric)).fetchone()
+        if row is None:
+            return None
+        return np.nan if row[0] is None else row[0]
+
+    def record_score(self, league: str, estimator: str, params: str, fold: str, split: str, metric: str, score: float,
+                     n_train: int, n_test: int, n_resources: int, fit_seconds: float):
+        """
+        Write the score of a fold.
+        """
+        with self._connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO scores (league, estimator, params, fold, split, metric, score, n_train, n_test, "
+                               "n_resources, fit_seconds, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                               (league, estimator, params, fold, split, metric, None if np.isnan(score) else float(score),
+                                n_train, n_test, n_resources, fit_seconds, datetime.now().isoformat(timespec='seconds')))
+
+    def get_fit(self, league: str, estimator: str, params: str, train_hash: str) -> dict:
+        """
+        Return the stored fit of the training rows of a fold, with its duration and its error (None if it succeeded),
+        or None if it was not fitted yet.
+        """
+        with self._connect() as connection:
+            row = connection.execute("SELECT fit_seconds, error FROM fits WHERE league = ? AND estimator = ? AND params = ? AND train_hash = ?",
+                                     (league, estimator, params, train_hash)).fetchone()
+        return None if row is None else {'fit_seconds': row[0], 'error': row[1]}
+
+    def record_fit(self, league: str, estimator: str, params: str, train_hash: str, n_train: int, fit_seconds: float, error: str = None):
+        """
+        Write the fit of the training rows of a fold, with the error of the fit if it failed.
+        """
+        with self._connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO fits VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               (league, estimator, params, train_hash, n_train, fit_seconds, error,
+                                datetime.now().isoformat(timespec='seconds')))
+
+    def scores(self, league: str = None, estimator: str = None) -> pd.DataFrame:
+        """
+        Return the stored scores, optionally of a league and of an estimator.
+
+        Parameters:
+        league (str): The league (e.g., "E0"), None for all the leagues.
+        estimator (str): The estimator (e.g., "SVM"), None for all the estimators.
+
+        Returns:
+        pd.DataFrame: One row per fold score.
+        """
+        conditions, values = [], []
+        for column, value in (('league', league), ('estimator', estimator)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                values.append(value)
+        query = "SELECT * FROM scores" + (f" WHERE {' AND '.join(conditions)}" if conditions else "")
+        with self._connect() as connection:
+            return pd.read_sql_query(query, connection, params=values)
+
+    def summary(self, league: str = None, estimator: str = None, top: int = 5) -> pd.DataFrame:
+        """
+        Rank the hyperparameters of each league, estimator and metric by their mean test score over the folds,
+        on the last iteration of the halving search (the largest subsample).
+
+        Parameters:
+        league (str): The league (e.g., "E0"), None for all the leagues.
+        estimator (str): The estimator (e.g., "SVM"), None for all the estimators.
+        top (int): Number of hyperparameters reported per league, estimator and metric.
+
+        Returns:
+        pd.DataFrame: The mean and standard deviation of the score, the number of folds and the rows of the iteration.
+        """
+        scores = self.scores(league, estimator)
+        scores = scores[scores['split'] == 'test'].astype({'n_resources': 'int64'})
+        if scores.empty:
+            return scores
+        keys = ['league', 'estimator', 'metric']
+        # The training rows of the folds of an iteration can differ by one, their subsample has the same size
+        scores = scores[scores['n_resources'] == scores.groupby(keys)['n_resources'].transform('max')]
+        summary = (scores.groupby(keys + ['params', 'n_resources'])['score']
+                   .agg(mean_score='mean', std_score='std', folds='count')
+                   .reset_index()
+                   .sort_values(keys + ['mean_score'], ascending=[True, True, True, False]))
+        return summary.groupby(keys).head(top).reset_index(drop=True)
+
+
+def prefix_param_grid(param_grid: dict) -> dict:
+    """Prefix the hyperparameters of a grid for the search of a StoredEstimator."""
+    return {PARAM_PREFIX + name: values for name, values in param_grid.items()}
+
+
+def unprefix_params(params: dict) -> dict:
+    """Remove the prefix of the best hyperparameters of the search of a StoredEstimator."""
+    return {name[len(PARAM_PREFIX):] if name.startswith(PARAM_PREFIX) else name: value for name, value in params.items()}
+
+
+def data_hash(*arrays) -> str:
+    """Hash the values of arrays, to identify the training and test rows of a fold."""
+    digest = hashlib.sha256()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(str((array.shape, array.dtype)).encode('utf-8'))
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+class StoredEstimator(BaseEstimator):
+    """
+    Wrapper of an estimator, fitted only when its fit is not in the results store.
+    """
+
+    def __init__(self, estimator=None, league: str = None, model_name: str = None, store: ResultsStore = None):
+        self.estimator = estimator
+        self.league = league
+        self.model_name = model_name
+        self.store = store
+
+    @property
+    def _estimator_type(self):
+        # The search treats the wrapper as the estimator (e.g., the minimum resources of a classifier)
+        return getattr(self.estimator, '_estimator_type', None)
+
+    def params_key(self) -> str:
+        """Return the JSON of the parameters of the wrapped estimator, its key in the store."""
+        return json.dumps(self.estimator.get_params(deep=False), sort_keys=True, default=str)
+
+    def fit(self, X, y):
+        self.X_train_, self.y_train_ = X, y
+        self.train_hash_ = data_hash(X, y)
+        self.estimator_ = None
+        stored_fit = self.store.get_fit(self.league, self.model_name, self.params_key(), self.train_hash_)
+        if stored_fit is None:
+            self.fitted_estimator()
+        elif stored_fit['error'] is not None:
+            # Fail as the first fit did, without fitting again
+            raise RuntimeError(f"Fit failed in a previous run: {stored_fit['error']}")
+        else:
+            # The scores are in the store, the estimator is only fitted again if one of them is missing
+            self.fit_seconds_ = stored_fit['fit_seconds']
+        return self
+
+    def fitted_estimator(self):
+        """Return the wrapped estimator fitted on the training rows, recording the fit (or its failure) in the store."""
+        if self.estimator_ is None:
+            params = self.params_key()
+            start = time.perf_counter()
+            try:
+                self.estimator_ = clone(self.estimator).fit(self.X_train_, self.y_train_)
+            except Exception as error:
+                self.store.record_fit(self.league, self.model_name, params, self.train_hash_, len(self.y_train_),
+                                      round(time.perf_counter() - start, 4), f"{type(error).__name__}: {error}")
+                raise
+            self.fit_seconds_ = round(time.perf_counter() - start, 4)
+            self.store.record_fit(self.league, self.model_name, params, self.train_hash_, len(self.y_train_), self.fit_seconds_)
+        return self.estimator_
+
+    def stored_score(self, scorer, X, y) -> float:
+        """
+        Return the score of the wrapped estimator on the test rows from the store, or compute and store it.
+
+        Parameters:
+        scorer (callable): The scorer.
+        X (np.ndarray): The test features.
+        y (np.ndarray): The test target.
+
+        Returns:
+        float: The score.
+        """
+        params = self.params_key()
+        # The search also scores the training rows (return_train_score)
+        test_hash = self.train_hash_ if X is self.X_train_ else data_hash(X, y)
+        split = 'train' if test_hash == self.train_hash_ else 'test'
+        fold = hashlib.sha256((self.train_hash_ + test_hash).encode('utf-8')).hexdigest() if split == 'test' else self.train_hash_
+        metric = scorer._score_func.__name__
+        score = self.store.get_score(self.league, self.model_name, params, fold, split, metric)
+        if score is None:
+            score = scorer(self.fitted_estimator(), X, y)
+            # The subsample of the halving iteration is made of the training and test rows of the fold
+            n_resources = len(self.y_train_) + len(y) if split == 'test' else None
+            self.store.record_score(self.league, self.model_name, params, fold, split, metric, score,
+                                    len(self.y_train_), len(y), n_resources, self.fit_seconds_)
+        return score
+
+
+class StoredScorer:
+    """
+    Scorer of a StoredEstimator, reading the scores from the results store when they are already known.
+    """
+
+    def __init__(self, scorer):
+        self.scorer = scorer
+
+    def __call__(self, estimator: StoredEstimator, X, y) -> float:
+        return estimator.stored_score(self.scorer, X, y)
+
+
+def parse_arguments():
+    """
+    Parse command-line arguments.
+
+    Returns:
+    argparse.Namespace: Parsed command-line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Query the results store of the hyperparameter searches.")
+    parser.add_argument("--store_file", type=str, default="data/cache/search_results.sqlite", help="The SQLite file of the store.")
+    parser.add_argument("--league", type=str, default=None, help="League to report (e.g., E0), all the leagues by default.")
+    parser.add_argument("--estimator", type=str, default=None, help="Estimator to report (e.g., SVM), all the estimators by default.")
+    parser.add_argument("--top", type=int, default=5, help="Number of best hyperparameters per league, estimator and metric.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    if not os.path.exists(args.store_file):
+        raise SystemExit(f"No results store at {args.store_file}")
+
+    summary = ResultsStore(args.store_file).summary(args.league, args.estimator, args.top)
+    if summary.empty:
+        print("No scores stored for these filters.")
+    else:
+        with pd.option_context('display.max_colwidth', None, 'display.width', 250):
+            print(summary.to_string(index=False))
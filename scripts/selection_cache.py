@@ -0,0 +1,116 @@
+"""
+Cache of the feature selection results of the preprocessing.
+
+The mRMR ranking only depends on the feature matrix, the target, the number of features to select and
+the selection engine, and the clustered selection also on the clustering threshold. The results are
+therefore stored under a fingerprint of these inputs and reused as long as they do not change:
+
+    {cache_dir}/{fingerprint}.json
+    {
+        "num_features": 20,
+        "mrmr_ranking": ["B365>2.5", ...],
+        "clustered_features": {"0.5": ["B365>2.5", ...]}
+    }
+
+The last selection of each league is also saved ({cache_dir}/{league}_selected_features.json), so that
+it can be applied to new data without selecting the features again, keeping the feature sets of the
+models stable between runs.
+
+Example usage:
+--------------
+    fingerprint = selection_fingerprint(X, y, num_features=20)
+    entry = load_cached_selection("data/cache/feature_selection", fingerprint)
+"""
+
+import os
+import json
+import hashlib
+import pandas as pd
+from storage import write_json
+
+
+def selection_fingerprint(X: pd.DataFrame, y: pd.Series, num_features: int, engine: str = "mrmr") -> str:
+    """
+    Compute the fingerprint of the inputs of the mRMR selection.
+
+    Parameters:
+    X (pd.DataFrame): The feature matrix.
+    y (pd.Series): The target variable.
+    num_features (int): The number of features to select.
+    engine (str): The selection engine, "mrmr" or "native".
+
+    Returns:
+    str: The hex digest of the fingerprint.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([list(X.columns), [str(dtype) for dtype in X.dtypes], num_features, engine]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+    digest.update(pd.util.hash_pandas_object(y, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def load_cached_selection(cache_dir: str, fingerprint: str) -> dict:
+    """
+    Load the cached selection results of a fingerprint.
+
+    Parameters:
+    cache_dir (str): The cache directory.
+    fingerprint (str): The fingerprint of the selection inputs.
+
+    Returns:
+    dict: The cached entry, or None if there is none.
+    """
+    path = os.path.join(cache_dir, f"{fingerprint}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_cached_selection(cache_dir: str, fingerprint: str, num_features: int, mrmr_ranking: list, clustering_threshold: float, clustered_features: list):
+    """
+    Save the selection results of a fingerprint, keeping the clustered features of the other thresholds.
+
+    Parameters:
+    cache_dir (str): The cache directory.
+    fingerprint (str): The fingerprint of the selection inputs.
+    num_features (int): The number of features selected by mRMR.
+    mrmr_ranking (list of str): The features selected by mRMR, in ranking order.
+    clustering_threshold (float): The clustering threshold.
+    clustered_features (list of str): The features selected after clustering.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    entry = load_cached_selection(cache_dir, fingerprint) or {'num_features': num_features, 'mrmr_ranking': mrmr_ranking, 'clustered_features': {}}
+    entry['clustered_features'][str(clustering_threshold)] = clustered_features
+    write_json(entry, os.path.join(cache_dir, f"{fingerprint}.json"))
+
+
+def save_selected_features(cache_dir: str, league: str, selected_features: list):
+    """
+    Save the last feature selection of a league.
+
+    Parameters:
+    cache_dir (str): The cache directory.
+    league (str): The league code (e.g., "E0").
+    selected_features (list of str): The selected features.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    write_json({'league': league, 'selected_features': selected_features}, os.path.join(cache_dir, f"{league}_selected_features.json"))
+
+
+def load_selected_features(cache_dir: str, league: str) -> list:
+    """
+    Load the last feature selection of a league.
+
+    Parameters:
+    cache_dir (str): The cache directory.
+    league (str): The league code (e.g., "E0").
+
+    Returns:
+    list of str: The selected features.
+    """
+    path = os.path.join(cache_dir, f"{league}_selected_features.json")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No stored feature selection for {league} ({path}), run the preprocessing without reusing the selected features first")
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)['selected_features']
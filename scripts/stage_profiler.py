@@ -0,0 +1,207 @@
+"""
+Instrumentation of the preprocessing stages.
+
+Each stage call run through StageProfiler.run is measured:
+
+- the wall-clock time and the CPU time of the process;
+- the peak resident memory (RSS) of the process at the end of the stage, and its increase during the stage;
+- the number of rows and columns of the DataFrame going in and of the result coming out.
+
+The records of a run are saved as a JSON or CSV report, to track the regressions as the data grows. With
+profile=True every stage is also run under cProfile, and the profile of the hottest stage (largest total
+wall-clock time) can be dumped for pstats or snakeviz.
+
+Example usage:
+--------------
+    profiler = StageProfiler(profile=True)
+    df = profiler.run("E0", "feature_engineering", feature_engineering, df)
+    profiler.save_report("preprocessing_profile.json")
+    profiler.dump_hottest_profile("preprocessing_profile.prof")
+
+The peak resident memory is read with the resource module, which is not available on Windows (the peak is then missing).
+"""
+
+import os
+import json
+import time
+import cProfile
+import pandas as pd
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Columns of the report
+REPORT_COLUMNS = ['league', 'stage', 'wall_seconds', 'cpu_seconds', 'peak_rss_mb', 'rss_increase_mb',
+                  'rows_in', 'columns_in', 'rows_out', 'columns_out']
+
+# Extensions of the report files
+REPORT_EXTENSIONS = ('.json', '.csv')
+
+
+def invalid_report_file_message(path: str) -> str:
+    """
+    Return the error message of a report file without a report extension, or None if its extension is valid.
+
+    Parameters:
+    path (str): The report file.
+
+    Returns:
+    str: The error message, None if the report can be saved to the file.
+    """
+    if path.endswith(REPORT_EXTENSIONS):
+        return None
+    return f"Invalid report file: {path}. The report is saved as {' or '.join(REPORT_EXTENSIONS)}"
+
+
+def peak_rss_mb() -> float:
+    """
+    Return the peak resident memory of the process so far, in megabytes.
+
+    Returns:
+    float: The peak resident memory, or None if it cannot be measured on this platform.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def data_shape(data) -> tuple:
+    """
+    Return the number of rows and columns of the data going in or out of a stage.
+
+    Parameters:
+    data: A DataFrame, a dict of DataFrames (e.g., keyed by league), a list of (filename, DataFrame) tuples
+          as returned by load_csv_files, or a list of column names as returned by feature_selection.
+
+    Returns:
+    tuple: The number of rows and the number of columns, None when not applicable.
+    """
+    if isinstance(data, pd.DataFrame):
+        return len(data), data.shape[1]
+    if isinstance(data, dict) and all(isinstance(value, pd.DataFrame) for value in data.values()):
+        data = list(data.items())
+    if isinstance(data, list) and all(isinstance(item, tuple) and isinstance(item[-1], pd.DataFrame) for item in data):
+        return sum(len(item[-1]) for item in data), max((item[-1].shape[1] for item in data), default=0)
+    if isinstance(data, list):
+        return None, len(data)
+    return None, None
+
+
+class StageProfiler:
+    """
+    Collects the measures of the preprocessing stages of a run.
+    """
+
+    def __init__(self, profile: bool = False):
+        self.profile = profile
+        self.records = []
+        self.profiles = {}
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+
+    def run(self, league: str, stage: str, function, *args, **kwargs):
+        """
+        Run a stage and record its measures.
+
+        Parameters:
+        league (str): The league of the stage (e.g., "E0"), or "all" for the stages covering all the leagues.
+        stage (str): The stage name (e.g., "feature_engineering").
+        function (callable): The stage function. Its first DataFrame (or dict of DataFrames) argument is taken as the input of the stage.
+        args, kwargs: The arguments of the function.
+
+        Returns:
+        The result of the function.
+        """
+        data_in = next((arg for arg in args if isinstance(arg, (pd.DataFrame, dict))), None)
+        rows_in, columns_in = data_shape(data_in)
+
+        rss_before = peak_rss_mb()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        if self.profile:
+            result = self.profiles.setdefault(stage, cProfile.Profile()).runcall(function, *args, **kwargs)
+        else:
+            result = function(*args, **kwargs)
+        wall_seconds, cpu_seconds = time.perf_counter() - wall_start, time.process_time() - cpu_start
+        rss_after = peak_rss_mb()
+
+        rows_out, columns_out = data_shape(result)
+        self.records.append({
+            'league': league,
+            'stage': stage,
+            'wall_seconds': round(wall_seconds, 4),
+            'cpu_seconds': round(cpu_seconds, 4),
+            'peak_rss_mb': None if rss_after is None else round(rss_after, 1),
+            'rss_increase_mb': None if rss_after is None else round(rss_after - rss_before, 1),
+            'rows_in': rows_in,
+            'columns_in': columns_in,
+            'rows_out': rows_out,
+            'columns_out': columns_out,
+        })
+        return result
+
+    def report(self) -> pd.DataFrame:
+        """
+        Return the measures of the stages, one row per stage call.
+
+        Returns:
+        pd.DataFrame: The report, with the REPORT_COLUMNS columns.
+        """
+        report = pd.DataFrame(self.records, columns=REPORT_COLUMNS)
+        # Counts not applicable to a stage are missing, the others stay integers
+        return report.astype({column: 'Int64' for column in ['rows_in', 'columns_in', 'rows_out', 'columns_out']})
+
+    def hottest_stage(self) -> str:
+        """
+        Return the stage with the largest total wall-clock time, or None if no stage was run.
+        """
+        if not self.records:
+            return None
+        return self.report().groupby('stage')['wall_seconds'].sum().idxmax()
+
+    def save_report(self, path: str) -> str:
+        """
+        Save the report as JSON or CSV, depending on the file extension.
+
+        Parameters:
+        path (str): The report file (.json or .csv).
+
+        Returns:
+        str: The path of the saved report.
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        report = self.report()
+        if path.endswith('.csv'):
+            report.to_csv(path, index=False)
+        elif path.endswith('.json'):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'started_at': self.started_at,
+                    'total_stage_wall_seconds': round(float(report['wall_seconds'].sum()), 4),
+                    'hottest_stage': self.hottest_stage(),
+                    'stages': json.loads(report.to_json(orient='records')),
+                }, f, indent=4)
+        else:
+            raise ValueError(invalid_report_file_message(path))
+        return path
+
+    def dump_hottest_profile(self, path: str) -> str:
+        """
+        Dump the cProfile statistics of the hottest stage, collected when profile is enabled.
+
+        Parameters:
+        path (str): The output file, readable with pstats.
+
+        Returns:
+        str: The hottest stage, or None if nothing was profiled.
+        """
+        stage = self.hottest_stage()
+        if stage is None or stage not in self.profiles:
+            return None
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.profiles[stage].dump_stats(path)
+        return stage
@@ -0,0 +1,215 @@
+"""
+Storage helpers shared by the scripts to read and write the raw and processed datasets.
+
+The datasets can be stored as CSV (the default, human readable) or in a columnar format,
+Parquet or Feather, which keeps the dtypes and avoids re-parsing text at every stage.
+The columnar formats are written with an explicit schema:
+
+- the Date column as datetime;
+- the team columns as categories;
+- the betting odds columns as float32.
+
+Example usage:
+--------------
+    from storage import read_table, write_table, list_tables
+
+    write_table(df, "data/raw/E0_merged", storage_format="parquet")  # -> data/raw/E0_merged.parquet
+    for filename in list_tables("data/raw", storage_format="parquet"):
+        df = read_table(os.path.join("data/raw", filename))
+
+The Parquet and Feather formats require the pyarrow package.
+
+compact_dtypes applies a smaller in-memory layout, used by the preprocessing in compact mode:
+the team, referee, division, result and season columns as categories, the odds as float32 and
+the match statistics counts as the smallest integer type. The columnar formats keep it on disk.
+
+write_json writes the JSON caches of the scripts through a temporary file, so that they are never left partial.
+"""
+
+import os
+import re
+import json
+import pandas as pd
+
+# Supported storage formats and their file extensions
+STORAGE_FORMATS = {
+    "csv": ".csv",
+    "parquet": ".parquet",
+    "feather": ".feather",
+}
+
+# Columns stored as datetime
+DATE_COLUMNS = ["Date"]
+
+# Columns stored as categories
+CATEGORICAL_COLUMNS = ["HomeTeam", "AwayTeam"]
+
+# Columns stored as categories in the compact layout
+COMPACT_CATEGORICAL_COLUMNS = ["Div", "HomeTeam", "AwayTeam", "Referee", "FTR", "HTR", "Season"]
+
+# Match statistics counts (see data/raw/Note_raw.txt) and target, downcast in the compact layout
+COUNT_COLUMNS = ["FTHG", "FTAG", "HTHG", "HTAG", "HS", "AS", "HST", "AST", "HHW", "AHW", "HC", "AC", "HF", "AF",
+                 "HFKC", "AFKC", "HO", "AO", "HY", "AY", "HR", "AR", "HBP", "ABP", "Over2.5"]
+
+# Betting odds columns (see data/raw/Note_raw.txt), stored as float32:
+# 1X2, total goals and Asian handicap odds, pre-closing and closing (C suffix), plus the handicap sizes
+ODDS_COLUMNS_PATTERN = re.compile(
+    r"^(?:(?:B365|BFE|BF|BS|BW|GB|IW|LB|PS|P|SO|SB|SJ|SY|VC|WH|BbMx|BbAv|Max|Avg)C?(?:H|D|A|>2\.5|<2\.5|AHH|AHA)"
+    r"|(?:Bb)?AHC?h|(?:GB|LB|B365)AH)$"
+)
+
+
+def write_json(data: dict, path: str):
+    """Write a JSON file through a temporary file, so that concurrent readers never see a partial file."""
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4)
+    os.replace(path + '.tmp', path)
+
+
+def get_extension(storage_format: str) -> str:
+    """
+    Return the file extension of a storage format.
+
+    Parameters:
+    storage_format (str): One of the keys of STORAGE_FORMATS.
+
+    Returns:
+    str: The file extension, including the leading dot.
+    """
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError(f"Invalid storage format: {storage_format}. Allowed values are {', '.join(STORAGE_FORMATS)}")
+    return STORAGE_FORMATS[storage_format]
+
+
+def is_odds_column(column: str) -> bool:
+    """
+    Check whether a column contains betting odds.
+
+    Parameters:
+    column (str): The column name.
+
+    Returns:
+    bool: True if the column matches ODDS_COLUMNS_PATTERN.
+    """
+    return ODDS_COLUMNS_PATTERN.match(column) is not None
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Apply the explicit storage schema: dates as datetime, teams as categories, odds as float32.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame to convert.
+
+    Returns:
+    pd.DataFrame: The converted DataFrame.
+    """
+    df = df.copy()
+    for column in DATE_COLUMNS:
+        if column in df.columns and not pd.api.types.is_datetime64_any_dtype(df[column]):
+            # Raw files use the football-data.co.uk format, processed files the ISO one
+            dates = pd.to_datetime(df[column], format='%d/%m/%Y', errors='coerce')
+            df[column] = dates.fillna(pd.to_datetime(df[column], format='%Y-%m-%d', errors='coerce'))
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    for column in df.columns:
+        if is_odds_column(column) and pd.api.types.is_numeric_dtype(df[column]):
+            df[column] = df[column].astype('float32')
+    return df
+
+
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Apply the compact memory layout: categorical text columns, float32 odds and downcast counts.
+    The columns are converted in place, without copying the DataFrame.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame to convert.
+
+    Returns:
+    pd.DataFrame: The converted DataFrame.
+    """
+    for column in COMPACT_CATEGORICAL_COLUMNS:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    for column in df.columns:
+        if not pd.api.types.is_numeric_dtype(df[column]):
+            continue
+        if is_odds_column(column):
+            df[column] = df[column].astype('float32')
+        elif column in COUNT_COLUMNS:
+            # Counts with missing values cannot be stored as integers
+            if df[column].isna().any():
+                df[column] = df[column].astype('float32')
+            else:
+                df[column] = pd.to_numeric(df[column], downcast='integer')
+    return df
+
+
+def memory_usage(df: pd.DataFrame) -> int:
+    """
+    Return the memory used by a DataFrame, including the content of the object columns.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame.
+
+    Returns:
+    int: The memory usage in bytes.
+    """
+    return int(df.memory_usage(deep=True).sum())
+
+
+def list_tables(directory: str, storage_format: str = "csv") -> list:
+    """
+    List the files of the given storage format in a directory.
+
+    Parameters:
+    directory (str): The directory to scan.
+    storage_format (str): The storage format of the files to list.
+
+    Returns:
+    list of str: The file names (not the full paths), in directory order.
+    """
+    extension = get_extension(storage_format)
+    return [filename for filename in os.listdir(directory) if filename.endswith(extension)]
+
+
+def read_table(path: str, columns: list = None) -> pd.DataFrame:
+    """
+    Read a table, the storage format is inferred from the file extension.
+
+    Parameters:
+    path (str): Path to the file.
+    columns (list of str): Columns to read, all of them if None.
+
+    Returns:
+    pd.DataFrame: The loaded table.
+    """
+    if path.endswith(STORAGE_FORMATS["parquet"]):
+        return pd.read_parquet(path, columns=columns)
+    if path.endswith(STORAGE_FORMATS["feather"]):
+        return pd.read_feather(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
+
+
+def write_table(df: pd.DataFrame, path_without_extension: str, storage_format: str = "csv") -> str:
+    """
+    Write a table in the given storage format. Columnar formats are written with the explicit schema.
+
+    Parameters:
+    df (pd.DataFrame): The table to write.
+    path_without_extension (str): Destination path, the extension of the storage format is appended.
+    storage_format (str): One of the keys of STORAGE_FORMATS.
+
+    Returns:
+    str: The path of the written file.
+    """
+    path = path_without_extension + get_extension(storage_format)
+    if storage_format == "csv":
+        df.to_csv(path, index=False)
+    elif storage_format == "parquet":
+        apply_schema(df).to_parquet(path, index=False)
+    else:
+        apply_schema(df).reset_index(drop=True).to_feather(path)
+    return path
@@ -8,37 +8,148 @@ The tasks are:
 - acquire_next_matches: acquire the next football matches data.
 - make_predictions: make predictions and generate a Telegram-ready message.
 - full_pipeline: run the full pipeline: acquisition, preprocessing, training, predictions
+- full_predictions_pipeline_in_process: run the full pipeline in a single process (see pipeline_runner.py)
 
 Invoke the full pipeline from the root directory with:
 
     python -m invoke --search-root scripts full-predictions-pipeline
+
+Preprocessing, training (per league) and predictions are skipped when their inputs, parameters and
+scripts did not change since their last successful run, according to the content hashes recorded in
+the manifest (.pipeline_manifest.json). Pass --force to a task to run it anyway.
 """
-from invoke import task
+import os
+import time
+from datetime import date
+from invoke import Exit, task
+from pipeline_manifest import PipelineManifest, fingerprint, list_files
+from storage import get_extension
+from feature_store import feature_table_path
+
+MANIFEST_PATH = ".pipeline_manifest.json"
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def script_paths(*names):
+    """Paths to the given scripts, which are inputs of the steps running them."""
+    return [os.path.join(SCRIPTS_DIR, name) for name in names]
 
 @task
-def data_acquisition(c, leagues="E0 I1 SP1 F1 D1", seasons="2425 2324 2223", raw_data_output_dir="data/raw"):
+def data_acquisition(c, leagues="E0 I1 SP1 F1 D1", seasons="2425 2324 2223", raw_data_output_dir="data/raw", max_workers=8, cache_dir="data/cache/http", incremental=False, storage_format="csv"):
     """Task to download and merge football match data."""
-    c.run(f"python scripts/data_acquisition.py --leagues {leagues} --seasons {seasons} --raw_data_output_dir {raw_data_output_dir}")
+    incremental_flag = " --incremental" if incremental else ""
+    c.run(f"python scripts/data_acquisition.py --leagues {leagues} --seasons {seasons} --raw_data_output_dir {raw_data_output_dir} --max_workers {max_workers} --cache_dir {cache_dir} --storage_format {storage_format}{incremental_flag}")
 
 @task
-def data_preprocessing(c, raw_data_input_dir="data/raw", processed_data_output_dir="data/processed", num_features=20, clustering_threshold=0.5):
-    """Task to preprocess the raw data."""
-    c.run(f"python scripts/data_preprocessing.py --raw_data_input_dir {raw_data_input_dir} --processed_data_output_dir {processed_data_output_dir} --num_features {num_features} --clustering_threshold {clustering_threshold}")
+def data_preprocessing(c, raw_data_input_dir="data/raw", processed_data_output_dir="data/processed", num_features=20, clustering_threshold=0.5, storage_format="csv", team_state_dir="", jobs=1, compact=False, selection_cache_dir="data/cache/feature_selection", reuse_selected_features=False, selection_engine="mrmr", feature_store_dir="data/feature_store", combined_features=False, profile_report_file="", windows="5", force=False):
+    """Task to preprocess the raw data, skipped if the raw data and the parameters did not change."""
+    extension = get_extension(storage_format)
+    raw_files = list_files(raw_data_input_dir, extension)
+    inputs = raw_files + script_paths("data_preprocessing.py", "storage.py", "team_registry.py", "team_state.py", "selection_cache.py", "mrmr_native.py",
+                                      "feature_store.py", "stage_profiler.py")
+    if reuse_selected_features:
+        # The stored selection of each league is an input of the step
+        inputs += [os.path.join(selection_cache_dir, f"{os.path.basename(path).split('_')[0]}_selected_features.json") for path in raw_files]
+    params = {'num_features': num_features, 'clustering_threshold': clustering_threshold, 'storage_format': storage_format, 'compact': compact,
+              'reuse_selected_features': reuse_selected_features, 'selection_engine': selection_engine, 'windows': windows}
+    outputs = [os.path.join(processed_data_output_dir, f"{os.path.splitext(os.path.basename(path))[0]}_preprocessed{extension}") for path in raw_files]
+    outputs.append(os.path.join(processed_data_output_dir, "team_registry.json"))
+    if feature_store_dir:
+        outputs += [feature_table_path(feature_store_dir, os.path.basename(path).split('_')[0], storage_format) for path in raw_files]
+
+    manifest = PipelineManifest(MANIFEST_PATH)
+    step_fingerprint = fingerprint(inputs, params)
+    if not force and manifest.is_up_to_date("data_preprocessing", step_fingerprint, outputs):
+        print("Preprocessing is up to date, skipping.")
+        return
+
+    options = f" --team_state_dir {team_state_dir}" if team_state_dir else ""
+    options += " --compact" if compact else ""
+    options += " --reuse_selected_features" if reuse_selected_features else ""
+    options += " --combined_features" if combined_features else ""
+    options += f" --profile_report_file {profile_report_file}" if profile_report_file else ""
+    c.run(f"python scripts/data_preprocessing.py --raw_data_input_dir {raw_data_input_dir} --processed_data_output_dir {processed_data_output_dir} --num_features {num_features} --clustering_threshold {clustering_threshold} --storage_format {storage_format} --jobs {jobs} --selection_cache_dir '{selection_cache_dir}' --selection_engine {selection_engine} --feature_store_dir '{feature_store_dir}' --windows {windows}{options}")
+    manifest.record("data_preprocessing", step_fingerprint, outputs)
+    manifest.save()
 
 @task
-def train_models(c, processed_data_input_dir="data/processed", trained_models_output_dir="models", metric_choice="accuracy", n_splits=10, voting="soft"):
-    """Task to train machine learning models."""
-    c.run(f"python scripts/train_models.py --processed_data_input_dir {processed_data_input_dir} --trained_models_output_dir {trained_models_output_dir} --metric_choice {metric_choice} --n_splits {n_splits} --voting {voting}")
+def train_models(c, processed_data_input_dir="data/processed", trained_models_output_dir="models", metric_choice="accuracy", n_splits=10, voting="soft", storage_format="csv", feature_store_dir="data/feature_store",
+                 n_jobs=None, parallel_estimators=False, league_jobs=1, retrain_mode="full", max_drift=0.05, params_cache_dir="data/cache/best_params",
+                 results_store_file="data/cache/search_results.sqlite", force=False):
+    """
+    Task to train machine learning models, only for the leagues whose processed data or parameters changed.
+
+    The leagues whose training fails are not recorded, so that they are trained again by the next run,
+    while the models saved for the other leagues are.
+    """
+    params = {'metric_choice': metric_choice, 'n_splits': n_splits, 'voting': voting}
+    manifest = PipelineManifest(MANIFEST_PATH)
+
+    # One step per league: the model of a league is reused if its processed data did not change
+    league_steps = {}
+    for path in list_files(processed_data_input_dir, get_extension(storage_format)):
+        league = os.path.basename(path).split('_')[0]
+        inputs = [path] + script_paths("train_models.py", "storage.py", "feature_store.py", "oof_predictions.py", "params_cache.py", "results_store.py")
+        if feature_store_dir and os.path.exists(feature_table_path(feature_store_dir, league, storage_format)):
+            inputs.append(feature_table_path(feature_store_dir, league, storage_format))
+        outputs = [os.path.join(trained_models_output_dir, f"{league}_voting_classifier.pkl")]
+        step_fingerprint = fingerprint(inputs, params)
+        if force or not manifest.is_up_to_date(f"train_models:{league}", step_fingerprint, outputs):
+            league_steps[league] = (step_fingerprint, outputs)
+        else:
+            print(f"Model of {league} is up to date, skipping.")
+
+    if not league_steps:
+        return
+
+    # The number of cores and the retrain mode do not change which leagues need a new model, so they are not part of the fingerprints
+    options = " --parallel_estimators" if parallel_estimators else ""
+    options += f" --n_jobs {n_jobs}" if n_jobs else ""
+    started_at = int(time.time())  # Whole seconds, in case the file system has a coarse timestamp resolution
+    result = c.run(f"python scripts/train_models.py --processed_data_input_dir {processed_data_input_dir} --trained_models_output_dir {trained_models_output_dir} --metric_choice {metric_choice} --n_splits {n_splits} --voting {voting} --storage_format {storage_format} --feature_store_dir '{feature_store_dir}' --leagues {' '.join(league_steps)} --league_jobs {league_jobs} --retrain_mode {retrain_mode} --max_drift {max_drift} --params_cache_dir '{params_cache_dir}' --results_store_file '{results_store_file}'{options}", warn=True)
+
+    # A failed league stops the script with an error once the other leagues are saved, so only the models written by this run are recorded
+    failed_leagues = []
+    for league, (step_fingerprint, outputs) in league_steps.items():
+        if all(os.path.exists(path) and os.path.getmtime(path) >= started_at for path in outputs):
+            manifest.record(f"train_models:{league}", step_fingerprint, outputs)
+        else:
+            failed_leagues.append(league)
+    manifest.save()
+    if result.failed:
+        raise Exit(f"Training failed (exit code {result.exited})" + (f" for: {', '.join(failed_leagues)}" if failed_leagues else ""),
+                   code=result.exited)
+
+@task
+def search_results(c, store_file="data/cache/search_results.sqlite", league="", estimator="", top=5):
+    """Task to report the best hyperparameters of the past searches from the results store."""
+    options = (f" --league {league}" if league else "") + (f" --estimator '{estimator}'" if estimator else "")
+    c.run(f"python scripts/results_store.py --store_file {store_file} --top {top}{options}")
 
 @task
-def acquire_next_matches(c, get_teams_names_dir="data/processed", next_matches_output_file="data/next_matches.json"):
+def acquire_next_matches(c, get_teams_names_dir="data/processed", next_matches_output_file="data/next_matches.json", requests_per_minute=10, cache_dir="data/cache/api"):
     """Task to acquire the next football matches data."""
-    c.run(f"python scripts/acquire_next_matches.py --get_teams_names_dir {get_teams_names_dir} --next_matches_output_file {next_matches_output_file}")
+    c.run(f"python scripts/acquire_next_matches.py --get_teams_names_dir {get_teams_names_dir} --next_matches_output_file {next_matches_output_file} --requests_per_minute {requests_per_minute} --cache_dir {cache_dir}")
 
 @task
-def make_predictions(c, models_dir="models", data_dir="data/processed", output_file="telegram_post.txt", json_competitions="data/next_matches.json"):
-    """Task to make predictions and generate a Telegram-ready message."""
-    c.run(f"python scripts/make_predictions.py --models_dir {models_dir} --data_dir {data_dir} --output_file {output_file} --json_competitions {json_competitions}")
+def make_predictions(c, models_dir="models", data_dir="data/processed", output_file="telegram_post.txt", json_competitions="data/next_matches.json", storage_format="csv", feature_store_dir="data/feature_store", force=False):
+    """Task to make predictions and generate a Telegram-ready message, skipped if the matches, models and data did not change."""
+    inputs = [json_competitions] + list_files(models_dir, ".pkl") + list_files(data_dir, get_extension(storage_format))
+    inputs += [os.path.join(data_dir, "team_registry.json")] + script_paths("make_predictions.py", "storage.py", "team_registry.py", "feature_store.py")
+    if feature_store_dir:
+        inputs += list_files(feature_store_dir, get_extension(storage_format))
+    outputs = [output_file]
+
+    manifest = PipelineManifest(MANIFEST_PATH)
+    # The message contains the date of the predictions, so it is only reused within the same day
+    step_fingerprint = fingerprint(inputs, {'storage_format': storage_format, 'date': str(date.today())})
+    if not force and manifest.is_up_to_date("make_predictions", step_fingerprint, outputs):
+        print("Predictions are up to date, skipping.")
+        return
+
+    c.run(f"python scripts/make_predictions.py --input_leagues_models_dir {models_dir} --input_data_predict_dir {data_dir} --final_predictions_out_file {output_file} --next_matches {json_competitions} --storage_format {storage_format} --feature_store_dir '{feature_store_dir}'")
+    manifest.record("make_predictions", step_fingerprint, outputs)
+    manifest.save()
 
 @task
 def full_predictions_pipeline(c):
@@ -48,3 +159,9 @@ def full_predictions_pipeline(c):
     train_models(c)
     acquire_next_matches(c)
     make_predictions(c)
+
+@task
+def full_predictions_pipeline_in_process(c, leagues="E0 I1 SP1 F1 D1", seasons="2425 2324 2223", storage_format="csv", compare=False):
+    """Run the full pipeline in a single process, passing the data and the models in memory between the stages."""
+    compare_flag = " --compare" if compare else ""
+    c.run(f"python scripts/pipeline_runner.py --leagues {leagues} --seasons {seasons} --storage_format {storage_format}{compare_flag}")
@@ -0,0 +1,196 @@
+"""
+Persistent registry of the team names, written by the preprocessing and queried by the later stages.
+
+The teams are named differently by football-data.co.uk (the historical data used to train the models)
+and by the football-data.org API (the upcoming matches). The registry maps both namings and records
+the leagues each team has played in, so that the names can be resolved with dictionary lookups instead
+of rescanning the processed data files.
+
+The registry is stored as JSON in the processed data directory ({processed_data_output_dir}/team_registry.json):
+
+    {
+        "teams": {"Arsenal": {"leagues": ["E0"], "api_names": ["Arsenal FC"]}, ...},
+        "api_names": {"Arsenal FC": "Arsenal", ...}
+    }
+"""
+
+import os
+import json
+
+REGISTRY_FILENAME = "team_registry.json"
+
+# Mapping from the football-data.org API team names to the football-data.co.uk ones
+TEAMS_NAMES_MAPPING = {
+    'Arsenal FC': 'Arsenal',
+    'Brighton & Hove Albion FC': 'Brighton',
+    'Brentford FC': 'Brentford',
+    'Southampton FC': 'Southampton',
+    'Everton FC': 'Everton',
+    'AFC Bournemouth': 'Bournemouth',
+    'Ipswich Town FC': 'Ipswich',
+    'Fulham FC': 'Fulham',
+    'Leicester City FC': 'Leicester',
+    'Aston Villa FC': 'Aston Villa',
+    'Nottingham Forest FC': "Nott'm Forest",
+    'Wolverhampton Wanderers FC': 'Wolves',
+    'West Ham United FC': 'West Ham',
+    'Manchester City FC': 'Man City',
+    'Chelsea FC': 'Chelsea',
+    'Crystal Palace FC': 'Crystal Palace',
+    'Newcastle United FC': 'Newcastle',
+    'Tottenham Hotspur FC': 'Tottenham',
+    'Manchester United FC': 'Man United',
+    'Liverpool FC': 'Liverpool',
+    'Villarreal CF': 'Villarreal',
+    'RC Celta de Vigo': 'Celta',
+    'RCD Mallorca': 'Mallorca',
+    'Sevilla FC': 'Sevilla',
+    'Rayo Vallecano de Madrid': 'Vallecano',
+    'FC Barcelona': 'Barcelona',
+    'Real Betis Balompié': 'Betis',
+    'Getafe CF': 'Getafe',
+    'Athletic Club': 'Ath Bilbao',
+    'Valencia CF': 'Valencia',
+    'Real Valladolid CF': 'Valladolid',
+    'CD Leganés': 'Leganes',
+    'Real Sociedad de Fútbol': 'Sociedad',
+    'Deportivo Alavés': 'Alaves',
+    'Club Atlético de Madrid': 'Ath Madrid',
+    'RCD Espanyol de Barcelona': 'Espanol',
+    'Girona FC': 'Girona',
+    'CA Osasuna': 'Osasuna',
+    'UD Las Palmas': 'Las Palmas',
+    'Real Madrid CF': 'Real Madrid',
+    'Venezia FC': 'Venezia',
+    'Torino FC': 'Torino',
+    'FC Internazionale Milano': 'Inter',
+    'Atalanta BC': 'Atalanta',
+    'Bologna FC 1909': 'Bologna',
+    'Empoli FC': 'Empoli',
+    'US Lecce': 'Lecce',
+    'Cagliari Calcio': 'Cagliari',
+    'SS Lazio': 'Lazio',
+    'AC Milan': 'Milan',
+    'SSC Napoli': 'Napoli',
+    'Parma Calcio 1913': 'Parma',
+    'ACF Fiorentina': 'Fiorentina',
+    'AC Monza': 'Monza',
+    'Genoa CFC': 'Genoa',
+    'Hellas Verona FC': 'Verona',
+    'Juventus FC': 'Juventus',
+    'AS Roma': 'Roma',
+    'Udinese Calcio': 'Udinese',
+    'Como 1907': 'Como', 
+    '1. FC Union Berlin': 'Union Berlin',
+    'FC St. Pauli 1910': 'St Pauli',
+    'VfB Stuttgart': 'Stuttgart',
+    '1. FSV Mainz 05': 'Mainz',
+    'Eintracht Frankfurt': 'Ein Frankfurt',
+    'TSG 1899 Hoffenheim': 'Hoffenheim',
+    'SV Werder Bremen': 'Werder Bremen',
+    'Borussia Dortmund': 'Dortmund',
+    'VfL Bochum 1848': 'Bochum',
+    'Borussia Mönchengladbach': "M'gladbach",
+    'Holstein Kiel': 'Holstein Kiel',
+    'VfL Wolfsburg': 'Wolfsburg',
+    'Bayer 04 Leverkusen': 'Leverkusen',
+    'RB Leipzig': 'RB Leipzig',
+    '1. FC Heidenheim 1846': 'Heidenheim',
+    'FC Augsburg': 'Augsburg',
+    'FC Bayern München': 'Bayern Munich',
+    'SC Freiburg': 'Freiburg',
+    'Olympique Lyonnais': 'Lyon',
+    'RC Strasbourg Alsace': 'Strasbourg',
+    'Stade Brestois 29': 'Brest',
+    'AS Saint-Étienne': 'St Etienne',
+    'Montpellier HSC': 'Montpellier',
+    'FC Nantes': 'Nantes',
+    'Toulouse FC': 'Toulouse',
+    'Olympique de Marseille': 'Marseille',
+    'AS Monaco FC': 'Monaco',
+    'Angers SCO': 'Angers',
+    'OGC Nice': 'Nice',
+    'Le Havre AC': 'Le Havre',
+    'AJ Auxerre': 'Auxerre',
+    'Stade de Reims': 'Reims',
+    'Stade Rennais FC 1901': 'Rennes',
+    'Lille OSC': 'Lille',
+    'Paris Saint-Germain FC': 'Paris SG',
+    'Racing Club de Lens': 'Lens',
+    'AC Ajaccio': 'Ajaccio',
+    'FC Metz': 'Metz',
+}
+
+
+def build_team_registry(league_teams: dict, name_mapping: dict = TEAMS_NAMES_MAPPING) -> dict:
+    """
+    Build the team registry from the teams of each league.
+
+    Parameters:
+    league_teams (dict): The football-data.co.uk team names of each league, keyed by league acronym.
+    name_mapping (dict): Mapping from the API team names to the football-data.co.uk ones.
+
+    Returns:
+    dict: The registry, with the "teams" and "api_names" lookups.
+    """
+    teams = {}
+    for league, team_names in sorted(league_teams.items()):
+        for team in sorted(set(team_names)):
+            teams.setdefault(team, {"leagues": [], "api_names": []})["leagues"].append(league)
+
+    for api_name, team in name_mapping.items():
+        if team in teams:
+            teams[team]["api_names"].append(api_name)
+
+    return {"teams": teams, "api_names": dict(name_mapping)}
+
+
+def registry_league_teams(registry: dict) -> dict:
+    """
+    Return the teams of each league recorded in a registry, the reverse of build_team_registry.
+
+    Parameters:
+    registry (dict): The registry built by build_team_registry.
+
+    Returns:
+    dict: The football-data.co.uk team names of each league, keyed by league acronym.
+    """
+    league_teams = {}
+    for team, info in registry["teams"].items():
+        for league in info["leagues"]:
+            league_teams.setdefault(league, set()).add(team)
+    return league_teams
+
+
+def save_team_registry(registry: dict, directory: str) -> str:
+    """
+    Save the team registry to the given directory.
+
+    Parameters:
+    registry (dict): The registry built by build_team_registry.
+    directory (str): The directory where the registry is saved.
+
+    Returns:
+    str: The path of the saved registry.
+    """
+    path = os.path.join(directory, REGISTRY_FILENAME)
+    with open(path, 'w', encoding='utf-8') as registry_file:
+        json.dump(registry, registry_file, indent=4, ensure_ascii=False)
+    return path
+
+
+def load_team_registry(directory: str) -> dict:
+    """
+    Load the team registry from the given directory.
+
+    Parameters:
+    directory (str): The directory containing the registry.
+
+    Returns:
+    dict: The registry, or None if it has not been written yet.
+    """
+    path = os.path.join(directory, REGISTRY_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as registry_file:
+        return json.load(registry_file)
@@ -0,0 +1,344 @@
+"""
+Incremental per-team state store, used to engineer the features of new matches without recomputing the whole history.
+
+For each league and season, the store keeps for every team and side (home, away) the running sums and counts
+of the goals scored, of the goals conceded and of the Over 2.5 matches, plus a ring buffer with the results of
+the last `window` matches. A new match updates the state of its home team (home side) and of its away team
+(away side) in constant time and gets its features immediately:
+
+- the season averages (AvgHomeGoalsScored, HomeOver2.5Perc, ...), from the running sums and counts;
+- the last-5 features (AvgLast5HomeGoalsScored, Last5HomeOver2.5Count, ...), from the ring buffers.
+
+These are the features of data_preprocessing.feature_engineering. A season average also changes for the previous
+matches of the same team and season, so those rows are refreshed too, through the row labels indexed by the store
+for each season, side and team. The cost of a refresh is therefore proportional to the new matches and to the
+matches of their teams, and not to the history.
+
+The stored matches are compared with the current ones at each update: the seasons whose past matches were changed
+in place (e.g. a corrected result upserted by data_acquisition.py) or removed are recomputed from scratch.
+
+The states are saved as JSON files, one per league and season ({state_dir}/{league}/{season}.json, e.g.
+data/team_state/E0/2324.json), next to the engineered features of the league ({state_dir}/{league}_features.csv).
+
+Example usage:
+--------------
+    features = update_league_features("E0", matches, "data/team_state")
+
+where matches contains the raw matches with the Date (datetime), Season and Over2.5 columns.
+"""
+
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from collections import deque
+from storage import get_extension, read_table, write_table
+
+# Number of matches of the rolling windows
+WINDOW = 5
+
+# Season averages of each side: column -> statistic of the running sums
+SEASON_AVERAGE_COLUMNS = {
+    'home': {'AvgHomeGoalsScored': 'goals_scored', 'AvgHomeGoalsConceded': 'goals_conceded', 'HomeOver2.5Perc': 'over25'},
+    'away': {'AvgAwayGoalsScored': 'goals_scored', 'AvgAwayGoalsConceded': 'goals_conceded', 'AwayOver2.5Perc': 'over25'},
+}
+
+# Rolling features of each side: column -> (position in the ring buffer results, aggregation)
+ROLLING_COLUMNS = {
+    'home': {'AvgLast5HomeGoalsScored': (0, 'mean'), 'AvgLast5HomeGoalsConceded': (1, 'mean'),
+             'Last5HomeOver2.5Count': (2, 'sum'), 'Last5HomeOver2.5Perc': (2, 'perc')},
+    'away': {'AvgLast5AwayGoalsScored': (0, 'mean'), 'AvgLast5AwayGoalsConceded': (1, 'mean'),
+             'Last5AwayOver2.5Count': (2, 'sum'), 'Last5AwayOver2.5Perc': (2, 'perc')},
+}
+
+# Engineered columns, in the order of data_preprocessing.feature_engineering
+FEATURE_COLUMNS = ['AvgHomeGoalsScored', 'AvgAwayGoalsScored', 'AvgHomeGoalsConceded', 'AvgAwayGoalsConceded',
+                   'HomeOver2.5Perc', 'AwayOver2.5Perc'] + list(ROLLING_COLUMNS['home']) + list(ROLLING_COLUMNS['away'])
+
+# Columns identifying a match
+MATCH_KEY_COLUMNS = ['Date', 'HomeTeam', 'AwayTeam']
+
+
+def season_code(season: str) -> str:
+    """
+    Convert a season in the format "YYYY/YYYY" to the football-data.co.uk code (e.g., "2023/2024" -> "2324").
+
+    Parameters:
+    season (str): The season.
+
+    Returns:
+    str: The season code.
+    """
+    return season[2:4] + season[7:9]
+
+
+def aggregate(values: list, aggregation: str) -> float:
+    """
+    Aggregate the values of a ring buffer as pandas does, the result is rounded to 2 decimals.
+
+    Parameters:
+    values (list): The values.
+    aggregation (str): 'sum', 'mean' or 'perc' (mean * 100).
+
+    Returns:
+    float: The aggregated value.
+    """
+    total = sum(values)
+    if aggregation == 'sum':
+        return float(np.round(total, 2))
+    mean = total / len(values)
+    return float(np.round(mean * 100 if aggregation == 'perc' else mean, 2))
+
+
+class TeamStateStore:
+    """
+    Running statistics of the teams of a league, per season and side, persisted as JSON files.
+    """
+
+    def __init__(self, state_dir: str, league: str, window: int = WINDOW):
+        self.league_dir = os.path.join(state_dir, league)
+        self.window = window
+        self.seasons = {}
+        self.rows = {}  # Row labels of the features of each (season, side, team), see index_rows
+        self.indexed_seasons = set()
+
+    def _season_path(self, season: str) -> str:
+        return os.path.join(self.league_dir, f"{season_code(season)}.json")
+
+    def _season_state(self, season: str) -> dict:
+        """Return the state of a season, loading it from disk the first time."""
+        if season not in self.seasons:
+            state = {'season': season, 'window': self.window, 'teams': {}}
+            if os.path.exists(self._season_path(season)):
+                with open(self._season_path(season), 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                if state['window'] != self.window:
+                    raise ValueError(f"The team state of {season} uses a window of {state['window']} matches, rebuild it to use {self.window}")
+            self.seasons[season] = state
+        return self.seasons[season]
+
+    def _side_state(self, season: str, team: str, side: str) -> dict:
+        teams = self._season_state(season)['teams']
+        if team not in teams:
+            teams[team] = {
+                team_side: {'matches': 0, 'goals_scored': 0, 'goals_conceded': 0, 'over25': 0, 'last_date': None, 'last_results': []}
+                for team_side in ('home', 'away')
+            }
+        return teams[team][side]
+
+    def index_rows(self, features: pd.DataFrame, seasons=None):
+        """
+        Index the row labels of the features of each season, side and team.
+
+        Parameters:
+        features (pd.DataFrame): The engineered features, with unique row labels.
+        seasons (collection): Seasons to index, marked as indexed. All the rows are indexed if None, e.g. new rows.
+        """
+        if seasons is not None:
+            features = features[features['Season'].isin(seasons)]
+            self.indexed_seasons.update(seasons)
+        for side, team_column in (('home', 'HomeTeam'), ('away', 'AwayTeam')):
+            groups = features.groupby(['Season', team_column], sort=False, observed=True).indices
+            for (season, team), positions in groups.items():
+                self.rows.setdefault((season, side, team), []).extend(features.index[positions])
+
+    def season_averages(self, season: str, team: str, side: str) -> dict:
+        """
+        Return the season averages of a team on one side.
+
+        Parameters:
+        season (str): The season, in the format "YYYY/YYYY".
+        team (str): The team name.
+        side (str): 'home' or 'away'.
+
+        Returns:
+        dict: The season average columns of the side and their values.
+        """
+        state = self._side_state(season, team, side)
+        averages = {}
+        for column, statistic in SEASON_AVERAGE_COLUMNS[side].items():
+            mean = state[statistic] / state['matches']
+            averages[column] = float(np.round(mean * 100 if statistic == 'over25' else mean, 2))
+        return averages
+
+    def update(self, match: dict) -> dict:
+        """
+        Add the result of a match to the states of its teams and return its features.
+
+        Parameters:
+        match (dict): The match, with the Date, Season, HomeTeam, AwayTeam, FTHG, FTAG and Over2.5 fields.
+
+        Returns:
+        dict: The values of FEATURE_COLUMNS for the match.
+        """
+        features = {}
+        date = match['Date'].strftime('%Y-%m-%d')
+        for side, team, scored, conceded in (('home', match['HomeTeam'], match['FTHG'], match['FTAG']),
+                                             ('away', match['AwayTeam'], match['FTAG'], match['FTHG'])):
+            state = self._side_state(match['Season'], team, side)
+            if state['last_date'] is not None and date <= state['last_date']:
+                raise ValueError(f"Match {match['HomeTeam']} - {match['AwayTeam']} of {date} is not after the last {side} match "
+                                 f"of {team} ({state['last_date']}), rebuild the team state")
+            state['matches'] += 1
+            state['goals_scored'] += int(scored)
+            state['goals_conceded'] += int(conceded)
+            state['over25'] += int(match['Over2.5'])
+            state['last_date'] = date
+            last_results = deque(state['last_results'], maxlen=self.window)
+            last_results.append([int(scored), int(conceded), int(match['Over2.5'])])
+            state['last_results'] = list(last_results)
+
+            features.update(self.season_averages(match['Season'], team, side))
+            for column, (position, aggregation) in ROLLING_COLUMNS[side].items():
+                features[column] = aggregate([result[position] for result in last_results], aggregation)
+        return {column: features[column] for column in FEATURE_COLUMNS}
+
+    def reset_seasons(self, seasons):
+        """Empty the states of the given seasons, they are overwritten by the next save."""
+        for season in seasons:
+            self.seasons[season] = {'season': season, 'window': self.window, 'teams': {}}
+        self.rows = {key: rows for key, rows in self.rows.items() if key[0] not in seasons}
+        self.indexed_seasons.difference_update(seasons)
+
+    def reset(self):
+        """Delete all the states of the league."""
+        self.seasons = {}
+        self.rows = {}
+        self.indexed_seasons = set()
+        if os.path.isdir(self.league_dir):
+            shutil.rmtree(self.league_dir)
+
+    def save(self):
+        """Save the states of the loaded seasons."""
+        os.makedirs(self.league_dir, exist_ok=True)
+        for season, state in self.seasons.items():
+            with open(self._season_path(season) + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(state, f, indent=4, ensure_ascii=False)
+            os.replace(self._season_path(season) + '.tmp', self._season_path(season))
+
+
+def update_features(features: pd.DataFrame, new_matches: pd.DataFrame, store: TeamStateStore) -> pd.DataFrame:
+    """
+    Engineer the features of new matches from the team states and append them to the features of the previous ones.
+
+    The row labels of the previous features are kept, so that the rows indexed by the store stay valid
+    when the returned features are updated again with the same store.
+
+    Parameters:
+    features (pd.DataFrame): The engineered features of the previous matches, or None.
+    new_matches (pd.DataFrame): The new matches, with the Date (datetime), Season and Over2.5 columns.
+    store (TeamStateStore): The team states, updated in place.
+
+    Returns:
+    pd.DataFrame: The features of all the matches, sorted by AwayTeam and Date as done by feature_engineering.
+    """
+    seasons = set(new_matches['Season'])
+    if features is not None:
+        store.index_rows(features, seasons - store.indexed_seasons)
+    first_label = 0 if features is None or features.empty else features.index.max() + 1
+
+    new_matches = new_matches.sort_values(by='Date', kind='mergesort')
+    records = new_matches[['Date', 'Season', 'HomeTeam', 'AwayTeam', 'FTHG', 'FTAG', 'Over2.5']].to_dict('records')
+    new_features = pd.DataFrame([store.update(match) for match in records], columns=FEATURE_COLUMNS, index=new_matches.index)
+    new_rows = pd.concat([new_matches, new_features], axis=1)
+    new_rows.index = pd.RangeIndex(first_label, first_label + len(new_rows))
+    store.index_rows(new_rows)
+    features = new_rows if features is None else pd.concat([features, new_rows])
+
+    # The season averages of the previous matches of the updated teams changed as well, each column is written once
+    refreshed = {}
+    for side, team_column in (('home', 'HomeTeam'), ('away', 'AwayTeam')):
+        for season, team in set(zip(new_matches['Season'], new_matches[team_column])):
+            rows = store.rows[(season, side, team)]
+            for column, value in store.season_averages(season, team, side).items():
+                labels, values = refreshed.setdefault(column, ([], []))
+                labels.extend(rows)
+                values.extend([value] * len(rows))
+    for column, (labels, values) in refreshed.items():
+        column_values = features[column].to_numpy(dtype=float, copy=True)
+        column_values[features.index.get_indexer(labels)] = values
+        features[column] = column_values
+
+    return features.sort_values(by=['AwayTeam', 'Date'])
+
+
+def changed_seasons(features: pd.DataFrame, matches: pd.DataFrame) -> set:
+    """
+    Find the seasons whose stored matches were changed in place or removed since their features were engineered.
+
+    Parameters:
+    features (pd.DataFrame): The stored features, with the columns of the matches they were engineered from.
+    matches (pd.DataFrame): The current matches.
+
+    Returns:
+    set: The seasons to recompute.
+    """
+    stored = features.set_index(MATCH_KEY_COLUMNS)
+    current = matches.set_index(MATCH_KEY_COLUMNS)
+    removed = ~stored.index.isin(current.index)
+    seasons = set(stored.loc[removed, 'Season'])
+
+    # The columns added since are left aside, they are only read by a full rebuild
+    columns = [column for column in current.columns if column in stored.columns]
+    kept = stored.loc[~removed, columns]
+    current = current.loc[kept.index, columns]
+    for column in columns:
+        # Compare the values whatever the dtypes they were read back with (categories, float32 odds, integers read as floats)
+        left, right = kept[column], current[column]
+        if pd.api.types.is_numeric_dtype(left) and pd.api.types.is_numeric_dtype(right):
+            differs = ~np.isclose(left.to_numpy(dtype=float), right.to_numpy(dtype=float), equal_nan=True)
+        else:
+            differs = (left.to_numpy(dtype=object) != right.to_numpy(dtype=object)) & ~(left.isna().to_numpy() & right.isna().to_numpy())
+        seasons.update(current['Season'].to_numpy()[differs])
+    return seasons
+
+
+def update_league_features(league: str, matches: pd.DataFrame, state_dir: str, storage_format: str = "csv",
+                           window: int = WINDOW, rebuild: bool = False) -> pd.DataFrame:
+    """
+    Engineer the features of a league incrementally: only the matches missing from the stored features update
+    the team states, the previous ones are read back from disk.
+
+    Matches without a result (missing FTHG or FTAG) are left for a later refresh. The seasons whose stored
+    matches changed (see changed_seasons) are recomputed.
+
+    Parameters:
+    league (str): The league code (e.g., "E0").
+    matches (pd.DataFrame): All the raw matches of the league, with the Date (datetime), Season and Over2.5 columns.
+    state_dir (str): Directory of the team states and of the engineered features.
+    storage_format (str): Format of the engineered features file: csv, parquet or feather.
+    window (int): Number of matches of the rolling windows.
+    rebuild (bool): Rebuild the team states and the features from all the matches.
+
+    Returns:
+    pd.DataFrame: The features of all the matches.
+    """
+    store = TeamStateStore(state_dir, league, window)
+    features_path = os.path.join(state_dir, f"{league}_features{get_extension(storage_format)}")
+    matches = matches.dropna(subset=['FTHG', 'FTAG'])
+
+    features = None
+    outdated_seasons = set()
+    if rebuild or not os.path.exists(features_path):
+        store.reset()
+        new_matches = matches
+    else:
+        features = read_table(features_path)
+        features['Date'] = pd.to_datetime(features['Date'])
+        outdated_seasons = changed_seasons(features, matches)
+        if outdated_seasons:
+            print(f"Past matches of {league} changed, recomputing the seasons {', '.join(sorted(outdated_seasons))}.")
+            store.reset_seasons(outdated_seasons)
+            features = features[~features['Season'].isin(outdated_seasons)]
+        known_keys = pd.MultiIndex.from_frame(features[MATCH_KEY_COLUMNS])
+        new_matches = matches[~pd.MultiIndex.from_frame(matches[MATCH_KEY_COLUMNS]).isin(known_keys)]
+
+    print(f"Updating the team states of {league} with {len(new_matches)} new matches.")
+    if new_matches.empty and not outdated_seasons:
+        return features
+
+    features = update_features(features, new_matches, store)
+    store.save()
+    write_table(features, os.path.splitext(features_path)[0], storage_format)
+    return features
@@ -19,22 +19,63 @@ Parameters:
     Number of splits for cross-validation.
 --voting : str
     Voting method for the ensemble model. Choose from 'soft' or 'hard'.
+--storage_format : str
+    Format of the processed files: csv (default), parquet or feather.
+--leagues : str
+    Optional space-separated list of leagues to train (e.g., E0 I1), all the processed leagues by default.
+--feature_store_dir : str
+    Optional directory of the feature store written by the preprocessing (see feature_store.py), used to build the
+    training rows with point-in-time lookups, disabled by default. Leagues without a feature table use the
+    processed rows as is.
+--n_jobs : int
+    Core budget of the training, -1 for all the cores. The cores are shared between the leagues trained at the
+    same time (--league_jobs), and the cores of a league are used by its hyperparameter searches and
+    cross-validations (candidates and folds fitted in parallel, one thread each). The thread pools of every
+    process (OpenMP, BLAS) are limited to its share of the cores. By default the candidates and folds are fitted
+    one after another, with the default thread pools of the libraries, and --league_jobs alone gives one core
+    per league.
+--parallel_estimators : flag
+    Run the hyperparameter searches of the six estimators at the same time, in separate processes. The cores of
+    the league are shared between the searches. The results are the same as with the sequential searches.
+--league_jobs : int
+    Maximum number of leagues trained at the same time, each one in its own process, within the --n_jobs budget
+    (e.g., --league_jobs 4 --n_jobs 16 trains 4 leagues at a time with 4 cores each). One league at a time by default.
+--retrain_mode : str
+    'full' (default) searches the hyperparameters of every model. 'fast' refits the voting classifier with the
+    hyperparameters of the last full search of the league when the search settings and the features did not change
+    and the data drifted by at most --max_drift, and falls back to a full search otherwise (see params_cache.py).
+--max_drift : float
+    Maximum share of the matches of the last searched data added or removed since, for the fast retraining.
+--params_cache_dir : str
+    Directory of the best hyperparameters saved by the full searches, empty to disable it.
+--results_store_file : str
+    Optional SQLite file where every score of the hyperparameter searches is written as soon as it is computed
+    (see results_store.py), disabled by default. The invoke pipeline uses data/cache/search_results.sqlite. A
+    training restarted after an interruption skips the configurations already scored.
 
 The script processes each CSV file individually, trains several machine learning models, performs hyperparameter
-tuning, combines the best models into a voting classifier, and saves the trained voting classifier for each league.
+tuning, combines the best models into a voting classifier, and saves the trained voting classifier for each league
+as soon as it is trained. A league that fails is reported at the end, and the models of the other leagues are still saved.
 """
 
 import os
+import io
 import argparse
 import pickle
+import traceback
+from contextlib import contextmanager, nullcontext, redirect_stderr, redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from joblib import effective_n_jobs, parallel_config
+from threadpoolctl import threadpool_limits
 import numpy as np
 import pandas as pd
 from sklearn.linear_model import LogisticRegression
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.svm import SVC
 from sklearn.ensemble import RandomForestClassifier, VotingClassifier
+from sklearn.base import clone
 from sklearn.experimental import enable_halving_search_cv
-from sklearn.model_selection import HalvingGridSearchCV, cross_val_score, KFold
+from sklearn.model_selection import HalvingGridSearchCV, KFold
 from sklearn.metrics import make_scorer, accuracy_score, precision_score, f1_score, roc_auc_score
 from xgboost import XGBClassifier
 from sklearn.ensemble import HistGradientBoostingClassifier
@@ -42,10 +83,25 @@ import warnings
 from sklearn.exceptions import ConvergenceWarning
 from skopt import BayesSearchCV
 from skopt.space import Real, Integer, Categorical
+from storage import STORAGE_FORMATS, list_tables, read_table
+from feature_store import load_feature_store
+from oof_predictions import ensemble_cv_scores, out_of_fold_predictions
+from params_cache import fast_retrain_blocker, load_best_params, match_keys, save_best_params
+from results_store import ResultsStore, StoredEstimator, StoredScorer, prefix_param_grid, unprefix_params
 
 # Suppress the ConvergenceWarning
 warnings.filterwarnings("ignore", category=ConvergenceWarning)
 
+# Name of each model in the voting classifier
+ENSEMBLE_NAMES = {
+    'Logistic Regression': 'lr',
+    'KNN': 'knn',
+    'SVM': 'svm',
+    'Random Forest': 'rf',
+    'XGBoost': 'xgb',
+    'HistGradientBoosting': 'hgb',
+}
+
 
 def parse_arguments():
     """
@@ -64,17 +120,31 @@ def parse_arguments():
                         help="The metric to use for hyperparameter tuning. Choose from 'accuracy', 'precision', 'f1', or 'roc_auc'.")
     parser.add_argument('--n_splits', type=int, default=10, help="Number of splits for cross-validation.")
     parser.add_argument('--voting', type=str, choices=['soft', 'hard'], default='soft', help="Voting method for the ensemble model.")
+    parser.add_argument('--storage_format', type=str, choices=list(STORAGE_FORMATS), default='csv', help="Format of the processed files.")
+    parser.add_argument('--leagues', nargs='+', default=None, help="Leagues to train (e.g., E0 I1), all the processed leagues by default.")
+    parser.add_argument('--feature_store_dir', type=str, default=None, help="Optional directory of the feature store (default: disabled).")
+    parser.add_argument('--n_jobs', type=int, default=None, help="Core budget of the training, -1 for all the cores.")
+    parser.add_argument('--parallel_estimators', action='store_true', help="Run the hyperparameter searches of the estimators at the same time.")
+    parser.add_argument('--league_jobs', type=int, default=1, help="Maximum number of leagues trained at the same time, within the core budget.")
+    parser.add_argument('--retrain_mode', type=str, choices=['full', 'fast'], default='full',
+                        help="'fast' reuses the cached hyperparameters when the data barely changed, 'full' always searches them.")
+    parser.add_argument('--max_drift', type=float, default=0.05, help="Maximum share of added or removed matches to reuse the cached hyperparameters.")
+    parser.add_argument('--params_cache_dir', type=str, default='data/cache/best_params', help="Directory of the cached best hyperparameters, empty to disable it.")
+    parser.add_argument('--results_store_file', type=str, default=None,
+                        help="Optional SQLite file of the scores of the hyperparameter searches (default: disabled).")
     return parser.parse_args()
 
 
-def load_data(processed_data_input_dir: str) -> dict:
+def load_data(processed_data_input_dir: str, storage_format: str = 'csv') -> dict:
     """
-    Load CSV files from the specified folder and return a dictionary of DataFrames.
+    Load the processed files from the specified folder and return a dictionary of DataFrames.
 
     Parameters:
     -----------
     processed_data_input_dir : str
-        The path to the folder containing the CSV files.
+        The path to the folder containing the processed files.
+    storage_format : str
+        Format of the files to load: 'csv', 'parquet' or 'feather'.
 
     Returns:
     --------
@@ -82,15 +152,31 @@ def load_data(processed_data_input_dir: str) -> dict:
         A dictionary where keys are file names (without extension) and values are DataFrames.
     """
     data = {}
-    for file_name in os.listdir(processed_data_input_dir):
-        if file_name.endswith('.csv'):
-            league_name = file_name.split('_')[0]
-            file_path = os.path.join(processed_data_input_dir, file_name)
-            data[league_name] = pd.read_csv(file_path)
+    for file_name in list_tables(processed_data_input_dir, storage_format):
+        league_name = file_name.split('_')[0]
+        file_path = os.path.join(processed_data_input_dir, file_name)
+        data[league_name] = read_table(file_path)
     return data
 
 
-def prepare_data(df: pd.DataFrame) -> tuple:
+def get_feature_columns(df: pd.DataFrame) -> list:
+    """
+    Return the feature columns of the processed data: the numerical columns, except the target.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        The DataFrame containing the preprocessed data.
+
+    Returns:
+    --------
+    feature_columns : list of str
+        The columns of the feature matrix, in order.
+    """
+    return df.select_dtypes(include=['number']).columns.drop('Over2.5').tolist()
+
+
+def prepare_data(df: pd.DataFrame, feature_store=None) -> tuple:
     """
     Prepare the feature matrix X and the target variable y from the DataFrame.
 
@@ -98,6 +184,9 @@ def prepare_data(df: pd.DataFrame) -> tuple:
     -----------
     df : pd.DataFrame
         The DataFrame containing the preprocessed data.
+    feature_store : FeatureStore, optional
+        The feature store of the league. If given, the features of each match are read from the store as of
+        the match date, as done for the upcoming matches by make_predictions.
 
     Returns:
     --------
@@ -107,32 +196,152 @@ def prepare_data(df: pd.DataFrame) -> tuple:
         The target variable.
     """
     y = df['Over2.5'].values
-    numerical_columns = df.select_dtypes(include=['number']).columns
-    X = df[numerical_columns].drop(columns=['Over2.5']).values
-    return X, y
+    if feature_store is None:
+        X = df[get_feature_columns(df)].values
+        return X, y
+
+    X = feature_store.fixture_features(df, get_feature_columns(df))
+    if X.isna().any(axis=None):
+        raise ValueError("Matches missing from the feature store, run the preprocessing again")
+    return X.values, y
 
 
-def train_and_save_models(X: np.ndarray, y: np.ndarray, trained_models_output_dir: str, league_name: str, metric_choice: str, voting: str = 'soft', n_splits: int = 10):
+def split_jobs(n_jobs: int, n_tasks: int) -> tuple:
     """
-    Train models, perform hyperparameter tuning, create a voting classifier, and save the model.
+    Share the cores between tasks run at the same time.
+
+    Parameters:
+    -----------
+    n_jobs : int
+        The number of cores, as the n_jobs parameter of scikit-learn (None for one core, -1 for all the cores).
+    n_tasks : int
+        The number of tasks.
+
+    Returns:
+    --------
+    workers : int
+        The number of tasks run at the same time.
+    task_jobs : int
+        The number of cores of each task.
+    """
+    cores = effective_n_jobs(n_jobs)
+    workers = max(1, min(cores, n_tasks))
+    return workers, max(1, cores // workers)
+
+
+@contextmanager
+def core_budget(n_jobs: int):
+    """
+    Keep the threads of a task within its cores. The thread pools of the task (OpenMP, BLAS) are limited to its
+    cores, and the processes of its searches and cross-validations, which already fit one candidate or fold per
+    core, to a single thread each.
+
+    Parameters:
+    -----------
+    n_jobs : int
+        The number of cores of the task.
+    """
+    with threadpool_limits(limits=n_jobs), parallel_config(backend='loky', inner_max_num_threads=1):
+        yield
+
+
+def run_within_cores(task_jobs: int, task, *args, **kwargs):
+    """
+    Run a task in a worker process within its share of the cores (see core_budget).
+
+    Parameters:
+    -----------
+    task_jobs : int
+        The number of cores of the task, as returned by split_jobs.
+    task : callable
+        The task, called with the other arguments.
+
+    Returns:
+    --------
+    result :
+        The result of the task.
+    """
+    with core_budget(task_jobs):
+        return task(*args, **kwargs)
+
+
+def tune_model(model, param_grid: dict, X: np.ndarray, y: np.ndarray, cv, folds: list, scorer, n_jobs: int = None,
+               results_store: ResultsStore = None, league_name: str = None, model_name: str = None) -> tuple:
+    """
+    Search the best hyperparameters of a model and cross-validate the best estimator, keeping its out-of-fold predictions.
 
     Parameters:
     -----------
+    model : estimator
+        The model to tune.
+    param_grid : dict
+        The hyperparameter grid.
     X : np.ndarray
         The feature matrix.
     y : np.ndarray
         The target variable.
-    trained_models_output_dir : str
-        The folder where the trained models will be saved.
-    league_name : str
-        The name of the league, used for naming the saved model file.
-    metric_choice : str
-        The metric to use for hyperparameter tuning.
-    n_splits : int
-        Number of splits for cross-validation
-    
+    cv : KFold
+        The cross-validation splitter of the search.
+    folds : list of (np.ndarray, np.ndarray)
+        The training and test indices of the cross-validation of the best estimator, the splits of cv on X and y.
+    scorer : callable
+        The scorer of the search and of the cross-validation.
+    n_jobs : int, optional
+        Number of cores used to fit the candidates and the folds.
+    results_store : ResultsStore, optional
+        The store of the scores of the search. The scores already stored are not computed again.
+    league_name, model_name : str, optional
+        The league and the model of the search, the keys of its scores in the results store.
+
+    Returns:
+    --------
+    cv_score : np.ndarray
+        The cross-validated scores of the best estimator.
+    best_params : dict
+        The best hyperparameters.
+    best_estimator : estimator
+        The best estimator, fitted on the whole dataset.
+    oof_cache : dict
+        The out-of-fold predictions of the best estimator (see oof_predictions.py).
+    """
+    search_model, search_param_grid, search_scorer = model, param_grid, scorer
+    if results_store is not None:
+        # Each score is read from the store, or computed and written to it, the model being only fitted for the missing scores
+        search_model = StoredEstimator(model, league=league_name, model_name=model_name, store=results_store)
+        search_param_grid, search_scorer = prefix_param_grid(param_grid), StoredScorer(scorer)
+
+    # Initialize HalvingGridSearchCV with the inner cross-validation and hyperparameter grid
+    grid_search = HalvingGridSearchCV(estimator=search_model, param_grid=search_param_grid, cv=cv, scoring=search_scorer, refit=False,
+                                      n_jobs=n_jobs, random_state=42, verbose=0)
+
+    # Fit the grid search on the whole dataset to get the best parameters
+    grid_search.fit(X, y)
+
+    # Fit the best estimator on the whole dataset
+    best_params = unprefix_params(grid_search.best_params_)
+    best_estimator = clone(model).set_params(**best_params).fit(X, y)
+
+    # Get cross-validated score, keeping the predictions of the folds for the evaluation of the ensemble
+    cv_score, oof_cache = out_of_fold_predictions(best_estimator, X, y, folds, scorer, n_jobs)
+    return cv_score, best_params, best_estimator, oof_cache
+
+
+def define_models(n_jobs: int = None) -> dict:
+    """
+    Define the models of the voting classifier and their hyperparameter grids.
+
+    Parameters:
+    -----------
+    n_jobs : int, optional
+        The cores of each search, as the n_jobs parameter of scikit-learn. XGBoost uses all the threads allowed
+        to the process when the candidates and the folds are fitted one after another, and a single thread
+        when they are fitted in parallel processes.
+
+    Returns:
+    --------
+    models : dict
+        The unfitted model and the hyperparameter grid of each model name.
     """
-    # Define models and hyperparameters
     lr_model = LogisticRegression(random_state=42)
     lr_param_grid = {
         'C': [0.01, 0.1, 1, 10],
@@ -148,7 +357,7 @@ def train_and_save_models(X: np.ndarray, y: np.ndarray, trained_models_output_di
         'metric': ['euclidean', 'manhattan']
     }
 
-    svm_model = SVC(probability=True)
+    svm_model = SVC(probability=True, random_state=42)
     svm_param_grid = {
         'C': [0.1, 1, 10],
         'kernel': ['linear', 'rbf', 'poly'],
@@ -162,7 +371,7 @@ def train_and_save_models(X: np.ndarray, y: np.ndarray, trained_models_output_di
         'bootstrap': [True]
     }
 
-    xgb_model = XGBClassifier(tree_method="hist", eval_metric='logloss')
+    xgb_model = XGBClassifier(tree_method="hist", eval_metric='logloss', n_jobs=1 if effective_n_jobs(n_jobs) > 1 else None)
     xgb_param_grid = {
         'n_estimators': [50, 100, 150, 200],
         'max_depth': [3, 5, 7, 9],
@@ -178,6 +387,111 @@ def train_and_save_models(X: np.ndarray, y: np.ndarray, trained_models_output_di
         'early_stopping': [True]
     }
 
+    # Combine the models and hyperparameters into a dictionary
+    models = {
+        'Logistic Regression': (lr_model, lr_param_grid),
+        'KNN': (knn_model, knn_param_grid),
+        'SVM': (svm_model, svm_param_grid),
+        'Random Forest': (rf_model, rf_param_grid),
+        'XGBoost': (xgb_model, xgb_param_grid),
+        'HistGradientBoosting': (hgb_model, hgb_param_grid),
+    }
+    return models
+
+
+def save_voting_classifier(voting_clf: VotingClassifier, trained_models_output_dir: str, league_name: str) -> str:
+    """
+    Save the voting classifier of a league.
+
+    Parameters:
+    -----------
+    voting_clf : VotingClassifier
+        The fitted voting classifier.
+    trained_models_output_dir : str
+        The folder where the trained models are saved.
+    league_name : str
+        The name of the league.
+
+    Returns:
+    --------
+    model_filename : str
+        The path of the saved model.
+    """
+    model_filename = os.path.join(trained_models_output_dir, f"{league_name}_voting_classifier.pkl")
+    with open(model_filename, 'wb') as f:
+        pickle.dump(voting_clf, f)
+    return model_filename
+
+
+def train_and_save_models(X: np.ndarray, y: np.ndarray, trained_models_output_dir: str, league_name: str, metric_choice: str, voting: str = 'soft', n_splits: int = 10,
+                          n_jobs: int = None, parallel_estimators: bool = False, feature_columns: list = None, params_cache_dir: str = None,
+                          retrain_mode: str = 'full', max_drift: float = 0.05, results_store_file: str = None, matches: pd.DataFrame = None):
+    """
+    Train models, perform hyperparameter tuning, create a voting classifier, and save the model.
+
+    Parameters:
+    -----------
+    X : np.ndarray
+        The feature matrix.
+    y : np.ndarray
+        The target variable.
+    trained_models_output_dir : str
+        The folder where the trained models will be saved.
+    league_name : str
+        The name of the league, used for naming the saved model file.
+    metric_choice : str
+        The metric to use for hyperparameter tuning.
+    n_splits : int
+        Number of splits for cross-validation
+    n_jobs : int, optional
+        Number of cores used by the hyperparameter searches and the cross-validations, -1 for all the cores.
+    parallel_estimators : bool
+        Whether to run the hyperparameter searches of the models at the same time, sharing the n_jobs cores.
+    feature_columns : list of str, optional
+        The names of the columns of X, checked before reusing the cached hyperparameters.
+    params_cache_dir : str, optional
+        Directory of the cached best hyperparameters. The results of the full searches are saved there.
+    retrain_mode : str
+        'full' to search the hyperparameters, 'fast' to refit the voting classifier with the cached hyperparameters
+        when they still apply (see params_cache.fast_retrain_blocker), with a full search otherwise.
+    max_drift : float
+        Maximum share of the matches added or removed since the last full search, for the fast retraining.
+    results_store_file : str, optional
+        SQLite file of the scores of the searches (see results_store.py), to resume an interrupted training.
+    matches : pd.DataFrame, optional
+        The Date, HomeTeam and AwayTeam of the rows of X, identifying the matches searched for the fast retraining.
+        Without them, the fast retraining always falls back to a full search.
+
+    Returns:
+    --------
+    voting_clf : VotingClassifier
+        The fitted voting classifier, also saved to trained_models_output_dir.
+    """
+    # Cores of each search, shared between the searches when they run at the same time
+    workers, search_jobs = split_jobs(n_jobs, len(ENSEMBLE_NAMES)) if parallel_estimators else (1, n_jobs)
+
+    # Define models and hyperparameters
+    models = define_models(search_jobs)
+
+    # Settings and data of the search, to know whether the cached hyperparameters still apply
+    search_settings = {'metric_choice': metric_choice, 'n_splits': n_splits,
+                       'param_grids': {model_name: param_grid for model_name, (_, param_grid) in models.items()}}
+    if feature_columns is None:
+        feature_columns = [str(i) for i in range(X.shape[1])]
+    keys = match_keys(matches) if params_cache_dir and matches is not None else None
+
+    if retrain_mode == 'fast':
+        entry = load_best_params(params_cache_dir, league_name) if params_cache_dir else None
+        reason = fast_retrain_blocker(entry, search_settings, feature_columns, keys, max_drift)
+        if reason is None:
+            print("Training Voting Classifier with the cached hyperparameters of the best models...")
+            voting_clf = VotingClassifier(estimators=[(ENSEMBLE_NAMES[model_name], clone(model).set_params(**entry['best_params'][model_name]))
+                                                      for model_name, (model, _) in models.items()], voting=voting, n_jobs=n_jobs)
+            voting_clf.fit(X, y)
+            print(f"Model saved to {save_voting_classifier(voting_clf, trained_models_output_dir, league_name)}")
+            return voting_clf
+        print(f"Full hyperparameter search for {league_name}: {reason}.")
+
     # Define scoring metrics
     # Assume the user input is stored in the variable `metric_choice`
     if metric_choice == 'accuracy':
@@ -195,93 +509,204 @@ def train_and_save_models(X: np.ndarray, y: np.ndarray, trained_models_output_di
 
     # 10-fold cross-validation
     cv = KFold(n_splits=n_splits, shuffle=True, random_state=42)
-
-    # Combine the models and hyperparameters into a dictionary
-    models = {
-        'Logistic Regression': (lr_model, lr_param_grid),
-        'KNN': (knn_model, knn_param_grid),
-        'SVM': (svm_model, svm_param_grid),
-        'Random Forest': (rf_model, rf_param_grid),
-        'XGBoost': (xgb_model, xgb_param_grid),
-        'HistGradientBoosting': (hgb_model, hgb_param_grid),
-    }
+    folds = list(cv.split(X, y))
 
     results = {}
     best_params = {}
+    best_estimators = {}
+    oof_caches = {}
+    results_store = ResultsStore(results_store_file) if results_store_file else None
+
+    if parallel_estimators:
+        # One process per search, the cores being shared between the searches
+        print(f"Evaluating {len(models)} models in {workers} processes...")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {model_name: executor.submit(run_within_cores, search_jobs, tune_model, model, param_grid, X, y, cv, folds,
+                                                   scorer, search_jobs, results_store, league_name, model_name)
+                       for model_name, (model, param_grid) in models.items()}
+            searches = {model_name: future.result() for model_name, future in futures.items()}
+    else:
+        searches = {}
+        for model_name, (model, param_grid) in models.items():
+            print(f"Evaluating {model_name}...")
+            searches[model_name] = tune_model(model, param_grid, X, y, cv, folds, scorer, n_jobs, results_store, league_name, model_name)
 
-    for model_name, (model, param_grid) in models.items():
-        print(f"Evaluating {model_name}...")
-
-        # Initialize HalvingGridSearchCV with the inner cross-validation and hyperparameter grid
-        grid_search = HalvingGridSearchCV(estimator=model, param_grid=param_grid, cv=cv, scoring=scorer, verbose=0)
-
-        # Fit the grid search on the whole dataset to get the best parameters
-        grid_search.fit(X, y)
-
-        # Get cross-validated score
-        cv_score = cross_val_score(grid_search.best_estimator_, X, y, cv=cv, scoring=scorer)
-
+    for model_name, (cv_score, model_best_params, best_estimator, oof_cache) in searches.items():
         # Store the results and best parameters
         results[model_name] = cv_score
-        best_params[model_name] = grid_search.best_params_
+        best_params[model_name] = model_best_params
+        best_estimators[ENSEMBLE_NAMES[model_name]] = best_estimator
+        oof_caches[ENSEMBLE_NAMES[model_name]] = oof_cache
 
         print(f"{model_name} - {scorer._score_func.__name__}: {np.mean(cv_score):.4f} ± {np.std(cv_score):.4f}")
-        print(f"Best parameters for {model_name}: {grid_search.best_params_}")
-
-    # Initialize the models with the best hyperparameters
-    best_lr_model = LogisticRegression(**best_params['Logistic Regression'])
-    best_knn_model = KNeighborsClassifier(**best_params['KNN'])
-    best_svm_model = SVC(**best_params['SVM'], probability=True)
-    best_rf_model = RandomForestClassifier(**best_params['Random Forest'])
-    best_xgb_model = XGBClassifier(**best_params['XGBoost'])
-    best_hgb_model = HistGradientBoostingClassifier(**best_params['HistGradientBoosting'])
+        print(f"Best parameters for {model_name}: {model_best_params}")
 
     print("Training Voting Classifier, an ensamble of the best models...")
 
-    # Combine the models into a voting classifier
-    voting_clf = VotingClassifier(estimators=[
-        ('lr', best_lr_model),
-        ('knn', best_knn_model),
-        ('svm', best_svm_model),
-        ('rf', best_rf_model),
-        ('xgb', best_xgb_model),
-        ('hgb', best_hgb_model)
-    ], voting=voting)  # 'soft' for probability-based voting, 'hard' for majority voting
+    # Combine the models into a voting classifier, with unfitted copies of the best estimators (same hyperparameters and seeds)
+    voting_clf = VotingClassifier(estimators=[(name, clone(estimator)) for name, estimator in best_estimators.items()],
+                                  voting=voting, n_jobs=n_jobs)  # 'soft' for probability-based voting, 'hard' for majority voting
 
     # Fit the voting classifier
     voting_clf.fit(X, y)
 
-    # Evaluate the ensemble using cross-validation
-    cv_scores = cross_val_score(voting_clf, X, y, cv=cv, scoring=scorer)
+    # Evaluate the ensemble using cross-validation: the ensemble fitted on a training fold is made of the fold
+    # estimators of the models, so its predictions are the votes of their cached out-of-fold predictions
+    cv_scores = ensemble_cv_scores(oof_caches, y, folds, scorer, voting)
     print(f"Voting Classifier - {scorer._score_func.__name__}: {np.mean(cv_scores):.4f} ± {np.std(cv_scores):.4f}")
 
     # Save the model
-    model_filename = os.path.join(trained_models_output_dir, f"{league_name}_voting_classifier.pkl")
-    with open(model_filename, 'wb') as f:
-        pickle.dump(voting_clf, f)
-    print(f"Model saved to {model_filename}")
+    print(f"Model saved to {save_voting_classifier(voting_clf, trained_models_output_dir, league_name)}")
 
+    # Save the best hyperparameters for the next fast retrainings
+    if params_cache_dir:
+        print(f"Best hyperparameters saved to {save_best_params(params_cache_dir, league_name, search_settings, feature_columns, keys, best_params)}")
 
-def main():
+    return voting_clf
+
+
+def train_league(league_name: str, df: pd.DataFrame, trained_models_output_dir: str, metric_choice: str, voting: str = 'soft', n_splits: int = 10,
+                 storage_format: str = 'csv', feature_store_dir: str = None, n_jobs: int = None, parallel_estimators: bool = False,
+                 params_cache_dir: str = None, retrain_mode: str = 'full', max_drift: float = 0.05, results_store_file: str = None):
+    """
+    Prepare the data of a league, then train and save its voting classifier.
 
-    try:
-        # Parse arguments
-        args = parse_arguments()
+    Parameters:
+    -----------
+    league_name : str
+        The name of the league.
+    df : pd.DataFrame
+        The processed data of the league.
+    feature_store_dir : str, optional
+        Directory of the feature store, None or empty to use the processed rows as is.
+    Other parameters : see train_and_save_models.
+
+    Returns:
+    --------
+    voting_clf : VotingClassifier
+        The fitted voting classifier.
+    """
+    feature_store = load_feature_store(feature_store_dir, league_name, storage_format) if feature_store_dir else None
+    X, y = prepare_data(df, feature_store)
+    return train_and_save_models(X, y, trained_models_output_dir, league_name, metric_choice, voting, n_splits,
+                                 n_jobs=n_jobs, parallel_estimators=parallel_estimators, feature_columns=get_feature_columns(df),
+                                 params_cache_dir=params_cache_dir, retrain_mode=retrain_mode, max_drift=max_drift,
+                                 results_store_file=results_store_file, matches=df)
 
-        # Load data
-        data = load_data(args.processed_data_input_dir)
 
-        # Ensure output directory exists
-        os.makedirs(args.trained_models_output_dir, exist_ok=True)
+def train_league_job(league_name: str, *league_args, **league_kwargs) -> tuple:
+    """
+    Train a league in a worker process, capturing its logs so that the logs of the leagues trained in parallel
+    do not interleave.
 
-        # Train and save models for each league
-        for league_name, df in data.items():
-            print(f"Processing league: {league_name}")
-            X, y = prepare_data(df)
-            train_and_save_models(X, y, args.trained_models_output_dir, league_name, args.metric_choice, args.voting, args.n_splits)
-        
-    except Exception as e:
-        raise (f"An error occurred: {e}")
+    Parameters:
+    -----------
+    league_name : str
+        The name of the league.
+    league_args, league_kwargs :
+        The other arguments of train_league.
+
+    Returns:
+    --------
+    result : tuple
+        The league name, the voting classifier (None on failure), the captured logs and the error traceback (None on success).
+    """
+    log = io.StringIO()
+    with redirect_stdout(log), redirect_stderr(log):
+        try:
+            voting_clf = train_league(league_name, *league_args, **league_kwargs)
+            error = None
+        except Exception:
+            voting_clf, error = None, traceback.format_exc()
+    return league_name, voting_clf, log.getvalue(), error
+
+
+def train_leagues(data: dict, trained_models_output_dir: str, metric_choice: str, voting: str = 'soft', n_splits: int = 10, storage_format: str = 'csv',
+                  feature_store_dir: str = None, n_jobs: int = None, parallel_estimators: bool = False, league_jobs: int = 1,
+                  params_cache_dir: str = None, retrain_mode: str = 'full', max_drift: float = 0.05, results_store_file: str = None) -> dict:
+    """
+    Train and save the voting classifier of each league, several leagues at the same time within a core budget.
+
+    Parameters:
+    -----------
+    data : dict
+        The processed data of each league.
+    n_jobs : int, optional
+        Core budget of the training, shared between the leagues trained at the same time. Without it, the leagues
+        trained one after another are not limited, and the budget is one core per league when league_jobs is given.
+    league_jobs : int
+        Maximum number of leagues trained at the same time, each one in its own process.
+    Other parameters : see train_league.
+
+    Returns:
+    --------
+    models : dict
+        The voting classifier of each league trained successfully.
+
+    Raises:
+    -------
+    RuntimeError
+        If the training of some leagues failed, once the other leagues are saved.
+    """
+    models = {}
+    failures = []
+    league_args = (trained_models_output_dir, metric_choice, voting, n_splits, storage_format, feature_store_dir)
+    retrain_kwargs = {'params_cache_dir': params_cache_dir, 'retrain_mode': retrain_mode, 'max_drift': max_drift, 'results_store_file': results_store_file}
+    if n_jobs is None and league_jobs > 1:
+        print(f"No core budget given, training the leagues with one core each (--n_jobs {league_jobs}).")
+        n_jobs = league_jobs
+    workers, league_n_jobs = split_jobs(n_jobs, min(league_jobs, len(data)))
+
+    if workers > 1:
+        print(f"Training {len(data)} leagues, {workers} at a time with {league_n_jobs} cores each...")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run_within_cores, league_n_jobs, train_league_job, league_name, df, *league_args,
+                                       n_jobs=league_n_jobs, parallel_estimators=parallel_estimators, **retrain_kwargs)
+                       for league_name, df in data.items()]
+            # The leagues are reported as soon as they are done, each with its own logs
+            for future in as_completed(futures):
+                league_name, voting_clf, log, error = future.result()
+                print(f"========== {league_name} ==========\n{log}")
+                if error is not None:
+                    print(f"Training of {league_name} failed:\n{error}")
+                    failures.append(league_name)
+                    continue
+                models[league_name] = voting_clf
+    else:
+        # The threads are only limited within an explicit budget, the default sequential training is left as is
+        with core_budget(league_n_jobs) if n_jobs is not None else nullcontext():
+            for league_name, df in data.items():
+                print(f"Processing league: {league_name}")
+                try:
+                    models[league_name] = train_league(league_name, df, *league_args, n_jobs=n_jobs, parallel_estimators=parallel_estimators,
+                                                       **retrain_kwargs)
+                except Exception:
+                    print(f"Training of {league_name} failed:\n{traceback.format_exc()}")
+                    failures.append(league_name)
+
+    if failures:
+        raise RuntimeError(f"Training failed for: {', '.join(sorted(failures))}")
+
+    return models
+
+
+def main():
+    # Parse arguments
+    args = parse_arguments()
+
+    # Load data
+    data = load_data(args.processed_data_input_dir, args.storage_format)
+    if args.leagues is not None:
+        data = {league_name: df for league_name, df in data.items() if league_name in args.leagues}
+
+    # Ensure output directory exists
+    os.makedirs(args.trained_models_output_dir, exist_ok=True)
+
+    # Train and save models for each league
+    train_leagues(data, args.trained_models_output_dir, args.metric_choice, args.voting, args.n_splits, args.storage_format,
+                  args.feature_store_dir, n_jobs=args.n_jobs, parallel_estimators=args.parallel_estimators, league_jobs=args.league_jobs,
+                  params_cache_dir=args.params_cache_dir, retrain_mode=args.retrain_mode, max_drift=args.max_drift,
+                  results_store_file=args.results_store_file)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,96 @@
+"""
+Shared fixtures of the tests.
+
+The scripts are run from the root folder and import each other as top-level modules, so the scripts folder is
+put on the path. http_server runs a request handler on localhost, and fixture_server serves the files of a
+directory with an artificial latency, to test the downloads and the API calls without reaching the real servers.
+tiny_models replaces the models of the training with small grids, so that a full search takes a few seconds.
+"""
+
+import os
+import sys
+import time
+import threading
+import pytest
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from sklearn.linear_model import LogisticRegression
+from sklearn.neighbors import KNeighborsClassifier
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+
+class SlowRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Serve the files of a directory, waiting `latency` seconds before each response and recording the requests.
+    """
+
+    def __init__(self, *args, latency=0.0, requests=None, **kwargs):
+        self.latency = latency
+        self.requests = requests
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        time.sleep(self.latency)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    """
+    Start local HTTP servers on random ports, stopped at the end of the test.
+
+    Yields:
+    callable: start(handler) -> base_url, serving the requests with the given handler class.
+    """
+    servers = []
+
+    def start(handler):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def fixture_server(http_server):
+    """
+    Serve the files of a directory with an artificial latency.
+
+    Returns:
+    callable: serve(directory, latency=0.0) -> (base_url, requests), starting the server and returning its base URL
+    and the list of the requested paths.
+    """
+    def serve(directory, latency=0.0):
+        requests = []
+        base_url = http_server(partial(SlowRequestHandler, directory=str(directory), latency=latency, requests=requests))
+        return base_url, requests
+
+    return serve
+
+
+@pytest.fixture
+def tiny_models(monkeypatch):
+    """
+    Train two models of the voting classifier with three candidates each instead of the six full grids.
+
+    Returns:
+    dict: The models and grids returned by train_models.define_models.
+    """
+    import train_models
+
+    models = {
+        'Logistic Regression': (LogisticRegression(random_state=42), {'C': [0.01, 0.1, 1]}),
+        'KNN': (KNeighborsClassifier(), {'n_neighbors': [3, 9, 15]}),
+    }
+    monkeypatch.setattr(train_models, 'define_models', lambda n_jobs=None: models)
+    return models
@@ -0,0 +1,178 @@
+import copy
+import json
+import time
+import threading
+import pytest
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+import acquire_next_matches
+from acquire_next_matches import TokenBucket, get_next_matches, save_to_json
+
+RETRY_AFTER_SECONDS = 0.3
+
+
+class ThrottlingAPIHandler(BaseHTTPRequestHandler):
+    """
+    Mock of the /competitions/{id}/matches endpoint of football-data.org. Each competition first answers the
+    scripted errors of `script`, then its matches. The requests are recorded in `requests` as (time, id, token).
+    """
+
+    script = {}
+    requests = []
+    lock = threading.Lock()
+
+    def do_GET(self):
+        competition_id = int(self.path.split('/')[2])
+        with self.lock:
+            self.requests.append((time.monotonic(), competition_id, self.headers.get('X-Auth-Token')))
+            errors = self.script.get(competition_id, [])
+            status, headers = errors.pop(0) if errors else (200, {})
+
+        if status == 200:
+            body = json.dumps({'matches': [match(competition_id)]}).encode('utf-8')
+        else:
+            body = json.dumps({'message': 'You reached your request limit.' if status == 429 else 'Server error'}).encode('utf-8')
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def match(competition_id):
+    """One upcoming match of the next matchday."""
+    date = (datetime.now() + timedelta(days=2)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    return {'utcDate': date, 'matchday': 5, 'season': {'currentMatchday': 5},
+            'homeTeam': {'name': f'Home {competition_id}', 'crest': 'home.png'},
+            'awayTeam': {'name': f'Away {competition_id}', 'crest': 'away.png'}}
+
+
+@pytest.fixture
+def mock_api(http_server, monkeypatch):
+    """
+    Start the mock API with fresh competitions, and shorten the backoff so that the retries do not slow the tests.
+    """
+    monkeypatch.setenv('API_FOOTBALL_DATA', 'test-token')
+    monkeypatch.setattr(acquire_next_matches, 'COMPETITIONS', copy.deepcopy(acquire_next_matches.COMPETITIONS))
+    monkeypatch.setattr(acquire_next_matches, 'BACKOFF_BASE_SECONDS', 0.01)
+
+    def start(script):
+        handler = type('Handler', (ThrottlingAPIHandler,), {'script': script, 'requests': [], 'lock': threading.Lock()})
+        return http_server(handler), handler.requests
+
+    return start
+
+
+def request_times(requests, competition_id):
+    return [at for at, request_id, _ in requests if request_id == competition_id]
+
+
+def test_token_bucket_spaces_the_requests_beyond_its_capacity():
+    bucket = TokenBucket(rate_per_minute=600, capacity=2)  # One token every 0.1s after a burst of 2
+    times = []
+    threads = [threading.Thread(target=lambda: (bucket.acquire(), times.append(time.monotonic()))) for _ in range(6)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    times = sorted(t - start for t in times)
+    assert times[1] < 0.05
+    assert times[-1] >= 0.4 - 0.01  # 4 tokens refilled at 10 tokens per second
+    assert all(later - earlier >= 0.1 - 0.01 for earlier, later in zip(times[1:], times[2:]))
+
+
+def test_throttled_and_failed_requests_are_retried(mock_api):
+    base_url, requests = mock_api({
+        2021: [(429, {'Retry-After': str(RETRY_AFTER_SECONDS)})],
+        2014: [(429, {'X-RequestCounter-Reset': str(RETRY_AFTER_SECONDS)})],
+        2019: [(503, {}), (502, {})],
+    })
+
+    failures = get_next_matches({'X-Auth-Token': 'test-token'}, base_url, requests_per_minute=600)
+
+    assert failures == {}
+    for competition, info in acquire_next_matches.COMPETITIONS.items():
+        assert [m['home_team'] for m in info['next_matches']] == [f"Home {info['id']}"], competition
+    assert all(token == 'test-token' for _, _, token in requests)
+
+    # The advertised delays are waited before retrying, the server errors are retried after a backoff
+    for competition_id, attempts in ((2021, 2), (2014, 2), (2019, 3), (2002, 1), (2015, 1)):
+        assert len(request_times(requests, competition_id)) == attempts
+    for competition_id in (2021, 2014):
+        first, second = request_times(requests, competition_id)
+        assert second - first >= RETRY_AFTER_SECONDS
+
+
+def test_client_errors_are_not_retried(mock_api):
+    base_url, requests = mock_api({2021: [(403, {})]})
+
+    failures = get_next_matches({'X-Auth-Token': 'test-token'}, base_url, requests_per_minute=600)
+
+    assert list(failures) == ['E0']
+    assert len(request_times(requests, 2021)) == 1
+
+
+def test_failing_competition_leaves_the_others_saved(mock_api, tmp_path):
+    retries = acquire_next_matches.MAX_RETRIES
+    base_url, requests = mock_api({2002: [(500, {})] * (retries + 1)})
+
+    failures = get_next_matches({'X-Auth-Token': 'test-token'}, base_url, requests_per_minute=600)
+    save_to_json(acquire_next_matches.COMPETITIONS, tmp_path / 'next_matches.json')
+
+    assert list(failures) == ['D1'] and '500' in failures['D1']
+    assert len(request_times(requests, 2002)) == retries + 1
+    with open(tmp_path / 'next_matches.json', 'r', encoding='utf-16') as f:
+        saved = json.load(f)
+    assert saved['D1']['next_matches'] == []
+    assert all(len(saved[competition]['next_matches']) == 1 for competition in ('E0', 'SP1', 'I1', 'F1'))
+
+
+class BreakAPIHandler(BaseHTTPRequestHandler):
+    """
+    Mock of the /competitions/{id}/matches endpoint answering the matches of `matches` within the dateFrom/dateTo
+    filters. The requested windows are recorded in `requests` as (dateFrom, dateTo).
+    """
+
+    matches = []
+    requests = []
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        date_from, date_to = query['dateFrom'][0], query['dateTo'][0]
+        self.requests.append((date_from, date_to))
+        body = json.dumps({'matches': [m for m in self.matches if date_from <= m['utcDate'][:10] <= date_to]}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_window_is_widened_over_an_international_break(http_server, monkeypatch):
+    monkeypatch.setenv('API_FOOTBALL_DATA', 'test-token')
+    monkeypatch.setattr(acquire_next_matches, 'COMPETITIONS', {'E0': copy.deepcopy(acquire_next_matches.COMPETITIONS['E0'])})
+    # The next matchday is played 14 and 15 days from now, the one after a week later
+    matches = []
+    for days, matchday, home in ((14, 8, 'Arsenal'), (15, 8, 'Chelsea'), (22, 9, 'Everton')):
+        matches.append({'utcDate': (datetime.now() + timedelta(days=days)).strftime('%Y-%m-%dT%H:%M:%SZ'), 'matchday': matchday,
+                        'season': {'currentMatchday': 7},
+                        'homeTeam': {'name': home, 'crest': 'home.png'}, 'awayTeam': {'name': 'Fulham', 'crest': 'away.png'}})
+    handler = type('Handler', (BreakAPIHandler,), {'matches': matches, 'requests': []})
+
+    failures = get_next_matches({'X-Auth-Token': 'test-token'}, http_server(handler), requests_per_minute=600, window_days=10)
+
+    assert failures == {}
+    assert [m['home_team'] for m in acquire_next_matches.COMPETITIONS['E0']['next_matches']] == ['Arsenal', 'Chelsea']
+    today = datetime.now().date()
+    assert [(datetime.strptime(date_to, '%Y-%m-%d').date() - today).days for _, date_to in handler.requests] == [10, 20]
@@ -0,0 +1,187 @@
+import os
+import time
+import pandas as pd
+import pytest
+from data_acquisition import download_and_merge_data, fetch_season_file
+from storage import get_extension, read_table
+
+LATENCY = 0.3
+COLUMNS_2425 = ["Div", "Date", "Time", "HomeTeam", "AwayTeam", "FTHG", "FTAG", "FTR", "B365H"]
+E0_TEAMS = ["Arsenal", "Chelsea", "Everton", "Fulham"]
+
+
+def write_season(directory, league, season, rows, columns):
+    """Write a fixture season file at {directory}/{season}/{league}.csv."""
+    path = directory / season / f"{league}.csv"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(rows)[columns].to_csv(path, index=False)
+
+
+def season_rows(league, year, teams):
+    """One match per pair of consecutive teams, a week apart."""
+    return [{"Div": league, "Date": f"{7 * i + 1:02d}/09/{year}", "Time": "15:00", "HomeTeam": home, "AwayTeam": away,
+             "FTHG": i % 3, "FTAG": 1, "FTR": "HDA"[i % 3], "B365H": 1.5 + i}
+            for i, (home, away) in enumerate(zip(teams, teams[1:]))]
+
+
+def make_fixtures(directory):
+    """
+    Two seasons of two leagues. The older seasons have no Time column, so it is dropped by the merge, and the
+    2324 file of D1 is missing, so that its URL fails.
+    """
+    for league, teams in (("E0", ["Arsenal", "Chelsea", "Everton", "Fulham"]), ("I1", ["Inter", "Milan", "Roma"]),
+                          ("D1", ["Bayern", "Dortmund", "Mainz"])):
+        write_season(directory, league, "2425", season_rows(league, 2024, teams),
+                     ["Div", "Date", "Time", "HomeTeam", "AwayTeam", "FTHG", "FTAG", "FTR", "B365H"])
+        if league != "D1":
+            write_season(directory, league, "2324", season_rows(league, 2023, teams[::-1]),
+                         ["Div", "Date", "HomeTeam", "AwayTeam", "FTHG", "FTAG", "B365H", "FTR"])
+
+
+def test_concurrent_download_and_merge(tmp_path, fixture_server):
+    make_fixtures(tmp_path / "server")
+    base_url, requests = fixture_server(tmp_path / "server", latency=LATENCY)
+
+    start = time.perf_counter()
+    download_and_merge_data(["E0", "I1", "D1"], ["2425", "2324"], str(tmp_path / "raw"), max_workers=6, base_url=base_url)
+    elapsed = time.perf_counter() - start
+
+    # The 6 files are requested at once, instead of one after another
+    assert sorted(requests) == sorted(f"/{season}/{league}.csv" for league in ("E0", "I1", "D1") for season in ("2425", "2324"))
+    assert elapsed < 3 * LATENCY
+
+    # The seasons are merged in the requested order, on the common columns in the order of the first season
+    e0 = pd.read_csv(tmp_path / "raw" / "E0_merged.csv")
+    assert e0.columns.tolist() == ["Div", "Date", "HomeTeam", "AwayTeam", "FTHG", "FTAG", "FTR", "B365H"]
+    expected = pd.concat([pd.read_csv(tmp_path / "server" / season / "E0.csv")[e0.columns] for season in ("2425", "2324")],
+                         ignore_index=True)
+    pd.testing.assert_frame_equal(e0, expected)
+
+    # The failed season of D1 is skipped, its other season is still saved
+    d1 = pd.read_csv(tmp_path / "raw" / "D1_merged.csv")
+    pd.testing.assert_frame_equal(d1, pd.read_csv(tmp_path / "server" / "2425" / "D1.csv"))
+
+
+def test_concurrent_merge_matches_sequential_merge(tmp_path, fixture_server):
+    make_fixtures(tmp_path / "server")
+    base_url, _ = fixture_server(tmp_path / "server")
+
+    download_and_merge_data(["E0", "I1", "D1"], ["2425", "2324"], str(tmp_path / "sequential"), max_workers=1, base_url=base_url)
+    download_and_merge_data(["E0", "I1", "D1"], ["2425", "2324"], str(tmp_path / "concurrent"), max_workers=4, base_url=base_url)
+
+    for league in ("E0", "I1", "D1"):
+        sequential = (tmp_path / "sequential" / f"{league}_merged.csv").read_bytes()
+        assert (tmp_path / "concurrent" / f"{league}_merged.csv").read_bytes() == sequential
+
+
+def test_failed_league_is_not_saved(tmp_path, fixture_server):
+    make_fixtures(tmp_path / "server")
+    base_url, _ = fixture_server(tmp_path / "server")
+
+    download_and_merge_data(["E0", "F1"], ["2425"], str(tmp_path / "raw"), max_workers=2, base_url=base_url)
+
+    assert (tmp_path / "raw" / "E0_merged.csv").exists()
+    assert not (tmp_path / "raw" / "F1_merged.csv").exists()
+
+
+def test_unmodified_open_season_is_revalidated_and_reused(tmp_path, fixture_server):
+    make_fixtures(tmp_path / "server")
+    base_url, requests = fixture_server(tmp_path / "server")
+    cache_dir = str(tmp_path / "cache")
+
+    content, status = fetch_season_file("E0", "2425", base_url, cache_dir)
+    assert status == "miss"
+    assert content == (tmp_path / "server" / "2425" / "E0.csv").read_bytes()
+
+    # The server answers the conditional GET with a 304, the cached bytes are returned
+    assert fetch_season_file("E0", "2425", base_url, cache_dir) == (content, "not_modified")
+    assert requests == ["/2425/E0.csv"] * 2
+
+
+def test_modified_open_season_is_downloaded_again(tmp_path, fixture_server):
+    make_fixtures(tmp_path / "server")
+    base_url, requests = fixture_server(tmp_path / "server")
+    cache_dir = str(tmp_path / "cache")
+    fetch_season_file("E0", "2425", base_url, cache_dir)
+
+    # Last-Modified has a resolution of one second, so the new version is dated a minute later
+    server_file = tmp_path / "server" / "2425" / "E0.csv"
+    write_season(tmp_path / "server", "E0", "2425", season_rows("E0", 2024, ["Arsenal", "Chelsea", "Everton", "Fulham", "Leeds"]),
+                 ["Div", "Date", "Time", "HomeTeam", "AwayTeam", "FTHG", "FTAG", "FTR", "B365H"])
+    modified = os.stat(server_file).st_mtime + 60
+    os.utime(server_file, (modified, modified))
+
+    content, status = fetch_season_file("E0", "2425", base_url, cache_dir)
+    assert status == "miss"
+    assert content == server_file.read_bytes()
+    assert (tmp_path / "cache" / "2425" / "E0.csv").read_bytes() == content
+    assert fetch_season_file("E0", "2425", base_url, cache_dir) == (content, "not_modified")
+    assert len(requests) == 3
+
+
+def test_closed_seasons_are_never_requested_once_cached(tmp_path, fixture_server):
+    make_fixtures(tmp_path / "server")
+    base_url, requests = fixture_server(tmp_path / "server")
+    cache_dir = str(tmp_path / "cache")
+
+    download_and_merge_data(["E0", "I1"], ["2425", "2324"], str(tmp_path / "first"), base_url=base_url, cache_dir=cache_dir)
+    requests.clear()
+    download_and_merge_data(["E0", "I1"], ["2425", "2324"], str(tmp_path / "second"), base_url=base_url, cache_dir=cache_dir)
+
+    assert sorted(requests) == ["/2425/E0.csv", "/2425/I1.csv"]
+    for league in ("E0", "I1"):
+        assert (tmp_path / "second" / f"{league}_merged.csv").read_bytes() == (tmp_path / "first" / f"{league}_merged.csv").read_bytes()
+
+
+def changed_row(rows, columns):
+    rows[1]["FTHG"] = 7
+    return rows, columns
+
+
+def new_row(rows, columns):
+    return season_rows("E0", 2024, E0_TEAMS + ["Leeds"]), columns
+
+
+def dropped_column(rows, columns):
+    return rows, [col for col in columns if col != "B365H"]
+
+
+def added_column(rows, columns):
+    for row in rows:
+        row["HTHG"] = 0
+    return rows, columns + ["HTHG"]
+
+
+@pytest.mark.parametrize("storage_format", ["csv", "parquet", "feather"])
+@pytest.mark.parametrize("update", [changed_row, new_row, dropped_column, added_column])
+def test_upsert_matches_a_full_rebuild(tmp_path, fixture_server, storage_format, update):
+    make_fixtures(tmp_path / "server")
+    base_url, requests = fixture_server(tmp_path / "server")
+    download_and_merge_data(["E0"], ["2425", "2324"], str(tmp_path / "raw"), base_url=base_url, storage_format=storage_format)
+
+    rows, columns = update(season_rows("E0", 2024, E0_TEAMS), list(COLUMNS_2425))
+    write_season(tmp_path / "server", "E0", "2425", rows, columns)
+    requests.clear()
+    download_and_merge_data(["E0"], ["2425", "2324"], str(tmp_path / "raw"), base_url=base_url, incremental=True,
+                            storage_format=storage_format)
+    download_and_merge_data(["E0"], ["2425", "2324"], str(tmp_path / "rebuilt"), base_url=base_url, storage_format=storage_format)
+
+    # Only the open season is downloaded, and the upserted file holds the same matches as a file merged from scratch
+    assert requests[0] == "/2425/E0.csv"
+    file_name = f"E0_merged{get_extension(storage_format)}"
+    pd.testing.assert_frame_equal(read_table(str(tmp_path / "raw" / file_name)), read_table(str(tmp_path / "rebuilt" / file_name)))
+
+
+@pytest.mark.parametrize("storage_format", ["csv", "parquet", "feather"])
+def test_upsert_without_changes_leaves_the_file_untouched(tmp_path, fixture_server, storage_format):
+    make_fixtures(tmp_path / "server")
+    base_url, _ = fixture_server(tmp_path / "server")
+    download_and_merge_data(["E0"], ["2425", "2324"], str(tmp_path / "raw"), base_url=base_url, storage_format=storage_format)
+    merged_file = tmp_path / "raw" / f"E0_merged{get_extension(storage_format)}"
+    content, modified = merged_file.read_bytes(), os.stat(merged_file).st_mtime_ns
+
+    download_and_merge_data(["E0"], ["2425", "2324"], str(tmp_path / "raw"), base_url=base_url, incremental=True,
+                            storage_format=storage_format)
+
+    assert merged_file.read_bytes() == content
+    assert os.stat(merged_file).st_mtime_ns == modified
@@ -0,0 +1,44 @@
+import io
+import pytest
+from contextlib import redirect_stderr, redirect_stdout
+from mrmr import mrmr_classif
+from benchmark_feature_selection import make_synthetic_dataset
+from data_preprocessing import feature_selection
+from mrmr_native import mrmr_classif as native_mrmr_classif
+
+DATASETS = [(300, 40, 0), (500, 120, 1)]
+
+
+def features_and_target(df):
+    X = df.drop(["Date"], axis=1).select_dtypes(include='number').drop(['Over2.5'], axis=1)
+    return X, df['Over2.5']
+
+
+def select(df, engine, num_features):
+    # The mrmr-selection package prints a progress bar
+    with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+        return feature_selection(df, num_features=num_features, clustering_threshold=0.5, engine=engine)
+
+
+@pytest.mark.parametrize("num_rows, num_features, seed", DATASETS)
+def test_native_ranking_matches_mrmr_selection(num_rows, num_features, seed):
+    X, y = features_and_target(make_synthetic_dataset(num_rows, num_features, seed))
+
+    assert native_mrmr_classif(X, y, 15) == mrmr_classif(X=X, y=y, K=15, show_progress=False)
+
+
+def test_native_ranking_matches_mrmr_selection_on_integer_features():
+    df = make_synthetic_dataset(300, 40, seed=2)
+    X, y = features_and_target(df)
+    X = (X * 10).round().astype(int)
+
+    assert native_mrmr_classif(X, y, 15) == mrmr_classif(X=X, y=y, K=15, show_progress=False)
+
+
+@pytest.mark.parametrize("num_rows, num_features, seed", DATASETS)
+def test_native_clustered_selection_matches_mrmr_selection(num_rows, num_features, seed):
+    df = make_synthetic_dataset(num_rows, num_features, seed)
+
+    selected = select(df, "native", 15)
+    assert selected == select(df, "mrmr", 15)
+    assert 0 < len(selected) <= 15
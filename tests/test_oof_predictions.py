@@ -0,0 +1,52 @@
+import warnings
+import numpy as np
+import pytest
+from sklearn.base import clone
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier, VotingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, f1_score, make_scorer, roc_auc_score
+from sklearn.model_selection import KFold, cross_val_score
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.tree import DecisionTreeClassifier
+from oof_predictions import ensemble_cv_scores, out_of_fold_predictions
+
+SCORERS = {
+    'accuracy': make_scorer(accuracy_score),
+    'f1': make_scorer(f1_score),
+    'roc_auc': make_scorer(roc_auc_score, response_method='predict_proba'),
+}
+
+# An even number of members, so that the hard votes have ties
+MEMBERS = {
+    'lr': LogisticRegression(random_state=42),
+    'knn': KNeighborsClassifier(n_neighbors=5),
+    'rf': RandomForestClassifier(n_estimators=20, max_depth=3, random_state=42),
+    'tree': DecisionTreeClassifier(max_depth=2, random_state=42),
+}
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    X, y = make_classification(n_samples=240, n_features=8, n_informative=4, flip_y=0.2, random_state=0)
+    return X, y, list(KFold(n_splits=5, shuffle=True, random_state=42).split(X, y))
+
+
+@pytest.mark.parametrize("voting", ['soft', 'hard'])
+@pytest.mark.parametrize("metric", list(SCORERS))
+def test_ensemble_scores_match_the_cross_validation_of_the_voting_classifier(dataset, metric, voting):
+    X, y, folds = dataset
+    scorer = SCORERS[metric]
+    caches = {name: out_of_fold_predictions(clone(member), X, y, folds, scorer)[1] for name, member in MEMBERS.items()}
+    voting_clf = VotingClassifier(estimators=[(name, clone(member)) for name, member in MEMBERS.items()], voting=voting)
+
+    with warnings.catch_warnings():
+        # The hard voting classifier has no predict_proba, cross_val_score warns and scores NaN
+        warnings.simplefilter('ignore', UserWarning)
+        expected = cross_val_score(voting_clf, X, y, cv=folds, scoring=scorer)
+    scores = ensemble_cv_scores(caches, y, folds, scorer, voting)
+
+    if metric == 'roc_auc' and voting == 'hard':
+        assert np.isnan(expected).all() and np.isnan(scores).all()
+    else:
+        np.testing.assert_allclose(scores, expected, rtol=0, atol=1e-12)
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.datasets import make_classification
+from params_cache import data_drift, fast_retrain_blocker, load_best_params, match_keys, save_best_params
+from train_models import train_and_save_models
+
+SETTINGS = {'metric_choice': 'accuracy', 'n_splits': 3, 'param_grids': {'KNN': {'n_neighbors': (3, 5)}}}
+FEATURES = ['B365>2.5', 'AvgHomeGoalsScored']
+
+
+def matches(n):
+    """n matches, one a day, with distinct teams."""
+    return pd.DataFrame({'Date': pd.date_range('2020-08-01', periods=n).strftime('%Y-%m-%d'),
+                         'HomeTeam': [f"Home{i % 20}" for i in range(n)], 'AwayTeam': [f"Away{i}" for i in range(n)]})
+
+
+def cached_entry(tmp_path, keys):
+    save_best_params(str(tmp_path), "E0", SETTINGS, FEATURES, keys, {'KNN': {'n_neighbors': 5}})
+    return load_best_params(str(tmp_path), "E0")
+
+
+def test_drift_counts_the_added_and_removed_matches():
+    keys = match_keys(matches(100))
+
+    assert data_drift(keys, keys) == 0
+    assert data_drift(keys, keys[:98]) == pytest.approx(0.02)
+    assert data_drift(keys, keys + match_keys(matches(103))[100:]) == pytest.approx(0.03)
+    # A match moved to another date is removed and added
+    moved = [list(key) for key in keys]
+    moved[0][0] = '2019-01-01'
+    assert data_drift(keys, moved) == pytest.approx(0.02)
+
+
+def test_drift_within_the_threshold_reuses_the_cached_parameters(tmp_path):
+    keys = match_keys(matches(540))
+    entry = cached_entry(tmp_path, keys[:500])
+
+    assert fast_retrain_blocker(entry, SETTINGS, FEATURES, keys[:500], max_drift=0.05) is None
+    assert fast_retrain_blocker(entry, SETTINGS, FEATURES, keys[:520], max_drift=0.05) is None
+
+
+def test_drift_above_the_threshold_blocks_the_fast_retraining(tmp_path):
+    keys = match_keys(matches(540))
+    entry = cached_entry(tmp_path, keys[:500])
+
+    reason = fast_retrain_blocker(entry, SETTINGS, FEATURES, keys[:537], max_drift=0.05)
+    assert reason == "the data drifted by 7.4% (more than 5.0%)"
+
+
+@pytest.mark.parametrize("change, reason", [
+    (lambda entry, settings, features, keys: (None, settings, features, keys), "no cached hyperparameters"),
+    (lambda entry, settings, features, keys: (entry, {**settings, 'n_splits': 5}, features, keys), "the search settings changed"),
+    (lambda entry, settings, features, keys: (entry, settings, features[::-1], keys), "the feature set changed"),
+    (lambda entry, settings, features, keys: (entry, settings, features, None), "the matches of the training data are unknown"),
+    (lambda entry, settings, features, keys: ({**entry, 'match_keys': None}, settings, features, keys),
+     "the matches of the training data are unknown"),
+])
+def test_changed_or_missing_inputs_block_the_fast_retraining(tmp_path, change, reason):
+    keys = match_keys(matches(100))
+    entry = cached_entry(tmp_path, keys)
+
+    assert fast_retrain_blocker(*change(entry, SETTINGS, FEATURES, keys), max_drift=0.05) == reason
+
+
+@pytest.mark.parametrize("case, reason", [
+    ("same data", None),
+    ("drift", "the data drifted by 7.4% (more than 5.0%)"),
+    ("settings", "the search settings changed"),
+    ("matches", "the matches of the training data are unknown"),
+    ("cache", "no cached hyperparameters"),
+])
+def test_fast_retraining_falls_back_to_a_full_search(tmp_path, capsys, tiny_models, case, reason):
+    X, y = make_classification(n_samples=540, n_features=6, flip_y=0.2, random_state=0)
+    data = matches(540)
+    train_and_save_models(X[:500], y[:500], str(tmp_path), "E0", "accuracy", n_splits=3,
+                          params_cache_dir=str(tmp_path / "params"), matches=data[:500])
+    capsys.readouterr()
+
+    rows = 537 if case == "drift" else 500
+    kwargs = {'n_splits': 4 if case == "settings" else 3, 'matches': None if case == "matches" else data[:rows],
+              'params_cache_dir': str(tmp_path / ("empty" if case == "cache" else "params"))}
+    voting_clf = train_and_save_models(X[:rows], y[:rows], str(tmp_path), "E0", "accuracy", retrain_mode='fast', **kwargs)
+
+    output = capsys.readouterr().out
+    if reason is None:
+        assert "with the cached hyperparameters" in output and "Full hyperparameter search" not in output
+    else:
+        assert f"Full hyperparameter search for E0: {reason}." in output
+    assert len(voting_clf.estimators_) == len(tiny_models)
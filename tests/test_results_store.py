@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.datasets import make_classification
+from sklearn.exceptions import FitFailedWarning
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, make_scorer
+from sklearn.model_selection import KFold
+from results_store import ResultsStore, StoredEstimator, data_hash
+from train_models import tune_model
+
+PARAM_GRID = {'C': [0.01, 0.1, 1, 10]}
+
+
+class FailingClassifier(ClassifierMixin, BaseEstimator):
+    """Classifier whose fit always fails, counting its calls."""
+
+    fit_calls = 0
+
+    def fit(self, X, y):
+        FailingClassifier.fit_calls += 1
+        raise ValueError("cannot fit")
+
+
+@pytest.fixture
+def search():
+    """Data, folds and scorer of a small search, and a function running the search of a logistic regression."""
+    X, y = make_classification(n_samples=300, n_features=6, flip_y=0.2, random_state=0)
+    cv = KFold(n_splits=3, shuffle=True, random_state=42)
+    folds, scorer = list(cv.split(X, y)), make_scorer(accuracy_score)
+
+    def run(store, param_grid=PARAM_GRID):
+        return tune_model(LogisticRegression(random_state=42), param_grid, X, y, cv, folds, scorer, results_store=store,
+                          league_name="E0", model_name="Logistic Regression")
+
+    return run
+
+
+def test_resumed_search_skips_the_stored_fits(tmp_path, search, monkeypatch):
+    store = ResultsStore(str(tmp_path / "results.sqlite"))
+    cv_score, best_params, _, _ = search(store)
+    scores = store.scores()
+
+    recorded_fits = []
+    monkeypatch.setattr(ResultsStore, 'record_fit', lambda self, *args, **kwargs: recorded_fits.append(args))
+    resumed_cv_score, resumed_best_params, _, _ = search(store)
+
+    # Nothing is fitted again, and the results are the ones of the first run and of a search without the store
+    assert recorded_fits == []
+    assert resumed_best_params == best_params
+    np.testing.assert_array_equal(resumed_cv_score, cv_score)
+    assert len(store.scores()) == len(scores)
+    assert search(None)[1] == best_params
+
+
+def test_failed_fit_is_raised_again_without_fitting(tmp_path):
+    store = ResultsStore(str(tmp_path / "results.sqlite"))
+    X, y = make_classification(n_samples=50, random_state=0)
+    FailingClassifier.fit_calls = 0
+
+    with pytest.raises(ValueError, match="cannot fit"):
+        StoredEstimator(FailingClassifier(), league="E0", model_name="Failing", store=store).fit(X, y)
+    with pytest.raises(RuntimeError, match="Fit failed in a previous run: ValueError: cannot fit"):
+        StoredEstimator(FailingClassifier(), league="E0", model_name="Failing", store=store).fit(X, y)
+
+    assert FailingClassifier.fit_calls == 1
+    stored_fit = store.get_fit("E0", "Failing", StoredEstimator(FailingClassifier()).params_key(), data_hash(X, y))
+    assert stored_fit['error'] == "ValueError: cannot fit"
+
+
+@pytest.mark.filterwarnings("ignore:One or more of the .* scores are non-finite")
+def test_resumed_search_with_failed_fits_gives_the_same_results(tmp_path, search):
+    # The l1 penalty is not supported by lbfgs, half of the candidates fail on every fold
+    param_grid = {'penalty': ['l1', 'l2'], 'C': [0.1, 1], 'solver': ['lbfgs']}
+    store = ResultsStore(str(tmp_path / "results.sqlite"))
+
+    with pytest.warns(FitFailedWarning, match="Solver lbfgs supports only"):
+        _, best_params, _, _ = search(store, param_grid)
+    with pytest.warns(FitFailedWarning, match="Fit failed in a previous run: ValueError: Solver lbfgs supports only"):
+        _, resumed_best_params, _, _ = search(store, param_grid)
+
+    assert best_params['penalty'] == 'l2'
+    assert resumed_best_params == best_params
+
+
+def test_summary_ranks_the_candidates_of_the_last_halving_iteration(tmp_path, search):
+    store = ResultsStore(str(tmp_path / "results.sqlite"))
+    search(store)
+
+    scores = store.scores()
+    test_scores = scores[scores['split'] == 'test']
+    last_iteration = test_scores['n_resources'].max()
+    summary = store.summary(top=10)
+
+    # 4 candidates on the first iteration, the 2 best ones on the last iteration, on the 3 folds of each
+    assert test_scores['n_resources'].nunique() == 2
+    assert test_scores.groupby('n_resources')['params'].nunique().tolist() == [4, 2]
+    assert len(summary) == 2
+    assert (summary['n_resources'] == last_iteration).all()
+    assert (summary['folds'] == 3).all()
+    assert summary['mean_score'].is_monotonic_decreasing